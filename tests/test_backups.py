@@ -0,0 +1,107 @@
+import hashlib
+import io
+import os
+import sys
+import threading
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'web'))
+
+import pytest
+
+from backups import (BackupCancelled, CodecPolicy, ZipWriter, available_codecs, get_codec, scan_files, stream_zip,
+                     write_zip, write_zip_parallel)
+
+
+@pytest.fixture
+def world(tmp_path):
+    root = tmp_path / 'world'
+    (root / 'region').mkdir(parents=True)
+    (root / 'playerdata').mkdir()
+    for i in range(6):
+        # Half random like stored chunks, half padding
+        (root / 'region' / f'r.{i}.0.mca').write_bytes(os.urandom(20000) + bytes(20000))
+    (root / 'playerdata' / 'steve.dat').write_bytes(b'\x0a\x00\x00' * 1000)
+    (root / 'level.dat').write_bytes(b'level')
+    (root / 'empty.json').write_bytes(b'')
+    return root
+
+
+def read_back(archive):
+    with zipfile.ZipFile(archive) as zipf:
+        assert zipf.testzip() is None
+        return {info.filename: zipf.read(info) for info in zipf.infolist()}
+
+
+def expected(files):
+    contents = {}
+    for path, arcname, _ in files:
+        with open(path, 'rb') as f:
+            contents[arcname.replace(os.sep, '/')] = f.read()
+    return contents
+
+
+@pytest.mark.parametrize('codec', available_codecs())
+def test_write_zip_round_trip(world, tmp_path, codec):
+    files = scan_files(str(world), str(tmp_path))
+    archive = tmp_path / 'backup.zip'
+    write_zip(files, str(archive), policy=CodecPolicy(codec))
+    assert read_back(archive) == expected(files)
+
+
+def test_write_zip_parallel_matches_serial(world, tmp_path):
+    files = scan_files(str(world), str(tmp_path))
+    policy = CodecPolicy('deflate', {'.mca': 'store'})
+    write_zip(files, str(tmp_path / 'serial.zip'), policy=policy)
+    write_zip_parallel(files, str(tmp_path / 'parallel.zip'), workers=3, policy=policy)
+    assert read_back(tmp_path / 'parallel.zip') == expected(files)
+    assert (tmp_path / 'serial.zip').read_bytes() == (tmp_path / 'parallel.zip').read_bytes()
+
+
+def test_write_zip_returns_archive_sha256(world, tmp_path):
+    files = scan_files(str(world), str(tmp_path))
+    archive = tmp_path / 'backup.zip'
+    digest = write_zip_parallel(files, str(archive), workers=2)
+    assert digest == hashlib.sha256(archive.read_bytes()).hexdigest()
+
+
+def test_cancelled_write_leaves_nothing(world, tmp_path):
+    files = scan_files(str(world), str(tmp_path))
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(BackupCancelled):
+        write_zip(files, str(tmp_path / 'backup.zip'), cancel_event=cancel)
+    assert os.listdir(tmp_path) == ['world']
+
+
+def test_stream_zip_round_trip(world, tmp_path):
+    files = scan_files(str(world), str(tmp_path))
+    archive = tmp_path / 'streamed.zip'
+    archive.write_bytes(b''.join(stream_zip(files, CodecPolicy('deflate', {'.dat': 'store'}))))
+    assert read_back(archive) == expected(files)
+
+
+def test_zip64_entry_count():
+    # More entries than the classic end record can count
+    out = io.BytesIO()
+    writer = ZipWriter(out)
+    codec = get_codec('store')
+    for i in range(0x10000 + 5):
+        writer.add(f'f{i}', 315532800, codec, 0, 0, io.BytesIO(), 0)
+    writer.close()
+    with zipfile.ZipFile(out) as zipf:
+        names = zipf.namelist()
+    assert len(names) == 0x10000 + 5
+    assert names[-1] == 'f65540'
+
+
+def test_zip64_streamed_sizes():
+    # A size hint near 4 GB switches the streamed entry to ZIP64 sizes
+    out = io.BytesIO()
+    writer = ZipWriter(out)
+    data = b'hello zip64' * 100
+    for _ in writer.add_streamed('big.bin', 315532800, get_codec('deflate'), io.BytesIO(data), 0xFFFFFFFF):
+        pass
+    writer.close()
+    with zipfile.ZipFile(out) as zipf:
+        assert zipf.read('big.bin') == data
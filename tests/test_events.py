@@ -0,0 +1,59 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'web'))
+
+import pytest
+
+from events import ServerEvents
+
+PREFIXES = {
+    'vanilla': '[12:00:00] [Server thread/INFO]: ',
+    'paper': '[12:00:00 INFO]: ',
+    'forge': '[12:00:00] [Server thread/INFO] [minecraft/DedicatedServer]: ',
+    'forge-player-list': '[12:00:00] [Server thread/INFO] [minecraft/PlayerList]: ',
+    'fabric': '[12:00:00] [Server thread/INFO] (Minecraft) ',
+}
+
+
+@pytest.fixture(params=sorted(PREFIXES))
+def prefix(request):
+    return PREFIXES[request.param]
+
+
+def test_done_marks_ready(prefix):
+    events = ServerEvents()
+    events.process([prefix + 'Done (5.2s)! For help, type "help"'])
+    assert events.wait_ready(0)
+    assert events.startup_seconds == 5.2
+
+
+def test_join_and_leave(prefix):
+    events = ServerEvents()
+    events.process([prefix + 'Steve joined the game'])
+    assert list(events.online) == ['Steve']
+    events.process([prefix + 'Steve left the game'])
+    assert events.online == {}
+    assert events.sessions[-1]['player'] == 'Steve'
+
+
+def test_lag_and_save(prefix):
+    events = ServerEvents()
+    events.process([
+        prefix + "Can't keep up! Is the server overloaded? Running 2500ms or 50 ticks behind",
+        prefix + 'Saved the game',
+    ])
+    assert events.lag_total == 1
+    assert events.last_lag['ticks_behind'] == 50
+    assert events.last_save is not None
+
+
+def test_chat_cannot_fake_events(prefix):
+    events = ServerEvents()
+    events.process([
+        prefix + '<Alex> Steve joined the game',
+        prefix + '<Alex> Done (1.0s)!',
+        prefix + '[Server] Steve joined the game',
+    ])
+    assert events.online == {}
+    assert not events.wait_ready(0)
@@ -0,0 +1,97 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'web'))
+
+import properties
+from properties import PropertiesFile, parse
+
+SAMPLE = (
+    "#Minecraft server properties\n"
+    "#Mon Jan 01 00:00:00 UTC 2024\n"
+    "enable-rcon=false\n"
+    "level-name=world\n"
+    "\n"
+    "motd=A Minecraft Server \\u00e9 \\: ok\n"
+    "! bang comment\n"
+    "spaced key = spaced value\n"
+    "colon:value\n"
+    "continued=one \\\n"
+    "    two\n"
+    "empty=\n"
+)
+
+
+def test_parse():
+    values = {key: value for key, _, value in parse(SAMPLE) if key is not None}
+    assert values == {
+        'enable-rcon': 'false',
+        'level-name': 'world',
+        'motd': 'A Minecraft Server é : ok',
+        'spaced': 'key = spaced value',
+        'colon': 'value',
+        'continued': 'one two',
+        'empty': '',
+    }
+
+
+def test_unchanged_text_round_trips(tmp_path):
+    path = tmp_path / 'server.properties'
+    path.write_text(SAMPLE, encoding='utf-8')
+    assert PropertiesFile(str(path)).read_text() == SAMPLE
+
+
+def test_update_rewrites_only_changed_lines(tmp_path):
+    path = tmp_path / 'server.properties'
+    path.write_text(SAMPLE, encoding='utf-8')
+    props = PropertiesFile(str(path))
+    assert props.update({'level-name': 'other world', 'motd': None, 'new:key': 'a=b', 'enable-rcon': 'false'}) \
+        == ['level-name', 'motd', 'new:key']
+    text = path.read_text(encoding='utf-8')
+    assert text.startswith("#Minecraft server properties\n#Mon Jan 01 00:00:00 UTC 2024\nenable-rcon=false\n")
+    assert 'level-name=other world\n' in text
+    assert 'motd' not in text
+    assert "continued=one \\\n    two\n" in text
+    assert text.endswith('new\\:key=a\\=b\n')
+    # Read back by a fresh parser, the values are what was written
+    reread = PropertiesFile(str(path)).as_dict()
+    assert reread['level-name'] == 'other world'
+    assert reread['new:key'] == 'a=b'
+    assert 'motd' not in reread
+
+
+def test_escaped_values_round_trip(tmp_path):
+    path = tmp_path / 'server.properties'
+    value = ' leading space, tab\t, newline\n, backslash\\, #hash, =, :'
+    PropertiesFile(str(path)).update({'motd': value})
+    assert PropertiesFile(str(path)).get('motd') == value
+
+
+def test_external_edits_are_picked_up(tmp_path):
+    path = tmp_path / 'server.properties'
+    path.write_text('level-name=world\n', encoding='utf-8')
+    props = PropertiesFile(str(path))
+    assert props.get('level-name') == 'world'
+    path.write_text('level-name=edited by hand\n', encoding='utf-8')
+    os.utime(path, ns=(1, 1))  # A different mtime even within the same clock tick
+    assert props.get('level-name') == 'edited by hand'
+
+
+def test_writes_keep_limited_backups(tmp_path, monkeypatch):
+    path = tmp_path / 'server.properties'
+    path.write_text('level-name=world\n', encoding='utf-8')
+    props = PropertiesFile(str(path), history=2)
+    clock = iter(range(1_700_000_000, 1_700_000_010))
+    monkeypatch.setattr(properties.time, 'time', lambda: next(clock))
+    for i in range(4):
+        props.update({'level-name': f'world{i}'})
+    backups = props.backups()
+    assert len(backups) == 2
+    with open(backups[0], encoding='utf-8') as f:
+        assert f.read() == 'level-name=world2\n'
+
+
+def test_missing_file(tmp_path):
+    props = PropertiesFile(str(tmp_path / 'server.properties'))
+    assert props.get('level-name', 'world') == 'world'
+    assert not props.exists()
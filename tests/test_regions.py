@@ -0,0 +1,97 @@
+import os
+import random
+import sys
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'web'))
+
+import pytest
+
+from regions import (CHUNKS, RegionError, apply_delta, build_delta, build_region, parse_region,
+                     region_timestamps)
+from snapshots import create_snapshot, load_manifest, open_snapshot_file
+
+
+def make_chunk(rng, size):
+    # Length prefix (data plus compression byte), zlib compression, data
+    data = zlib.compress(bytes(rng.randrange(256) for _ in range(size)))
+    return (len(data) + 1).to_bytes(4, 'big') + b'\x02' + data
+
+
+def make_chunks(seed=1, present=200, timestamp=1_700_000_000):
+    rng = random.Random(seed)
+    indexes = set(rng.sample(range(CHUNKS), present))
+    return [(timestamp + i, make_chunk(rng, rng.randrange(50, 6000))) if i in indexes else (0, None)
+            for i in range(CHUNKS)]
+
+
+def changed(chunks, indexes, timestamp):
+    rng = random.Random(timestamp)
+    chunks = list(chunks)
+    for i in indexes:
+        chunks[i] = (timestamp, make_chunk(rng, 300))
+    return chunks
+
+
+def test_region_round_trip():
+    chunks = make_chunks()
+    data = build_region(chunks)
+    assert parse_region(data) == chunks
+    assert region_timestamps(data) == [timestamp for timestamp, _ in chunks]
+
+
+def test_empty_region():
+    assert parse_region(b'') == [(0, None)] * CHUNKS
+
+
+def test_truncated_region_raises():
+    data = build_region(make_chunks())
+    with pytest.raises(RegionError):
+        parse_region(data[:len(data) // 2])
+
+
+def test_delta_round_trip():
+    base = make_chunks()
+    present = [i for i, (_, raw) in enumerate(base) if raw is not None]
+    new = changed(base, present[:5] + [i for i, (_, raw) in enumerate(base) if raw is None][:3], 1_800_000_000)
+    new[present[10]] = (0, None)  # A chunk deleted since the base
+    delta, stored = build_delta(new, region_timestamps(build_region(base)), 1_800_000_000)
+    assert stored == 8
+    assert apply_delta(delta, base) == new
+    assert region_timestamps(delta) == [timestamp for timestamp, _ in new]
+
+
+def test_chunk_saved_in_the_base_second_is_stored():
+    base = make_chunks(present=10)
+    saved_at = max(timestamp for timestamp, _ in base)
+    delta, stored = build_delta(base, region_timestamps(build_region(base)), saved_at)
+    assert stored == 1  # Could have changed after the base copy without its timestamp moving
+    assert apply_delta(delta, base) == base
+
+
+def test_delta_against_missing_base_chunk_raises():
+    base = make_chunks()
+    delta, _ = build_delta(base, region_timestamps(build_region(base)), 2_000_000_000)
+    with pytest.raises(RegionError):
+        apply_delta(delta, [(0, None)] * CHUNKS)
+
+
+def test_delta_snapshots_rebuild_regions(tmp_path):
+    world = tmp_path / 'world'
+    (world / 'region').mkdir(parents=True)
+    (world / 'level.dat').write_bytes(b'level')
+    region = world / 'region' / 'r.0.0.mca'
+    snapshots = tmp_path / 'snapshots'
+    snapshots.mkdir()
+    versions = [make_chunks()]
+    versions.append(changed(versions[0], range(0, 1024, 100), 1_800_000_000))
+    versions.append(changed(versions[1], range(5, 1024, 200), 1_800_000_100))
+    for n, chunks in enumerate(versions):
+        region.write_bytes(build_region(chunks))
+        os.utime(region, (1_900_000_000 + n, 1_900_000_000 + n))
+        create_snapshot(str(world), str(snapshots), f'snap{n}', region_deltas=True)
+    manifest = load_manifest(str(snapshots / 'snap2'))
+    entry = manifest['files']['region/r.0.0.mca']
+    assert entry['delta'] == 'snap1' and entry['chain'] == 2
+    with open_snapshot_file(str(snapshots), 'snap2', 'world', 'region/r.0.0.mca', entry, {}) as f:
+        assert parse_region(f.read()) == versions[2]
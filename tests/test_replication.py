@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'web'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'tools'))
+
+import pytest
+
+from backups import BackupCancelled, BackupProgress
+from fake_s3 import FakeS3Server
+from replication import MIN_PART_SIZE, Replicator, multipart_etag
+from s3 import S3Client, S3Error
+from snapshots import MANIFEST_NAME, create_snapshot
+
+PREFIX = 'mc/'
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = FakeS3Server(str(tmp_path / 's3'), page_size=2)
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def client(server):
+    return S3Client(f'http://127.0.0.1:{server.port}', 'backups', 'test', 'testsecret')
+
+
+@pytest.fixture
+def world(tmp_path):
+    root = tmp_path / 'world'
+    (root / 'region').mkdir(parents=True)
+    for i in range(4):
+        (root / 'region' / f'r.{i}.0.mca').write_bytes(os.urandom(5000))
+    (root / 'level.dat').write_bytes(b'level')
+    return root
+
+
+def keys(client, prefix=PREFIX):
+    return sorted(item['key'] for item in client.list_objects(prefix))
+
+
+def part_uploads(server):
+    return [params['partNumber'] for method, _, params in server.requests if method == 'PUT' and 'partNumber' in params]
+
+
+def zip_backup(tmp_path, name, size):
+    backup_dir = tmp_path / 'backups'
+    backup_dir.mkdir(exist_ok=True)
+    data = os.urandom(size)
+    (backup_dir / f'{name}.zip').write_bytes(data)
+    return {'name': name, 'type': 'zip', 'checksum': hashlib.sha256(data).hexdigest()}, data
+
+
+def test_object_round_trip(client):
+    etag = client.put_object('a/one', b'first', {'sha256': 'abc'})
+    assert etag == hashlib.md5(b'first').hexdigest()
+    assert client.get_object('a/one') == b'first'
+    for i in range(5):
+        client.put_object(f'a/many/{i}', str(i).encode())
+    # page_size=2 makes the listing come back in several pages
+    assert keys(client, 'a/') == ['a/many/0', 'a/many/1', 'a/many/2', 'a/many/3', 'a/many/4', 'a/one']
+    client.delete_object('a/one')
+    client.delete_object('a/one')  # Deleting a missing object is not an error
+    with pytest.raises(S3Error) as e:
+        client.get_object('a/one')
+    assert e.value.status == 404
+
+
+def test_rejects_bad_signature(server):
+    client = S3Client(f'http://127.0.0.1:{server.port}', 'backups', 'test', 'wrongsecret')
+    with pytest.raises(S3Error) as e:
+        client.put_object('key', b'data')
+    assert e.value.status == 403
+
+
+def test_multipart_round_trip(client):
+    parts = [os.urandom(MIN_PART_SIZE), b'tail']
+    upload_id = client.create_multipart_upload('big')
+    md5s = [client.upload_part('big', upload_id, number, data) for number, data in enumerate(parts, 1)]
+    assert client.list_parts('big', upload_id) == {
+        number: {'etag': md5, 'size': len(data)} for number, (md5, data) in enumerate(zip(md5s, parts), 1)
+    }
+    etag = client.complete_multipart_upload('big', upload_id, list(enumerate(md5s, 1)))
+    assert etag == multipart_etag(md5s)
+    assert client.get_object('big') == b''.join(parts)
+    with pytest.raises(S3Error) as e:
+        client.list_parts('big', upload_id)
+    assert e.value.status == 404
+
+
+def test_replicate_zip(tmp_path, client):
+    replicator = Replicator(client, PREFIX, workers=2, part_size=MIN_PART_SIZE)
+    small, small_data = zip_backup(tmp_path, 'small', 1000)
+    large, large_data = zip_backup(tmp_path, 'large', 2 * MIN_PART_SIZE + 100)
+    assert replicator.replicate(small, str(tmp_path / 'backups'), str(tmp_path / 'snapshots')) == 1000
+    assert replicator.replicate(large, str(tmp_path / 'backups'), str(tmp_path / 'snapshots')) == len(large_data)
+    assert client.get_object(PREFIX + 'zips/small.zip') == small_data
+    assert client.get_object(PREFIX + 'zips/large.zip') == large_data
+    assert sorted((b['name'], b['type']) for b in replicator.remote_backups()) == [('large', 'zip'), ('small', 'zip')]
+
+
+def test_replicate_snapshots_share_blobs(tmp_path, client, world):
+    snapshot_dir = str(tmp_path / 'snapshots')
+    replicator = Replicator(client, PREFIX, workers=2)
+    create_snapshot(str(world), snapshot_dir, 'one')
+    (world / 'region' / 'r.0.0.mca').write_bytes(os.urandom(5000))
+    create_snapshot(str(world), snapshot_dir, 'two')
+    for name in ('one', 'two'):
+        replicator.replicate({'name': name, 'type': 'snapshot', 'checksum': None}, None, snapshot_dir)
+
+    # Unchanged files are uploaded once; the changed region adds one blob
+    assert len(keys(client, PREFIX + 'blobs/')) == 6
+    manifest = json.loads(client.get_object(PREFIX + f'snapshots/two/{MANIFEST_NAME}'))
+    for rel, entry in manifest['files'].items():
+        with open(os.path.join(world, rel), 'rb') as f:
+            assert client.get_object(PREFIX + 'blobs/' + entry['blob']) == f.read()
+    assert sorted(b['name'] for b in Replicator(client, PREFIX).remote_backups()) == ['one', 'two']
+
+
+def test_retention_and_garbage_collection(tmp_path, client, world):
+    snapshot_dir = str(tmp_path / 'snapshots')
+    replicator = Replicator(client, PREFIX)
+    for name in ('one', 'two', 'three'):
+        (world / 'region' / 'r.0.0.mca').write_bytes(os.urandom(5000))
+        create_snapshot(str(world), snapshot_dir, name)
+        replicator.replicate({'name': name, 'type': 'snapshot', 'checksum': None}, None, snapshot_dir)
+    backup, _ = zip_backup(tmp_path, 'zip', 100)
+    replicator.replicate(backup, str(tmp_path / 'backups'), snapshot_dir)
+    assert len(keys(client, PREFIX + 'blobs/')) == 7
+
+    assert replicator.apply_retention(2) == ['one']
+    assert sorted(b['name'] for b in replicator.remote_backups()) == ['three', 'two', 'zip']
+    # Only the r.0.0.mca blob unique to "one" went with it
+    assert len(keys(client, PREFIX + 'blobs/')) == 6
+    assert replicator.collect_garbage() == 0
+
+
+def test_dropped_part_is_retried(tmp_path, server, client):
+    server.fail_parts = 1
+    replicator = Replicator(client, PREFIX, part_size=MIN_PART_SIZE)
+    backup, data = zip_backup(tmp_path, 'large', MIN_PART_SIZE + 100)
+    replicator.replicate(backup, str(tmp_path / 'backups'), None)
+    assert client.get_object(PREFIX + 'zips/large.zip') == data
+
+
+def test_interrupted_upload_resumes(tmp_path, server, client):
+    state_dir = str(tmp_path / 'state')
+    backup, data = zip_backup(tmp_path, 'large', 3 * MIN_PART_SIZE)
+    cancel_event = threading.Event()
+
+    class CancelAfterFirstPart(BackupProgress):
+        def add_bytes(self, count, throttled=True):
+            super().add_bytes(count, throttled)
+            cancel_event.set()
+
+    replicator = Replicator(client, PREFIX, workers=1, part_size=MIN_PART_SIZE, state_dir=state_dir)
+    with pytest.raises(BackupCancelled):
+        replicator.replicate(backup, str(tmp_path / 'backups'), None, CancelAfterFirstPart(), cancel_event)
+    assert part_uploads(server) == ['1']
+    assert os.listdir(state_dir)
+
+    server.requests.clear()
+    uploaded = Replicator(client, PREFIX, part_size=MIN_PART_SIZE, state_dir=state_dir).replicate(
+        backup, str(tmp_path / 'backups'), None)
+    assert sorted(part_uploads(server)) == ['2', '3']
+    assert uploaded == 2 * MIN_PART_SIZE
+    assert client.get_object(PREFIX + 'zips/large.zip') == data
+    assert os.listdir(state_dir) == []
+
+
+def test_discard_stale_uploads(tmp_path, server, client):
+    state_dir = str(tmp_path / 'state')
+    backup, _ = zip_backup(tmp_path, 'large', 2 * MIN_PART_SIZE)
+    cancel_event = threading.Event()
+    cancel_event.set()
+    replicator = Replicator(client, PREFIX, part_size=MIN_PART_SIZE, state_dir=state_dir)
+    with pytest.raises(BackupCancelled):
+        replicator.replicate(backup, str(tmp_path / 'backups'), None, cancel_event=cancel_event)
+    assert replicator.discard_stale_uploads() == 0  # The local file is still there
+
+    os.remove(tmp_path / 'backups' / 'large.zip')
+    assert replicator.discard_stale_uploads() == 1
+    assert os.listdir(state_dir) == []
+    assert os.listdir(os.path.join(server.root, 'backups', 'uploads')) == []
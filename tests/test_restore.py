@@ -0,0 +1,107 @@
+import os
+import sys
+import threading
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'web'))
+
+import pytest
+
+from backups import BackupCancelled, scan_files, write_zip
+from restore import snapshot_entries, stage_restore, swap_into_place, zip_entries
+from snapshots import create_snapshot
+
+
+def tree(root):
+    contents = {}
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            with open(path, 'rb') as f:
+                contents[os.path.relpath(path, root)] = f.read()
+    return contents
+
+
+@pytest.fixture
+def world(tmp_path):
+    root = tmp_path / 'world'
+    (root / 'region').mkdir(parents=True)
+    for i in range(5):
+        (root / 'region' / f'r.{i}.0.mca').write_bytes(os.urandom(5000))
+    (root / 'level.dat').write_bytes(b'level')
+    return root
+
+
+def play(world):
+    """Change the world the way a session would after the backup."""
+    (world / 'region' / 'r.0.0.mca').write_bytes(os.urandom(5000))
+    (world / 'region' / 'r.1.0.mca').unlink()
+    (world / 'region' / 'r.9.0.mca').write_bytes(b'new region')
+
+
+def backup_zip(world, tmp_path):
+    archive = tmp_path / 'backup.zip'
+    write_zip(scan_files(str(world), str(tmp_path)), str(archive))
+    return archive
+
+
+def test_zip_restore_reuses_unchanged_files(world, tmp_path):
+    original = tree(world)
+    entries = zip_entries(str(backup_zip(world, tmp_path)))
+    play(world)
+    staging = tmp_path / '.restore_world'
+    stats = stage_restore(entries, str(world), str(staging), workers=3)
+    assert tree(staging) == original
+    assert stats['files_written'] == 2 and stats['files_reused'] == 4
+    assert os.path.samefile(staging / 'level.dat', world / 'level.dat')
+
+
+def test_snapshot_restore(world, tmp_path):
+    original = tree(world)
+    snapshots = tmp_path / 'snapshots'
+    snapshots.mkdir()
+    create_snapshot(str(world), str(snapshots), 'snap')
+    play(world)
+    staging = tmp_path / '.restore_world'
+    stats = stage_restore(snapshot_entries(str(snapshots), 'snap'), str(world), str(staging))
+    assert tree(staging) == original
+    assert stats['files_written'] == 2
+    # Written files are copies, never links into the snapshot
+    assert not os.path.samefile(staging / 'region' / 'r.0.0.mca', snapshots / 'snap' / 'world' / 'region' / 'r.0.0.mca')
+
+
+def test_unsafe_archive_paths_are_rejected(tmp_path):
+    archive = tmp_path / 'evil.zip'
+    with zipfile.ZipFile(archive, 'w') as zipf:
+        zipf.writestr('world/level.dat', b'level')
+        zipf.writestr('world/../../escape', b'x')
+    with pytest.raises(ValueError):
+        zip_entries(str(archive))
+
+
+def test_cancelled_restore_removes_staging(world, tmp_path):
+    entries = zip_entries(str(backup_zip(world, tmp_path)))
+    cancel = threading.Event()
+    cancel.set()
+    staging = tmp_path / '.restore_world'
+    with pytest.raises(BackupCancelled):
+        stage_restore(entries, str(world), str(staging), cancel_event=cancel)
+    assert not staging.exists()
+
+
+def test_swap_keeps_the_replaced_world(world, tmp_path):
+    staging = tmp_path / '.restore_world'
+    staging.mkdir()
+    (staging / 'level.dat').write_bytes(b'restored')
+    replaced = tmp_path / '.replaced_world'
+    assert swap_into_place(str(staging), str(world), str(replaced))
+    assert (world / 'level.dat').read_bytes() == b'restored'
+    assert (replaced / 'level.dat').read_bytes() == b'level'
+    assert not staging.exists()
+
+
+def test_swap_into_missing_world(tmp_path):
+    staging = tmp_path / '.restore_new'
+    staging.mkdir()
+    assert not swap_into_place(str(staging), str(tmp_path / 'new'), str(tmp_path / '.replaced_new'))
+    assert (tmp_path / 'new').is_dir()
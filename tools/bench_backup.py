@@ -0,0 +1,125 @@
+"""Benchmark backup compression against the original zipfile loop.
+
+Generates a synthetic world of region files (or uses an existing world
+with --world) and archives it three ways: the baseline the manager used
+before parallel compression (zipfile.ZipFile with ZIP_DEFLATED, one
+zipf.write per file), the serial write_zip, and write_zip_parallel at each
+worker count. Reports throughput, archive size and speedup over the
+baseline. Every archive is verified with zipfile's CRC check.
+
+    python tools/bench_backup.py --size-mb 4096 --workers 2,4,8
+    python tools/bench_backup.py --world /minecraft/world --workers 4
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'web'))
+
+from backups import BackupProgress, scan_files, write_zip, write_zip_parallel  # noqa: E402
+
+REGION_BYTES = 8 * 1024 * 1024
+SECTOR_BYTES = 4096
+
+
+def make_region(path, rng):
+    """Write a region-sized file that compresses roughly like a real one.
+
+    Chunk data in .mca files is already zlib-compressed, so most sectors are
+    close to random; the rest are padding and sparse headers that deflate well.
+    """
+    with open(path, 'wb') as f:
+        f.write(bytes(8192))  # Location and timestamp tables
+        for _ in range((REGION_BYTES - 8192) // SECTOR_BYTES):
+            used = SECTOR_BYTES if rng.random() < 0.8 else rng.randrange(SECTOR_BYTES)
+            f.write(os.urandom(used) + bytes(SECTOR_BYTES - used))
+
+
+def make_world(root, size_mb, seed=1):
+    rng = random.Random(seed)
+    for sub in ('region', 'DIM-1/region', 'DIM1/region'):
+        os.makedirs(os.path.join(root, sub), exist_ok=True)
+    count = max(1, size_mb * 1024 * 1024 // REGION_BYTES)
+    for i in range(count):
+        # Mostly overworld, like a real save
+        sub = 'region' if i % 10 < 8 else ('DIM-1/region' if i % 10 == 8 else 'DIM1/region')
+        make_region(os.path.join(root, sub, f'r.{i}.{-i}.mca'), rng)
+    os.makedirs(os.path.join(root, 'playerdata'), exist_ok=True)
+    for i in range(50):
+        with open(os.path.join(root, 'playerdata', f'player{i}.dat'), 'wb') as f:
+            f.write(b'\x0a\x00\x00' + b'\x01\x00\x04Dead\x00' * 500)
+
+
+def write_zipfile(files, archive_path):
+    """The original backup loop, kept as the baseline."""
+    with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for path, arcname, _ in files:
+            zipf.write(path, arcname)
+
+
+def run(label, files, archive_path, workers):
+    progress = BackupProgress()
+    started = time.monotonic()
+    if label == 'zipfile':
+        write_zipfile(files, archive_path)
+    elif workers == 1:
+        write_zip(files, archive_path, progress)
+    else:
+        write_zip_parallel(files, archive_path, progress, workers=workers)
+    elapsed = time.monotonic() - started
+    with zipfile.ZipFile(archive_path) as zipf:
+        bad = zipf.testzip()
+    total = sum(size for _, _, size in files)
+    result = {
+        'writer': label,
+        'workers': workers,
+        'seconds': round(elapsed, 2),
+        'mb_per_second': round(total / elapsed / (1024 * 1024), 1),
+        'archive_mb': round(os.path.getsize(archive_path) / (1024 * 1024), 1),
+        'verified': bad is None,
+    }
+    os.remove(archive_path)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--world', help='existing world directory to archive instead of a synthetic one')
+    parser.add_argument('--size-mb', type=int, default=2048, help='synthetic world size in MB')
+    parser.add_argument('--workers', default=','.join(str(n) for n in sorted({2, 4, os.cpu_count() or 1} - {1})),
+                        help='comma-separated worker counts for the parallel writer')
+    parser.add_argument('--keep', action='store_true', help='keep the synthetic world afterwards')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_backup_')
+    try:
+        world = args.world
+        if world is None:
+            world = os.path.join(workdir, 'world')
+            print(f"Generating {args.size_mb} MB synthetic world in {world}", file=sys.stderr)
+            make_world(world, args.size_mb)
+        files = scan_files(world, os.path.dirname(os.path.abspath(world)))
+        archive_path = os.path.join(workdir, 'bench.zip')
+
+        baseline = run('zipfile', files, archive_path, 1)
+        print(json.dumps(baseline))
+        runs = [('serial', 1)] + [('parallel', int(n)) for n in args.workers.split(',') if n]
+        for label, workers in runs:
+            result = run(label, files, archive_path, workers)
+            result['speedup'] = round(baseline['seconds'] / result['seconds'], 2)
+            print(json.dumps(result))
+    finally:
+        if args.keep:
+            print(f"Kept {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Benchmark backup compression codecs on a world.
+
+Compresses every file of a world (a synthetic one by default, or an existing
+world with --world) with each codec on a single thread, and reports per
+codec and file type the throughput in MB/s and the compressed size as a
+ratio of the original. Use it to pick BACKUP_CODEC and BACKUP_CODEC_RULES:
+a file type that barely shrinks is better stored.
+
+    python tools/bench_codecs.py --world /minecraft/world
+    python tools/bench_codecs.py --size-mb 512 --codecs store,deflate-1,deflate-6,lzma
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'web'))
+
+from backups import available_codecs, compress_file, get_codec, scan_files  # noqa: E402
+from bench_backup import make_world  # noqa: E402
+
+
+def bench_codec(codec, groups):
+    """Compress each file group with ``codec``; returns one result per group plus a total."""
+    results = []
+    total = {'bytes': 0, 'compressed': 0, 'seconds': 0.0}
+    for ext, paths in sorted(groups.items()):
+        size = compressed = 0
+        started = time.monotonic()
+        for path in paths:
+            result = compress_file(path, codec)
+            if result is None:
+                continue
+            _, _, file_size, spool, compressed_size = result
+            spool.close()
+            size += file_size
+            compressed += compressed_size
+        elapsed = time.monotonic() - started
+        results.append(summarize(codec.name, ext, size, compressed, elapsed))
+        total['bytes'] += size
+        total['compressed'] += compressed
+        total['seconds'] += elapsed
+    results.append(summarize(codec.name, 'all', total['bytes'], total['compressed'], total['seconds']))
+    return results
+
+
+def summarize(codec, ext, size, compressed, elapsed):
+    return {
+        'codec': codec,
+        'type': ext,
+        'mb': round(size / (1024 * 1024), 1),
+        'mb_per_second': round(size / elapsed / (1024 * 1024), 1) if elapsed else None,
+        'ratio': round(compressed / size, 3) if size else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--world', help='existing world directory to benchmark instead of a synthetic one')
+    parser.add_argument('--size-mb', type=int, default=512, help='synthetic world size in MB')
+    parser.add_argument('--codecs', default=','.join(available_codecs()),
+                        help='comma-separated codecs, e.g. store,deflate-6,lzma,zstd-3')
+    args = parser.parse_args()
+    codecs = [get_codec(spec) for spec in args.codecs.split(',') if spec]
+
+    workdir = tempfile.mkdtemp(prefix='bench_codecs_')
+    try:
+        world = args.world
+        if world is None:
+            world = os.path.join(workdir, 'world')
+            print(f"Generating {args.size_mb} MB synthetic world in {world}", file=sys.stderr)
+            make_world(world, args.size_mb)
+        groups = defaultdict(list)
+        for path, _, _ in scan_files(world, os.path.dirname(os.path.abspath(world))):
+            groups[os.path.splitext(path)[1].lower() or '(none)'].append(path)
+
+        for codec in codecs:
+            for result in bench_codec(codec, groups):
+                print(json.dumps(result))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Benchmark console ingestion against tools/fake_server.py.
+
+Runs the fake server at a given output rate and feeds its stdout through
+either the batched reader used by the manager or the old line-at-a-time
+reader, then reports sustained ingestion throughput and how long the
+producer spent blocked on a full stdout pipe.
+
+    python tools/bench_console.py --unlimited --duration 5
+    python tools/bench_console.py --rate 50000 --duration 10 --mode legacy
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'web'))
+
+from console import ConsoleBuffer, iter_line_batches  # noqa: E402
+
+logger = logging.getLogger('bench')
+FAKE_SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_server.py')
+
+
+def read_batched(process, buffer):
+    """Current reader: bulk reads, one lock acquisition per batch."""
+    debug = logger.isEnabledFor(logging.DEBUG)
+    for lines in iter_line_batches(process.stdout):
+        buffer.extend(lines)
+        if debug:
+            for line in lines:
+                logger.debug("MC: %s", line)
+
+
+def read_legacy(process, buffer):
+    """Previous reader: one readline, decode and lock per line."""
+    for line in iter(process.stdout.readline, b''):
+        decoded = line.decode('utf-8', errors='ignore').strip()
+        if decoded:
+            buffer.append(decoded)
+            logger.debug(f"MC: {decoded}")
+
+
+def run(mode, rate, unlimited, duration, line_size, buffer_mb):
+    cmd = [sys.executable, FAKE_SERVER, '--duration', str(duration), '--line-size', str(line_size)]
+    cmd += ['--unlimited'] if unlimited else ['--rate', str(rate)]
+    buffer = ConsoleBuffer(max_bytes=buffer_mb * 1024 * 1024)
+    reader = read_batched if mode == 'batched' else read_legacy
+
+    started = time.monotonic()
+    # The legacy reader relied on a buffered stdout for readline
+    process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, bufsize=0 if mode == 'batched' else -1)
+    thread = threading.Thread(target=reader, args=(process, buffer))
+    thread.start()
+    thread.join()
+    elapsed = time.monotonic() - started
+    producer = json.loads(process.stderr.read().decode().strip().splitlines()[-1])
+    process.wait()
+
+    ingested = buffer.cursor
+    return {
+        'mode': mode,
+        'lines_ingested': ingested,
+        'ingest_lines_per_second': round(ingested / elapsed),
+        'ingest_mb_per_second': round(ingested * line_size / elapsed / (1024 * 1024), 1),
+        'producer_lines_per_second': producer['lines_per_second'],
+        'producer_blocked_seconds': producer['blocked_seconds'],
+        'producer_blocked_percent': round(100 * producer['blocked_seconds'] / max(producer['elapsed_seconds'], 1e-9), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--mode', choices=['batched', 'legacy', 'both'], default='both')
+    parser.add_argument('--rate', type=int, default=20000, help='producer lines per second')
+    parser.add_argument('--unlimited', action='store_true', help='produce as fast as the pipe allows')
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--line-size', type=int, default=120)
+    parser.add_argument('--buffer-mb', type=int, default=64, help='console buffer size in MB')
+    args = parser.parse_args()
+
+    modes = ['batched', 'legacy'] if args.mode == 'both' else [args.mode]
+    for mode in modes:
+        result = run(mode, args.rate, args.unlimited, args.duration, args.line_size, args.buffer_mb)
+        print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Local stand-in for a Minecraft server's RCON listener.
+
+Speaks the RCON protocol like the vanilla server: password login, command
+execution with responses split into 4096-byte packets, and "Unknown request"
+replies to other packet types. Answers a few commands (list, save-off,
+save-on, save-all, stop) and can add artificial latency per command.
+
+    python tools/fake_rcon.py --port 25575 --password secret --delay 0.05
+
+It can also be started in-process:
+
+    server = FakeRconServer(password='secret')
+    server.start()
+    ... RconPool('127.0.0.1', server.port, 'secret') ...
+    server.stop()
+"""
+import argparse
+import os
+import socketserver
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'web'))
+
+from rcon import (  # noqa: E402
+    SERVERDATA_AUTH, SERVERDATA_EXECCOMMAND, RconError, encode_packet, read_packet,
+)
+
+RESPONSE_CHUNK = 4096
+
+RESPONSES = {
+    'list': 'There are 0 of a max of 20 players online: ',
+    'save-off': 'Automatic saving is now disabled',
+    'save-on': 'Automatic saving is now enabled',
+    'save-all': 'Saving the game (this may take a moment!)Saved the game',
+    'save-all flush': 'Saving the game (this may take a moment!)Saved the game',
+    'stop': 'Stopping the server',
+}
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server = self.server
+        authenticated = False
+        try:
+            while True:
+                request_id, packet_type, payload = read_packet(self.request)
+                if packet_type == SERVERDATA_AUTH:
+                    authenticated = payload == server.password
+                    self.request.sendall(encode_packet(request_id if authenticated else -1,
+                                                       SERVERDATA_EXECCOMMAND, ''))
+                elif not authenticated:
+                    self.request.sendall(encode_packet(-1, SERVERDATA_EXECCOMMAND, ''))
+                elif packet_type == SERVERDATA_EXECCOMMAND:
+                    server.commands.append(payload)
+                    if server.delay:
+                        time.sleep(server.delay)
+                    response = server.respond(payload)
+                    # Long responses are split over several packets
+                    for start in range(0, max(len(response), 1), RESPONSE_CHUNK):
+                        self.request.sendall(encode_packet(request_id, 0, response[start:start + RESPONSE_CHUNK]))
+                    if payload == 'stop':
+                        return
+                else:
+                    self.request.sendall(encode_packet(request_id, 0, f'Unknown request {packet_type:x}'))
+        except (RconError, OSError):
+            pass
+
+
+class FakeRconServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0, password='secret', delay=0.0):
+        super().__init__((host, port), _Handler)
+        self.password = password
+        self.delay = delay
+        self.commands = []  # Every command received, for assertions in tests
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def respond(self, command):
+        """Return the response text for a command."""
+        if command.startswith('repeat '):
+            # "repeat <n>" returns n bytes, to exercise multi-packet responses
+            return 'x' * int(command.split()[1])
+        return RESPONSES.get(command, 'Unknown or incomplete command, see below for error')
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=25575)
+    parser.add_argument('--password', default='secret')
+    parser.add_argument('--delay', type=float, default=0.0, help='seconds of latency added to each command')
+    args = parser.parse_args()
+
+    server = FakeRconServer(args.host, args.port, args.password, args.delay)
+    print(f"Fake RCON server listening on {args.host}:{server.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
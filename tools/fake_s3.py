@@ -0,0 +1,326 @@
+"""Local stand-in for an S3-compatible object store, backed by a directory.
+
+Implements the calls backup replication uses: object PUT, GET, HEAD and
+DELETE, ListObjectsV2 with paging, and multipart uploads (create, upload
+part, list parts, complete, abort). Like S3 it checks each request's
+Signature Version 4, Content-MD5 and x-amz-content-sha256, and returns MD5
+ETags, so replication's checksum handling is exercised for real. Buckets
+are created on first use. It can drop the connection on the first N part
+uploads, to exercise retries and resumed uploads.
+
+    python tools/fake_s3.py --root /tmp/fake-s3 --port 9000 --access-key test --secret-key testsecret
+
+It can also be started in-process:
+
+    server = FakeS3Server('/tmp/fake-s3')
+    server.start()
+    ... S3Client(f'http://127.0.0.1:{server.port}', 'backups', 'test', 'testsecret') ...
+    server.stop()
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, quote, unquote, urlsplit
+from xml.sax.saxutils import escape
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'web'))
+
+from s3 import sign_request  # noqa: E402
+
+XMLNS = 'http://s3.amazonaws.com/doc/2006-03-01/'
+
+
+def _timestamp(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_HEAD(self):
+        self._dispatch('HEAD')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+    def _dispatch(self, method):
+        parsed = urlsplit(self.path)
+        path = unquote(parsed.path)
+        params = dict(parse_qsl(parsed.query, keep_blank_values=True))
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        error = self._check_request(method, path, params, body)
+        if error:
+            return self._error(*error)
+        bucket, _, key = path.lstrip('/').partition('/')
+        store = self.server.bucket(bucket)
+        server = self.server
+        server.requests.append((method, key, params))
+        if server.delay:
+            time.sleep(server.delay)
+
+        if 'uploadId' in params:
+            upload_dir = os.path.join(store, 'uploads', params['uploadId'])
+            if not os.path.isdir(upload_dir):
+                return self._error(404, 'NoSuchUpload', 'The specified upload does not exist')
+            if method == 'PUT':
+                with server.lock:
+                    drop = server.fail_parts > 0
+                    server.fail_parts -= drop
+                if drop:
+                    self.close_connection = True
+                    self.connection.close()  # Simulate a network failure mid-upload
+                    return
+                number = int(params['partNumber'])
+                with open(os.path.join(upload_dir, f'{number:05d}'), 'wb') as f:
+                    f.write(body)
+                return self._reply(200, headers={'ETag': f'"{hashlib.md5(body).hexdigest()}"'})
+            if method == 'GET':
+                parts = sorted(name for name in os.listdir(upload_dir) if name.isdigit())
+                items = ''.join(
+                    f'<Part><PartNumber>{int(name)}</PartNumber><ETag>"{self._md5_file(os.path.join(upload_dir, name))}"'
+                    f'</ETag><Size>{os.path.getsize(os.path.join(upload_dir, name))}</Size></Part>'
+                    for name in parts
+                )
+                return self._xml(f'<ListPartsResult xmlns="{XMLNS}"><IsTruncated>false</IsTruncated>'
+                                 f'{items}</ListPartsResult>')
+            if method == 'POST':
+                return self._complete(store, key, upload_dir, body)
+            if method == 'DELETE':
+                shutil.rmtree(upload_dir)
+                return self._reply(204)
+        if method == 'POST' and 'uploads' in params:
+            upload_id = uuid.uuid4().hex
+            os.makedirs(os.path.join(store, 'uploads', upload_id))
+            with open(os.path.join(store, 'uploads', upload_id, 'info.json'), 'w') as f:
+                json.dump({'key': key, 'metadata': self._metadata()}, f)
+            return self._xml(f'<InitiateMultipartUploadResult xmlns="{XMLNS}"><Key>{escape(key)}</Key>'
+                             f'<UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>')
+        if method == 'GET' and not key:
+            return self._list(store, params)
+        if method == 'PUT':
+            etag = hashlib.md5(body).hexdigest()
+            self._write_object(store, key, body, etag, self._metadata())
+            return self._reply(200, headers={'ETag': f'"{etag}"'})
+        info = self._read_info(store, key)
+        if info is None:
+            if method == 'DELETE':
+                return self._reply(204)
+            return self._error(404, 'NoSuchKey', 'The specified key does not exist')
+        if method == 'DELETE':
+            os.remove(self._info_path(store, key))
+            os.remove(self._object_path(store, key))
+            return self._reply(204)
+        headers = {'ETag': f'"{info["etag"]}"', 'Last-Modified': info['last_modified']}
+        headers.update({f'x-amz-meta-{name}': value for name, value in info['metadata'].items()})
+        if method == 'HEAD':
+            headers['Content-Length'] = str(os.path.getsize(self._object_path(store, key)))
+            return self._reply(200, headers=headers, head=True)
+        with open(self._object_path(store, key), 'rb') as f:
+            return self._reply(200, f.read(), headers)
+
+    def _check_request(self, method, path, params, body):
+        """Check the signature and body checksums the way S3 does. Returns (status, code, message) or None."""
+        server = self.server
+        authorization = self.headers.get('Authorization', '')
+        try:
+            credential = authorization.split('Credential=', 1)[1].split(',', 1)[0]
+            signed_names = authorization.split('SignedHeaders=', 1)[1].split(',', 1)[0].split(';')
+        except IndexError:
+            return 403, 'AccessDenied', 'Missing or malformed Authorization header'
+        access_key, date, region, _, _ = credential.split('/')
+        if access_key != server.access_key:
+            return 403, 'InvalidAccessKeyId', 'The access key does not exist'
+        payload_hash = self.headers.get('x-amz-content-sha256', '')
+        expected = sign_request(
+            method, self.headers.get('Host', ''), path, params,
+            {name: self.headers.get(name, '') for name in signed_names}, payload_hash,
+            access_key, server.secret_key, region, self.headers.get('x-amz-date', ''),
+        )
+        if expected != authorization:
+            return 403, 'SignatureDoesNotMatch', 'The request signature does not match'
+        if payload_hash != hashlib.sha256(body).hexdigest():
+            return 400, 'XAmzContentSHA256Mismatch', 'The provided x-amz-content-sha256 does not match'
+        content_md5 = self.headers.get('Content-MD5')
+        if content_md5 is not None and content_md5 != base64.b64encode(hashlib.md5(body).digest()).decode('ascii'):
+            return 400, 'BadDigest', 'The Content-MD5 you specified did not match what was received'
+        return None
+
+    def _complete(self, store, key, upload_dir, body):
+        requested = [(int(part.find('PartNumber').text), part.find('ETag').text.strip('"'))
+                     for part in ET.fromstring(body).findall('Part')]
+        md5s = []
+        temp_path = self._object_path(store, key) + '.assembling'
+        os.makedirs(os.path.dirname(temp_path), exist_ok=True)
+        with open(temp_path, 'wb') as out:
+            for number, etag in requested:
+                part_path = os.path.join(upload_dir, f'{number:05d}')
+                if not os.path.exists(part_path) or self._md5_file(part_path) != etag:
+                    out.close()
+                    os.remove(temp_path)
+                    return self._error(400, 'InvalidPart', f'Part {number} is missing or its ETag does not match')
+                md5s.append(etag)
+                with open(part_path, 'rb') as src:
+                    shutil.copyfileobj(src, out)
+        with open(os.path.join(upload_dir, 'info.json')) as f:
+            info = json.load(f)
+        etag = hashlib.md5(b''.join(bytes.fromhex(md5) for md5 in md5s)).hexdigest() + f'-{len(md5s)}'
+        os.replace(temp_path, self._object_path(store, key))
+        self._write_info(store, key, etag, info['metadata'])
+        shutil.rmtree(upload_dir)
+        return self._xml(f'<CompleteMultipartUploadResult xmlns="{XMLNS}"><Key>{escape(key)}</Key>'
+                         f'<ETag>"{etag}"</ETag></CompleteMultipartUploadResult>')
+
+    def _list(self, store, params):
+        prefix = params.get('prefix', '')
+        after = params.get('continuation-token', '')
+        keys = sorted(unquote(name[:-len('.json')]) for name in os.listdir(os.path.join(store, 'meta')))
+        keys = [key for key in keys if key.startswith(prefix) and key > after]
+        page, more = keys[:self.server.page_size], len(keys) > self.server.page_size
+        items = ''
+        for key in page:
+            info = self._read_info(store, key)
+            items += (f'<Contents><Key>{escape(key)}</Key><LastModified>{info["last_modified"]}</LastModified>'
+                      f'<ETag>"{info["etag"]}"</ETag><Size>{os.path.getsize(self._object_path(store, key))}</Size>'
+                      f'</Contents>')
+        token = f'<NextContinuationToken>{escape(page[-1])}</NextContinuationToken>' if more else ''
+        return self._xml(f'<ListBucketResult xmlns="{XMLNS}"><Prefix>{escape(prefix)}</Prefix>'
+                         f'<KeyCount>{len(page)}</KeyCount><IsTruncated>{str(more).lower()}</IsTruncated>'
+                         f'{token}{items}</ListBucketResult>')
+
+    def _metadata(self):
+        return {name.lower()[len('x-amz-meta-'):]: value for name, value in self.headers.items()
+                if name.lower().startswith('x-amz-meta-')}
+
+    @staticmethod
+    def _object_path(store, key):
+        return os.path.join(store, 'objects', quote(key, safe=''))
+
+    @staticmethod
+    def _info_path(store, key):
+        return os.path.join(store, 'meta', quote(key, safe='') + '.json')
+
+    def _write_object(self, store, key, body, etag, metadata):
+        temp_path = self._object_path(store, key) + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(body)
+        os.replace(temp_path, self._object_path(store, key))
+        self._write_info(store, key, etag, metadata)
+
+    def _write_info(self, store, key, etag, metadata):
+        with open(self._info_path(store, key), 'w') as f:
+            json.dump({'etag': etag, 'metadata': metadata, 'last_modified': _timestamp(time.time())}, f)
+
+    def _read_info(self, store, key):
+        try:
+            with open(self._info_path(store, key)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _md5_file(path):
+        with open(path, 'rb') as f:
+            return hashlib.md5(f.read()).hexdigest()
+
+    def _xml(self, document):
+        self._reply(200, ('<?xml version="1.0" encoding="UTF-8"?>' + document).encode('utf-8'),
+                    {'Content-Type': 'application/xml'})
+
+    def _error(self, status, code, message):
+        self._reply(status, (f'<?xml version="1.0" encoding="UTF-8"?><Error><Code>{code}</Code>'
+                             f'<Message>{escape(message)}</Message></Error>').encode('utf-8'),
+                    {'Content-Type': 'application/xml'})
+
+    def _reply(self, status, body=b'', headers=None, head=False):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if not head:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body and not head:
+            self.wfile.write(body)
+
+
+class FakeS3Server(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, root, host='127.0.0.1', port=0, access_key='test', secret_key='testsecret',
+                 delay=0.0, fail_parts=0, page_size=1000, verbose=False):
+        super().__init__((host, port), _Handler)
+        self.root = root
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.delay = delay
+        self.fail_parts = fail_parts  # Part uploads still to fail by dropping the connection
+        self.page_size = page_size
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.requests = []  # (method, key, params) of every request, for assertions in tests
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def bucket(self, name):
+        path = os.path.join(self.root, name)
+        for sub in ('objects', 'meta', 'uploads'):
+            os.makedirs(os.path.join(path, sub), exist_ok=True)
+        return path
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--root', required=True, help='directory holding the buckets')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--access-key', default='test')
+    parser.add_argument('--secret-key', default='testsecret')
+    parser.add_argument('--delay', type=float, default=0.0, help='seconds of latency added to each request')
+    parser.add_argument('--fail-parts', type=int, default=0, help='drop the connection on the first N part uploads')
+    parser.add_argument('--page-size', type=int, default=1000, help='keys per ListObjectsV2 page')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args()
+
+    server = FakeS3Server(args.root, args.host, args.port, args.access_key, args.secret_key,
+                          args.delay, args.fail_parts, args.page_size, args.verbose)
+    print(f"Fake S3 server listening on http://{args.host}:{server.port}, storing in {args.root}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
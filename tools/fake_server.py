@@ -0,0 +1,112 @@
+"""Stand-in for a Minecraft server JVM, used for load testing the manager.
+
+Prints Minecraft-style log lines to stdout at a configurable rate and answers
+a few console commands on stdin (list, save-off, save-on, save-all, stop).
+On exit it writes a JSON summary to stderr, including how long writes were
+blocked on a full stdout pipe.
+
+    python tools/fake_server.py --rate 20000 --duration 10
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+stop_event = threading.Event()
+write_lock = threading.Lock()
+stats = {'lines': 0, 'blocked_seconds': 0.0}
+
+
+def log(message, level='INFO', thread='Server thread'):
+    """Write one log line in the vanilla server format."""
+    line = f"[{time.strftime('%H:%M:%S')}] [{thread}/{level}]: {message}\n".encode()
+    with write_lock:
+        sys.stdout.buffer.write(line)
+        sys.stdout.buffer.flush()
+
+
+def handle_commands():
+    """Answer console commands read from stdin."""
+    for raw in sys.stdin.buffer:
+        command = raw.decode('utf-8', errors='ignore').strip()
+        if command == 'stop':
+            stop_event.set()
+            return
+        elif command == 'list':
+            log('There are 0 of a max of 20 players online: ')
+        elif command == 'save-off':
+            log('Automatic saving is now disabled')
+        elif command == 'save-on':
+            log('Automatic saving is now enabled')
+        elif command.startswith('save-all'):
+            log('Saving the game (this may take a moment!)')
+            log('Saved the game')
+        elif command:
+            log('Unknown or incomplete command, see below for error', level='ERROR')
+    stop_event.set()
+
+
+def spam(rate, duration, line_size):
+    """Write filler log lines at ``rate`` lines/sec (None = as fast as possible)."""
+    filler = 'x' * max(0, line_size - 40)
+    batch = max(1, rate // 100) if rate else 1000
+    interval = batch / rate if rate else 0
+    deadline = time.monotonic() + duration if duration else None
+    next_tick = time.monotonic()
+    n = 0
+    while not stop_event.is_set():
+        if deadline and time.monotonic() >= deadline:
+            break
+        prefix = f"[{time.strftime('%H:%M:%S')}] [Server thread/INFO]: "
+        chunk = ''.join(f"{prefix}spam {n + i} {filler}\n" for i in range(batch)).encode()
+        started = time.monotonic()
+        with write_lock:
+            sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+        stats['blocked_seconds'] += time.monotonic() - started
+        n += batch
+        stats['lines'] = n
+        if interval:
+            next_tick += interval
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rate', type=int, default=0, help='filler lines per second (0 = idle server)')
+    parser.add_argument('--unlimited', action='store_true', help='write filler lines as fast as the pipe accepts them')
+    parser.add_argument('--duration', type=float, default=0, help='exit after this many seconds (0 = run until "stop")')
+    parser.add_argument('--line-size', type=int, default=120, help='approximate bytes per filler line')
+    args = parser.parse_args()
+
+    threading.Thread(target=handle_commands, daemon=True).start()
+
+    log('Starting minecraft server version 1.21')
+    log('Preparing level "world"')
+    log('Done (0.100s)! For help, type "help"')
+
+    started = time.monotonic()
+    if args.rate or args.unlimited:
+        spam(None if args.unlimited else args.rate, args.duration, args.line_size)
+    elif args.duration:
+        stop_event.wait(args.duration)
+    if not args.duration:
+        stop_event.wait()
+    elapsed = time.monotonic() - started
+
+    log('Stopping server')
+    stats['elapsed_seconds'] = round(elapsed, 3)
+    stats['lines_per_second'] = round(stats['lines'] / elapsed) if elapsed else 0
+    stats['blocked_seconds'] = round(stats['blocked_seconds'], 3)
+    sys.stderr.write(json.dumps(stats) + '\n')
+    sys.stderr.flush()
+    # Skip interpreter teardown; the stdin thread may still be blocked in a read
+    os._exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, jsonify, send_file, session, redirect, url_for
+from flask import Flask, render_template, request, jsonify, send_file, session, redirect, url_for, Response, stream_with_context, g
 import os
 import subprocess
 import signal
@@ -6,18 +6,38 @@ import zipfile
 import shutil
 import time
 import threading
+import hmac
 import json
 import logging
 import atexit
 from datetime import datetime, timedelta
+from contextlib import contextmanager
 from werkzeug.utils import secure_filename
 from werkzeug.security import generate_password_hash, check_password_hash
-from collections import deque
 from functools import wraps
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 import psutil
 
+from console import ConsoleBuffer, RESET as CONSOLE_RESET, iter_line_batches
+from console_log import ConsoleLog
+from events import ServerEvents
+from rcon import RconPool, RconError
+from history import CounterRates, MetricsHistory, PeriodicSampler, parse_duration
+from jobs import QUEUED, RUNNING, JobQueue
+from jvm import JvmSampler
+from backups import (BackupCancelled, BackupProgress, CodecPolicy, Throttle, available_codecs, check_cancelled,
+                     clone_files, get_codec, run_low_priority, scan_files, stream_zip, write_zip, write_zip_parallel)
+from replication import Replicator
+from restore import snapshot_entries, stage_restore, swap_into_place, zip_entries
+from prometheus import CONTENT_TYPE as METRICS_CONTENT_TYPE, Counter, Histogram, Registry, TimedLock, counter, gauge
+from properties import PropertiesFile
+from s3 import S3Client
+from status import FileWatch, ProcessSampler, StatusCache
+from snapshots import (create_snapshot, files_to_read, load_manifest, open_snapshot_file, remove_snapshot, scan_world,
+                       select_prunable)
+from catalog import BackupCatalog, snapshot_record, zip_record
+
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB max upload
 # Use a persistent secret key - in production this should be set via environment variable
@@ -47,10 +67,74 @@ limiter = Limiter(
 
 MC_DIR = '/minecraft'
 BACKUP_DIR = '/backups'
+SNAPSHOT_DIR = os.path.join(BACKUP_DIR, 'snapshots')  # Incremental hardlinked snapshots
+BACKUP_CATALOG_PATH = os.path.join(BACKUP_DIR, 'catalog.db')  # Index of all backups
+BACKUP_STAGING_DIR = os.path.join(MC_DIR, '.backup_staging')  # Same filesystem as the world, for reflinks
 USERS_FILE = '/minecraft/users.json'
 LOG_DIR = '/minecraft/logs'
 ALLOWED_EXTENSIONS = {'jar', 'zip'}
 MAX_BACKUP_COUNT = 10  # Keep last 10 backups
+BACKUP_MODE = os.environ.get('BACKUP_MODE', 'zip')  # Default backup type: zip, snapshot or delta
+BACKUP_MODES = ('zip', 'snapshot', 'delta')
+BACKUP_THROTTLE = os.environ.get('BACKUP_THROTTLE', 'false').lower() == 'true'  # Throttle backups by default
+BACKUP_MAX_MB_PER_SECOND = float(os.environ.get('BACKUP_MAX_MB_PER_SECOND', '0'))  # Throttled rate cap, 0 = adaptive only
+BACKUP_MAX_PAUSE_SECONDS = float(os.environ.get('BACKUP_MAX_PAUSE_SECONDS', '10'))  # Longest save pause for staging, 0 = no limit
+REGION_DELTA_MAX_CHAIN = 10  # Region deltas in a row before a region is stored whole again
+BACKUP_WORKERS = int(os.environ.get('BACKUP_WORKERS', str(os.cpu_count() or 1)))  # Compression threads, 1 = serial
+BACKUP_CODEC = os.environ.get('BACKUP_CODEC', 'deflate')  # Zip codec: store, deflate[-level], lzma or zstd[-level]
+BACKUP_CODEC_RULES = os.environ.get('BACKUP_CODEC_RULES', '')  # Per-extension codecs, e.g. ".mca:store,.dat:deflate-9"
+BACKUP_CODEC_POLICY = CodecPolicy.parse(BACKUP_CODEC, BACKUP_CODEC_RULES)
+REPLICATION_ENDPOINT = os.environ.get('REPLICATION_ENDPOINT', '')  # S3-compatible endpoint URL, empty = no replication
+REPLICATION_BUCKET = os.environ.get('REPLICATION_BUCKET', '')
+REPLICATION_PREFIX = os.environ.get('REPLICATION_PREFIX', 'minecraft/')  # Key prefix inside the bucket
+REPLICATION_REGION = os.environ.get('REPLICATION_REGION', 'us-east-1')
+REPLICATION_WORKERS = int(os.environ.get('REPLICATION_WORKERS', '4'))  # Parallel part and file uploads
+REPLICATION_PART_MB = int(os.environ.get('REPLICATION_PART_MB', '16'))  # Multipart upload part size
+REPLICATION_MAX_MB_PER_SECOND = float(os.environ.get('REPLICATION_MAX_MB_PER_SECOND', '0'))  # Upload cap, 0 = none
+REPLICATION_STATE_DIR = os.path.join(BACKUP_DIR, '.replication')  # Unfinished multipart uploads, for resuming
+CONSOLE_BUFFER_MB = int(os.environ.get('CONSOLE_BUFFER_MB', '64'))  # Console history kept in memory
+CONSOLE_PAGE_LINES = 1000  # Default number of lines served per console request
+CONSOLE_MAX_PAGE_LINES = 20000  # Upper bound for the ?limit= parameter
+CONSOLE_LOG_DIR = os.path.join(LOG_DIR, 'console')  # Compressed on-disk console history
+CONSOLE_LOG_RETENTION_DAYS = int(os.environ.get('CONSOLE_LOG_RETENTION_DAYS', '30'))
+CONSOLE_SEARCH_MAX_RESULTS = 1000
+PROPERTIES_BACKUP_HISTORY = int(os.environ.get('PROPERTIES_BACKUP_HISTORY', '10'))  # server.properties copies kept
+STATUS_REFRESH_INTERVAL = 2  # Seconds between status snapshot rebuilds
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')  # Bearer token for scraping /metrics without logging in
+METRICS_SAMPLE_INTERVAL = 1  # Seconds between resource samples for /api/metrics/history
+# Series in the resource history and how samples merge into coarser points
+METRICS_SERIES = {
+    'cpu_percent': 'mean',
+    'memory_mb': 'mean',
+    'memory_peak_mb': 'max',
+    'threads': 'mean',
+    'open_fds': 'mean',
+    'disk_read_bytes_per_second': 'mean',
+    'disk_write_bytes_per_second': 'mean',
+    'net_sent_bytes_per_second': 'mean',
+    'net_recv_bytes_per_second': 'mean',
+    'players': 'mean',
+    'lag_warnings_per_minute': 'mean',
+    'jvm_heap_used_mb': 'mean',
+    'jvm_heap_committed_mb': 'mean',
+    'jvm_old_used_mb': 'mean',
+    'jvm_metaspace_used_mb': 'mean',
+    'jvm_threads': 'mean',
+    'gc_per_minute': 'mean',
+    'gc_pause_percent': 'mean',
+    'gc_pause_max_ms': 'max',
+}
+JVM_JCMD_INTERVAL = 15  # Seconds between jcmd calls when the JVM's perf data file can't be read
+COMMAND_TRANSPORT = os.environ.get('COMMAND_TRANSPORT', 'auto')  # auto, rcon or stdin
+RCON_HOST = os.environ.get('RCON_HOST', '127.0.0.1')
+RCON_POOL_SIZE = 4  # Concurrent RCON commands
+RCON_PROBE_INTERVAL = 5  # Seconds an RCON reachability check is trusted
+SERVER_READY_TIMEOUT = 600  # Seconds to wait for the "Done" line after starting
+COMMAND_MAX_WAIT = 30  # Longest a command request may wait for output, in seconds
+COMMAND_QUIET_SECONDS = 0.3  # Console silence that ends a command's output window
+EXPORT_FLUSH_TIMEOUT = 5  # Longest a world export waits for the save before streaming, in seconds
+CONSOLE_STREAM_QUEUE_SIZE = 1000  # Lines buffered per streaming client before it is dropped
+CONSOLE_STREAM_KEEPALIVE = 15  # Seconds between keepalive comments on idle streams
 
 # Ensure log directory exists
 os.makedirs(LOG_DIR, exist_ok=True)
@@ -94,10 +178,76 @@ def save_users(users_dict):
 
 users = load_users()
 
+# Prometheus metrics served on /metrics; values read at scrape time are
+# added by collect_metrics below
+metrics_registry = Registry()
+request_count = metrics_registry.register(Counter(
+    'minecraft_manager_http_requests_total', 'HTTP requests handled, by route, method and status',
+    ('route', 'method', 'status')))
+request_latency = metrics_registry.register(Histogram(
+    'minecraft_manager_http_request_duration_seconds',
+    'Time to produce a response, by route and method (for streams, until the response starts)',
+    ('route', 'method')))
+job_duration = metrics_registry.register(Histogram(
+    'minecraft_manager_job_duration_seconds', 'Background job run time, by queue, job and final state',
+    ('queue', 'job', 'state'), buckets=(0.1, 1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)))
+backup_duration = metrics_registry.register(Histogram(
+    'minecraft_backup_duration_seconds', 'Time taken by successful backups, by mode',
+    ('mode',), buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)))
+backup_size = metrics_registry.register(Histogram(
+    'minecraft_backup_size_bytes', 'Disk space added by each successful backup, by mode',
+    ('mode',), buckets=tuple(2 ** 20 * size for size in (1, 10, 100, 1000, 10000, 100000))))
+
+def record_job(job_queue, job):
+    """JobQueue hook: time finished jobs for /metrics."""
+    if job.started is not None:
+        job_duration.observe(job.finished - job.started, job_queue.name, job.name, job.state)
+
+def lifecycle_job_done(job_queue, job):
+    """JobQueue hook for lifecycle jobs: record the job and remove the upload
+    an install job was given if it is still there, e.g. because the job was
+    cancelled before it started or failed before using it."""
+    record_job(job_queue, job)
+    if job.name not in ('install-jar', 'install-world'):
+        return
+    upload_path = job.args[0]
+    if any(other.args[:1] == (upload_path,) for other in job_queue.pending()):
+        return  # Uploaded again for a job still to run
+    try:
+        os.remove(upload_path)
+        logger.info(f"Removed unused upload {upload_path}")
+    except FileNotFoundError:
+        pass
+
 # Store server process and console output
 mc_process = None
-console_output = deque(maxlen=1000)
-console_lock = threading.Lock()
+console_lock = TimedLock()  # Counts time spent waiting on the console buffer, for /metrics
+console_output = ConsoleBuffer(max_bytes=CONSOLE_BUFFER_MB * 1024 * 1024, lock=console_lock)
+console_log = ConsoleLog(CONSOLE_LOG_DIR, retention_days=CONSOLE_LOG_RETENTION_DAYS)
+console_log.start()
+server_events = ServerEvents()
+stdin_lock = threading.Lock()
+rcon_pool = None
+rcon_probe = {'time': 0, 'ok': False}
+# Start/stop/restart and JAR/world installs run here one at a time so
+# request threads never block on them and can't race on mc_process
+lifecycle_jobs = JobQueue('lifecycle', on_done=lifecycle_job_done)
+# Backups get their own worker so a long backup doesn't hold up a restart
+backup_jobs = JobQueue('backups', on_done=record_job)
+backup_catalog = BackupCatalog(BACKUP_CATALOG_PATH)
+# Uploads to the replica get their own worker so a slow link never delays a backup
+replication_jobs = JobQueue('replication', on_done=record_job)
+replicator = None
+# Backups read a world on their own queue while restores and uploads replace
+# it on the lifecycle queue; both hold the world's lock while they do
+world_locks = {}
+world_locks_guard = threading.Lock()
+process_sampler = ProcessSampler()
+metrics_history = MetricsHistory(METRICS_SERIES)
+metrics_rates = CounterRates()
+jvm_sampler = JvmSampler(jcmd_interval=JVM_JCMD_INTERVAL)
+jvm_rates = CounterRates()
+server_properties = PropertiesFile(os.path.join(MC_DIR, 'server.properties'), history=PROPERTIES_BACKUP_HISTORY)
 
 def cleanup_minecraft_process():
     """Ensure Minecraft server is properly stopped on exit."""
@@ -115,68 +265,263 @@ def cleanup_minecraft_process():
 # Register cleanup handler
 atexit.register(cleanup_minecraft_process)
 
-def create_backup(backup_name=None):
-    """Create a backup of the current world."""
+def create_backup(backup_name=None, job=None, mode=None, throttle=False, codec=None):
+    """Create a backup of the current world.
+    
+    ``mode`` is 'zip' for a standalone archive, 'snapshot' for an
+    incremental snapshot that hardlinks files unchanged since the last one,
+    or 'delta' for a snapshot that also stores changed region files as just
+    their changed chunks. With ``throttle`` the backup's I/O is held to
+    BACKUP_MAX_MB_PER_SECOND, slowed further whenever the server reports
+    tick lag and run at low priority. Only the work after saving resumes is
+    throttled; staging while saving is paused runs at full speed, so lag
+    never keeps saving off longer.
+    Zip backups compress with ``codec`` in place of BACKUP_CODEC; the
+    per-extension BACKUP_CODEC_RULES still apply.
+    When run as a job, progress is published on ``job.progress`` and the
+    job's cancel event aborts the backup without leaving a partial copy.
+    """
+    mode = mode or BACKUP_MODE
+    started = time.monotonic()
     try:
         if backup_name is None:
-            backup_name = f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            backup_name = f"{'backup' if mode == 'zip' else 'snapshot'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
         
         os.makedirs(BACKUP_DIR, exist_ok=True)
         
-        # Get active world name
-        properties_path = os.path.join(MC_DIR, 'server.properties')
-        world_name = 'world'
-        if os.path.exists(properties_path):
-            with open(properties_path, 'r') as f:
-                for line in f:
-                    if line.startswith('level-name='):
-                        world_name = line.split('=')[1].strip()
-                        break
-        
+        world_name = server_properties.get('level-name', 'world')
         world_path = os.path.join(MC_DIR, world_name)
         if not os.path.exists(world_path):
             logger.warning(f"World path {world_path} does not exist")
             return False, "World not found"
         
-        backup_path = os.path.join(BACKUP_DIR, f"{backup_name}.zip")
-        
-        # Create zip backup
-        with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for root, dirs, files in os.walk(world_path):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, MC_DIR)
-                    zipf.write(file_path, arcname)
-        
-        logger.info(f"Created backup: {backup_name}")
+        if backup_catalog.get(backup_name) is not None:
+            return False, f"A backup named {backup_name} already exists"
+        
+        throttler = None
+        if throttle:
+            max_rate = BACKUP_MAX_MB_PER_SECOND * 1024 * 1024 or None
+            throttler = Throttle(max_rate, lag_signal=lambda: server_events.lag_total)
+        progress = BackupProgress(throttler)
+        cancel_event = None
+        if job is not None:
+            job.progress = progress
+            cancel_event = job.cancel_event
+        
+        def set_phase(phase):
+            if job is not None:
+                job.set_phase(phase)
+        
+        def after_pause(func, *args, **kwargs):
+            if throttle:
+                return run_low_priority(func, *args, **kwargs)
+            return func(*args, **kwargs)
+        
+        snapshot_mode = mode in ('snapshot', 'delta')
+        staging_path = None
+        snapshot_files = None
+        paused_seconds = None
+        copied_paused = 0
+        consistent = True
+        world_lock = lock_world(world_name, job)
+        try:
+            if get_server_status() == 'running':
+                # Capture the world with saving paused, then let the server
+                # save again before the slow part. The files the backup will
+                # read are cloned to a staging copy, which is a quick reflink
+                # on btrfs/XFS; hardlinks would not do, as the server rewrites
+                # region files in place. Snapshots only stage files changed
+                # since the previous snapshot, the rest are linked from it.
+                # Elsewhere staging is a full copy, so the pause is capped at
+                # BACKUP_MAX_PAUSE_SECONDS and the rest copied with saving on.
+                set_phase('pausing saves')
+                # Backups run one at a time, so anything here is left over
+                shutil.rmtree(BACKUP_STAGING_DIR, ignore_errors=True)
+                staging_path = os.path.join(BACKUP_STAGING_DIR, backup_name)
+                paused_at = time.monotonic()
+                deadline = paused_at + BACKUP_MAX_PAUSE_SECONDS if BACKUP_MAX_PAUSE_SECONDS > 0 else None
+                with saves_paused() as consistent:
+                    set_phase('staging')
+                    if snapshot_mode:
+                        snapshot_files = scan_world(world_path)
+                        changed = files_to_read(SNAPSHOT_DIR, world_name, snapshot_files, mode == 'delta')
+                        entries = [(path, rel, st.st_size) for path, rel, st in changed]
+                    else:
+                        entries = scan_files(world_path, MC_DIR)
+                    files, reflinked, pending = clone_files(entries, staging_path, cancel_event, deadline)
+                paused_seconds = time.monotonic() - paused_at
+                logger.info(f"Saving was paused for {paused_seconds:.2f}s")
+                copied_paused = len(files) - reflinked
+                if copied_paused:
+                    logger.warning(f"Reflinks unavailable, staging copied {copied_paused} files in full "
+                                   "(copy fallback) while saving was paused")
+                if pending:
+                    logger.warning(f"Staging exceeded {BACKUP_MAX_PAUSE_SECONDS:g}s, copying the last "
+                                   f"{len(pending)} files with saving resumed")
+                    consistent = False
+                    more, more_reflinked, _ = clone_files(pending, staging_path, cancel_event)
+                    logger.info(f"Staged {len(more)} files after saving resumed "
+                                f"({len(more) - more_reflinked} copied in full)")
+                    files += more
+                    reflinked += more_reflinked
+                logger.info(f"Staged {len(files)} files for backup ({reflinked} reflinked)")
+                if snapshot_mode:
+                    staged = {arcname: path for path, arcname, _ in files}
+                    snapshot_files = [(staged.get(rel, path), rel, st) for path, rel, st in snapshot_files]
+            elif not snapshot_mode:
+                files = scan_files(world_path, MC_DIR)
+            
+            if snapshot_mode:
+                set_phase('snapshotting')
+                manifest = after_pause(take_snapshot, world_path, backup_name, mode, progress, cancel_event,
+                                       snapshot_files)
+                backup_catalog.add(snapshot_record(SNAPSHOT_DIR, manifest))
+                stats = manifest['stats']
+                message = (f"Snapshot created: {backup_name} ({stats['files_copied'] + stats['files_delta']} changed, "
+                           f"{stats['files_linked']} unchanged files, {round(stats['bytes_stored'] / (1024 * 1024), 1)} MB stored)")
+            else:
+                # Create zip backup
+                set_phase('compressing')
+                backup_path = os.path.join(BACKUP_DIR, f"{backup_name}.zip")
+                policy = BACKUP_CODEC_POLICY if codec is None else BACKUP_CODEC_POLICY.with_default(codec)
+                if BACKUP_WORKERS > 1:
+                    checksum = after_pause(write_zip_parallel, files, backup_path, progress, cancel_event,
+                                           workers=BACKUP_WORKERS, policy=policy, low_priority=throttle)
+                else:
+                    checksum = after_pause(write_zip, files, backup_path, progress, cancel_event, policy=policy)
+                set_phase('cataloguing')
+                backup_catalog.add(zip_record(backup_path, world=world_name, file_count=len(files),
+                                              checksum=checksum))
+                world_size = sum(size for _, _, size in files)
+                ratio = os.path.getsize(backup_path) / world_size * 100 if world_size else 100
+                message = f"Backup created: {backup_name} ({policy.describe()}, {ratio:.0f}% of world size)"
+        finally:
+            world_lock.release()
+            if staging_path is not None:
+                shutil.rmtree(staging_path, ignore_errors=True)
+        
+        if paused_seconds is not None:
+            message += f" (saving paused {paused_seconds:.1f}s{', copy fallback' if copied_paused else ''})"
+        if throttler is not None:
+            message += (f" (throttling added {throttler.throttled_seconds:.0f}s, "
+                        f"{throttler.backoffs} slowdowns for server lag)")
+        if not consistent:
+            message += " (world save not confirmed, backup may be inconsistent)"
+        logger.info(message)
+        backup_duration.observe(time.monotonic() - started, mode)
+        backup_size.observe(backup_catalog.get(backup_name)['stored_size'], mode)
         
         # Clean up old backups
         cleanup_old_backups()
         
-        return True, f"Backup created: {backup_name}"
+        return True, message
+    except BackupCancelled:
+        logger.info(f"Backup cancelled: {backup_name}")
+        return False, "Backup cancelled"
     except Exception as e:
         logger.error(f"Failed to create backup: {e}")
         return False, f"Backup failed: {str(e)}"
 
+def take_snapshot(world_path, name, mode, progress=None, cancel_event=None, files=None):
+    """Create a snapshot or delta snapshot of a world, optionally from staged ``files`` (see create_snapshot)."""
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    return create_snapshot(world_path, SNAPSHOT_DIR, name, progress, cancel_event,
+                           region_deltas=mode == 'delta', max_chain=REGION_DELTA_MAX_CHAIN, files=files)
+
 def cleanup_old_backups():
-    """Remove old backups, keeping only the most recent ones."""
+    """Remove old backups, keeping only the most recent ones.
+    
+    Zips and snapshots are counted separately, MAX_BACKUP_COUNT of each.
+    Older snapshots that kept snapshots' region deltas build on are kept.
+    """
     try:
-        backups = []
-        for file in os.listdir(BACKUP_DIR):
-            if file.endswith('.zip'):
-                file_path = os.path.join(BACKUP_DIR, file)
-                backups.append((file_path, os.path.getmtime(file_path)))
-        
-        # Sort by modification time (newest first)
-        backups.sort(key=lambda x: x[1], reverse=True)
-        
-        # Remove old backups
-        for backup_path, _ in backups[MAX_BACKUP_COUNT:]:
-            os.remove(backup_path)
-            logger.info(f"Removed old backup: {os.path.basename(backup_path)}")
+        restoring = restoring_backups()
+        for backup in backup_catalog.list('zip', offset=MAX_BACKUP_COUNT):
+            if backup['name'] not in restoring:
+                delete_backup(backup)
+        
+        # Unchanged files live on through their links in newer snapshots
+        for name in select_prunable(backup_catalog.list('snapshot'), MAX_BACKUP_COUNT):
+            if name not in restoring:
+                delete_backup(backup_catalog.get(name))
     except Exception as e:
         logger.error(f"Failed to cleanup old backups: {e}")
 
+def restoring_backups():
+    """Return the names of backups with a restore queued or running."""
+    return {job.args[0] for job in lifecycle_jobs.pending() if job.name == 'restore'}
+
+def delete_backup(backup):
+    """Delete a backup from disk and from the catalog."""
+    if backup['type'] == 'snapshot':
+        if os.path.exists(os.path.join(SNAPSHOT_DIR, backup['name'])):
+            remove_snapshot(SNAPSHOT_DIR, backup['name'])
+    else:
+        backup_path = os.path.join(BACKUP_DIR, f"{backup['name']}.zip")
+        if os.path.exists(backup_path):
+            os.remove(backup_path)
+    backup_catalog.remove(backup['name'])
+    logger.info(f"Removed backup: {backup['name']}")
+
+def sync_catalog_job(job):
+    """Job: reconcile the backup catalog with the backup directories."""
+    added, removed = backup_catalog.sync(BACKUP_DIR, SNAPSHOT_DIR)
+    # Finish any replication cut short by a restart
+    queue_replication()
+    return True, f"Backup catalog synced: {added} added, {removed} removed"
+
+def get_replicator():
+    """Return the backup replicator, or None if replication is not configured."""
+    global replicator
+    if not REPLICATION_ENDPOINT or not REPLICATION_BUCKET:
+        return None
+    if replicator is None:
+        client = S3Client(REPLICATION_ENDPOINT, REPLICATION_BUCKET, os.environ.get('REPLICATION_ACCESS_KEY', ''),
+                          os.environ.get('REPLICATION_SECRET_KEY', ''), REPLICATION_REGION)
+        throttle = Throttle(REPLICATION_MAX_MB_PER_SECOND * 1024 * 1024) if REPLICATION_MAX_MB_PER_SECOND else None
+        replicator = Replicator(client, REPLICATION_PREFIX, workers=REPLICATION_WORKERS,
+                                part_size=REPLICATION_PART_MB * 1024 * 1024, throttle=throttle,
+                                state_dir=REPLICATION_STATE_DIR)
+    return replicator
+
+def queue_replication():
+    """Queue a replication pass unless one is already waiting to start."""
+    if get_replicator() is None:
+        return None
+    for job in replication_jobs.pending():
+        if job.state == QUEUED:
+            return job
+    return replication_jobs.submit('replicate', replicate_job, cancellable=True)
+
+def replicate_job(job):
+    """Job: upload the backups the replica lacks, then apply retention to it.
+    
+    Interrupted multipart uploads resume from the parts already stored.
+    """
+    replicator = get_replicator()
+    remote = {backup['name'] for backup in replicator.remote_backups()}
+    # Oldest first, so snapshots arrive before the delta snapshots built on them
+    pending = [backup for backup in reversed(backup_catalog.list()) if backup['name'] not in remote]
+    progress = BackupProgress(replicator.throttle)
+    progress.files_total = len(pending)
+    progress.bytes_total = sum(backup['stored_size'] for backup in pending)
+    job.progress = progress
+    job.set_phase('uploading')
+    uploaded = 0
+    for backup in pending:
+        if backup_catalog.get(backup['name']) is None:
+            continue  # Rotated away since the list was taken
+        progress.current_file = backup['name']
+        uploaded += replicator.replicate(backup, BACKUP_DIR, SNAPSHOT_DIR, progress, job.cancel_event)
+        progress.file_done()
+    progress.current_file = None
+    
+    job.set_phase('pruning')
+    removed = replicator.apply_retention(MAX_BACKUP_COUNT)
+    replicator.discard_stale_uploads()
+    return True, (f"Replicated {len(pending)} backups ({uploaded / (1024 * 1024):.1f} MB uploaded), "
+                  f"removed {len(removed)} from the replica")
+
 def allowed_file(filename, extensions):
     """Check if file extension is allowed."""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in extensions
@@ -207,10 +552,52 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def read_server_property(key, default=None):
+    """Read a single value from server.properties."""
+    return server_properties.get(key, default)
+
+def get_rcon_pool():
+    """Return the RCON connection pool, or None if RCON is not configured.
+    
+    Settings come from server.properties (enable-rcon, rcon.port,
+    rcon.password), overridable with RCON_PORT / RCON_PASSWORD. The pool is
+    rebuilt when they change.
+    """
+    global rcon_pool
+    if COMMAND_TRANSPORT == 'stdin':
+        return None
+    password = os.environ.get('RCON_PASSWORD') or read_server_property('rcon.password')
+    enabled = os.environ.get('RCON_PASSWORD') or read_server_property('enable-rcon') == 'true'
+    if not enabled or not password:
+        return None
+    port = int(os.environ.get('RCON_PORT') or read_server_property('rcon.port') or 25575)
+    if rcon_pool is None or (rcon_pool.port, rcon_pool.password) != (port, password):
+        if rcon_pool is not None:
+            rcon_pool.close()
+        rcon_pool = RconPool(RCON_HOST, port, password, size=RCON_POOL_SIZE)
+    return rcon_pool
+
+def rcon_reachable():
+    """Check (with a short cache) whether the server answers over RCON."""
+    pool = get_rcon_pool()
+    if pool is None:
+        return False
+    if time.time() - rcon_probe['time'] > RCON_PROBE_INTERVAL:
+        rcon_probe['ok'] = pool.available()
+        rcon_probe['time'] = time.time()
+    return rcon_probe['ok']
+
+def is_managed_process_running():
+    """Return True if the manager itself spawned the running JVM."""
+    return mc_process is not None and mc_process.poll() is None
+
 def get_server_status():
     """Get detailed server status."""
     global mc_process
-    if mc_process and mc_process.poll() is None:
+    if is_managed_process_running():
+        return 'running'
+    # A JVM left running by a previous manager instance is still reachable over RCON
+    if rcon_reachable():
         return 'running'
     return 'stopped'
 
@@ -222,38 +609,233 @@ def get_server_health():
         'pid': None,
         'cpu_percent': 0,
         'memory_mb': 0,
-        'uptime_seconds': 0
+        'uptime_seconds': 0,
+        'jvm': None
     }
     
     if mc_process and mc_process.poll() is None:
-        try:
-            process = psutil.Process(mc_process.pid)
-            health['pid'] = mc_process.pid
-            # Use non-blocking CPU measurement to avoid delays
-            health['cpu_percent'] = process.cpu_percent(interval=None)
-            health['memory_mb'] = process.memory_info().rss / (1024 * 1024)
-            health['uptime_seconds'] = int(time.time() - process.create_time())
-        except (psutil.NoSuchProcess, psutil.AccessDenied) as e:
-            logger.warning(f"Failed to get process info: {e}")
+        # The metrics sampler keeps this fresh; sampling again would reset its CPU measurement
+        sample = process_sampler.sample(mc_process.pid, max_age=METRICS_SAMPLE_INTERVAL * 2)
+        if sample is not None:
+            health.update(sample)
+        health['jvm'] = jvm_sampler.sample(mc_process.pid, max_age=METRICS_SAMPLE_INTERVAL * 2)
     
     return health
 
+def sample_metrics():
+    """One resource sample for the metrics history, or None while the server isn't running."""
+    process = mc_process
+    if not process or process.poll() is not None:
+        return None
+    sample = process_sampler.sample(process.pid)
+    if sample is None:
+        return None
+    # Network counters are host-wide: psutil has none per process, and in
+    # the container the server is nearly all the traffic
+    net = psutil.net_io_counters()
+    rates = metrics_rates.rates(time.time(), {
+        'disk_read_bytes_per_second': sample['read_bytes'],
+        'disk_write_bytes_per_second': sample['write_bytes'],
+        'net_sent_bytes_per_second': net.bytes_sent if net else None,
+        'net_recv_bytes_per_second': net.bytes_recv if net else None,
+        'lag_warnings_per_minute': server_events.lag_total,
+    })
+    if rates['lag_warnings_per_minute'] is not None:
+        rates['lag_warnings_per_minute'] *= 60
+    rates.update({
+        'cpu_percent': sample['cpu_percent'],
+        'memory_mb': sample['memory_mb'],
+        'memory_peak_mb': sample['memory_mb'],
+        'threads': sample['threads'],
+        'open_fds': sample['open_fds'],
+        'players': len(server_events.online),
+    })
+    jvm = jvm_sampler.sample(process.pid)
+    if jvm is not None:
+        # Rated against the JVM sample's own time, so a cached (jcmd) sample gives a gap, not a zero
+        gc = jvm_rates.rates(jvm['timestamp'], {
+            'gc_per_minute': jvm['gc_count'],
+            'gc_pause_percent': jvm['gc_seconds'],
+        })
+        rates.update({
+            'jvm_heap_used_mb': jvm['heap_used_mb'],
+            'jvm_heap_committed_mb': jvm['heap_committed_mb'],
+            'jvm_old_used_mb': jvm['generations'].get('old', {}).get('used_mb'),
+            'jvm_metaspace_used_mb': jvm['generations'].get('metaspace', {}).get('used_mb'),
+            'jvm_threads': jvm['threads'],
+            'gc_per_minute': gc['gc_per_minute'] * 60 if gc['gc_per_minute'] is not None else None,
+            'gc_pause_percent': gc['gc_pause_percent'] * 100 if gc['gc_pause_percent'] is not None else None,
+            'gc_pause_max_ms': jvm['recent_pause_ms'],
+        })
+    return rates
+
+metrics_sampler = PeriodicSampler(sample_metrics, metrics_history, interval=METRICS_SAMPLE_INTERVAL)
+
+def collect_file_status():
+    """Status derived from files: installed JAR, worlds and the active world."""
+    # World folders are directories with a level.dat; hidden ones are
+    # restore and backup staging areas
+    worlds = []
+    if os.path.exists(MC_DIR):
+        for item in sorted(os.listdir(MC_DIR)):
+            if not item.startswith('.') and os.path.exists(os.path.join(MC_DIR, item, 'level.dat')):
+                worlds.append(item)
+    return {
+        'has_jar': os.path.exists(os.path.join(MC_DIR, 'server.jar')),
+        'worlds': worlds,
+        'active_world': read_server_property('level-name', 'world'),
+    }
+
+def collect_live_status():
+    """Status that changes by itself: server state, process metrics and counters."""
+    health = get_server_health()
+    return {
+        'status': health['status'],
+        'health': health,
+        'backup_count': backup_catalog.count(),
+        'server': server_events.snapshot(),
+    }
+
+# /api/status serves this snapshot; files are re-read only when the server
+# folder, server.properties or server.jar change, or on invalidate()
+status_cache = StatusCache(
+    collect_file_status, collect_live_status,
+    FileWatch(MC_DIR, os.path.join(MC_DIR, 'server.properties'), os.path.join(MC_DIR, 'server.jar')),
+    interval=STATUS_REFRESH_INTERVAL,
+)
+
+def send_console_command(command):
+    """Write a command line to the server's stdin."""
+    with stdin_lock:
+        mc_process.stdin.write(f"{command}\n".encode())
+        mc_process.stdin.flush()
+
+def server_command(command, timeout=5, want_output=False):
+    """Send a command over RCON or stdin.
+    
+    RCON is used when COMMAND_TRANSPORT is 'rcon', when the JVM was not
+    started by this manager, or when the caller wants the response back;
+    otherwise the command goes to stdin. Returns the response lines for RCON
+    and None for stdin.
+    """
+    managed = is_managed_process_running()
+    pool = get_rcon_pool()
+    if pool and (COMMAND_TRANSPORT == 'rcon' or not managed or want_output):
+        try:
+            return pool.command(command, timeout=timeout).splitlines()
+        except RconError as e:
+            if not managed or COMMAND_TRANSPORT == 'rcon':
+                raise
+            logger.warning(f"RCON command failed, falling back to stdin: {e}")
+    if not managed:
+        raise RconError("Server is not running or RCON is not enabled")
+    send_console_command(command)
+    return None
+
+def flush_world(timeout=60):
+    """Ask a running server to write all chunks to disk and wait for it.
+    
+    Returns True once the save is confirmed finished.
+    """
+    try:
+        if get_rcon_pool() and rcon_reachable():
+            # The RCON reply only arrives once the save has finished
+            server_command('save-all flush', timeout=timeout, want_output=True)
+            return True
+        elif is_managed_process_running():
+            _, complete = run_console_command('save-all flush', timeout=timeout, until='Saved the game')
+            return complete
+        return False
+    except (RconError, OSError) as e:
+        logger.warning(f"Failed to flush world before backup: {e}")
+        return False
+
+def lock_world(world_name, job=None):
+    """Acquire and return the lock of a world, waiting out whoever holds it."""
+    with world_locks_guard:
+        lock = world_locks.setdefault(world_name, threading.Lock())
+    if not lock.acquire(blocking=False):
+        if job is not None:
+            job.set_phase(f'waiting for world "{world_name}"')
+        lock.acquire()
+    return lock
+
+@contextmanager
+def saves_paused(timeout=60):
+    """Turn autosave off and flush the world for the duration of the block.
+    
+    While paused the server keeps changes in memory, so the files on disk
+    form a consistent world. Yields True if the flush was confirmed; saving
+    is turned back on however the block exits, so keep it short.
+    """
+    paused = False
+    try:
+        server_command('save-off', timeout=timeout)
+        paused = True
+    except (RconError, OSError) as e:
+        logger.warning(f"Could not turn saving off, backup may be inconsistent: {e}")
+    try:
+        flushed = flush_world(timeout)
+        if not flushed:
+            logger.warning("World flush not confirmed, backup may be inconsistent")
+        yield paused and flushed
+    finally:
+        if paused:
+            try:
+                server_command('save-on', timeout=timeout)
+            except (RconError, OSError) as e:
+                logger.error(f"Failed to turn saving back on: {e}")
+
+def run_console_command(command, timeout=5, until=None, quiet=COMMAND_QUIET_SECONDS):
+    """Send a command and collect the console lines it produces.
+    
+    Collection stops at the first line containing ``until`` when given,
+    otherwise once the console has been quiet for ``quiet`` seconds after the
+    first line of output. Either way it gives up after ``timeout`` seconds.
+    Returns (lines, complete) where complete is False on timeout. Output from
+    other sources printed in the same window is included too.
+    """
+    # Subscribe before writing so no output can slip past
+    sub, _, _ = console_output.subscribe(maxsize=CONSOLE_STREAM_QUEUE_SIZE)
+    try:
+        send_console_command(command)
+        lines = []
+        deadline = time.monotonic() + timeout
+        while not sub.dropped:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            wait = min(remaining, quiet) if lines and until is None else remaining
+            item = sub.get(timeout=wait)
+            if item is None:
+                if lines and until is None:
+                    return lines, True
+                continue
+            if item is CONSOLE_RESET:
+                continue
+            line = item[1]
+            lines.append(line)
+            if until is not None and until in line:
+                return lines, True
+        return lines, False
+    finally:
+        console_output.unsubscribe(sub)
+
 def read_console_output(process):
-    """Read console output from minecraft server with improved error handling."""
+    """Read console output from minecraft server in batches."""
     global console_output
     try:
-        for line in iter(process.stdout.readline, b''):
-            if not line:
-                break
-            decoded = line.decode('utf-8', errors='ignore').strip()
-            if decoded:  # Only add non-empty lines
-                with console_lock:
-                    console_output.append(decoded)
-                logger.debug(f"MC: {decoded}")
+        debug = logger.isEnabledFor(logging.DEBUG)
+        for lines in iter_line_batches(process.stdout):
+            first_seq = console_output.extend(lines)
+            console_log.write(first_seq, lines)
+            server_events.process(lines)
+            if debug:
+                for line in lines:
+                    logger.debug("MC: %s", line)
     except Exception as e:
         logger.error(f"Error reading console output: {e}")
-        with console_lock:
-            console_output.append(f"[ERROR] Console reader stopped: {str(e)}")
+        console_output.append(f"[ERROR] Console reader stopped: {str(e)}")
 
 def start_minecraft_server():
     """Start the Minecraft server with improved error handling."""
@@ -278,9 +860,9 @@ def start_minecraft_server():
     memory = os.environ.get('MC_MEMORY', '2G')
     
     try:
-        with console_lock:
-            console_output.clear()
-            console_output.append(f"[{datetime.now().strftime('%H:%M:%S')}] Starting Minecraft server with {memory} memory...")
+        console_output.clear()
+        server_events.reset()
+        console_output.append(f"[{datetime.now().strftime('%H:%M:%S')}] Starting Minecraft server with {memory} memory...")
         
         mc_process = subprocess.Popen(
             ['java', f'-Xmx{memory}', f'-Xms{memory}', '-jar', 'server.jar', 'nogui'],
@@ -288,7 +870,7 @@ def start_minecraft_server():
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
             stdin=subprocess.PIPE,
-            bufsize=1
+            bufsize=0
         )
         
         # Start thread to read console output
@@ -304,7 +886,9 @@ def stop_minecraft_server():
     """Stop the Minecraft server gracefully."""
     global mc_process
     
-    if not mc_process or mc_process.poll() is not None:
+    if not is_managed_process_running():
+        if rcon_reachable():
+            return stop_unmanaged_server()
         logger.warning("Attempted to stop server that is not running")
         return False, "Server is not running"
     
@@ -312,11 +896,13 @@ def stop_minecraft_server():
         logger.info(f"Stopping Minecraft server (PID {mc_process.pid})...")
         
         # Send stop command
-        mc_process.stdin.write(b'stop\n')
-        mc_process.stdin.flush()
+        try:
+            server_command('stop')
+        except RconError:
+            # RCON may drop the connection as the server shuts down
+            send_console_command('stop')
         
-        with console_lock:
-            console_output.append(f"[{datetime.now().strftime('%H:%M:%S')}] Stopping server...")
+        console_output.append(f"[{datetime.now().strftime('%H:%M:%S')}] Stopping server...")
         
         # Wait for graceful shutdown
         try:
@@ -329,9 +915,9 @@ def stop_minecraft_server():
         
         # Reset process variable to None after stopping
         mc_process = None
+        server_events.reset()
         
-        with console_lock:
-            console_output.append(f"[{datetime.now().strftime('%H:%M:%S')}] Server stopped")
+        console_output.append(f"[{datetime.now().strftime('%H:%M:%S')}] Server stopped")
         
         return True, "Server stopped"
     except Exception as e:
@@ -340,11 +926,302 @@ def stop_minecraft_server():
         mc_process = None
         return False, f"Failed to stop server: {str(e)}"
 
+def stop_unmanaged_server(timeout=30):
+    """Stop a server this manager did not spawn, over RCON."""
+    try:
+        logger.info("Stopping Minecraft server over RCON...")
+        console_output.append(f"[{datetime.now().strftime('%H:%M:%S')}] Stopping server...")
+        server_command('stop', want_output=True)
+        # Wait for RCON to go away as the JVM shuts down
+        deadline = time.time() + timeout
+        while time.time() < deadline and get_rcon_pool().available():
+            time.sleep(1)
+        rcon_probe['time'] = 0
+        get_rcon_pool().close()
+        server_events.reset()
+        console_output.append(f"[{datetime.now().strftime('%H:%M:%S')}] Server stopped")
+        return True, "Server stopped"
+    except RconError as e:
+        logger.error(f"Failed to stop server over RCON: {e}")
+        return False, f"Failed to stop server: {str(e)}"
+
+def wait_until_ready(job, timeout=SERVER_READY_TIMEOUT):
+    """Wait for the server's "Done" line after a start."""
+    deadline = time.time() + timeout
+    while not server_events.wait_ready(1):
+        if not is_managed_process_running():
+            return False, "Server exited during startup"
+        if time.time() > deadline:
+            return True, "Server started but has not reported ready yet"
+    job.set_phase('ready')
+    return True, f"Server ready (started in {server_events.startup_seconds}s)"
+
+def start_job(job):
+    """Job: start the server and wait until it is ready."""
+    job.set_phase('starting')
+    success, message = start_minecraft_server()
+    status_cache.invalidate()
+    if not success:
+        return False, message
+    return wait_until_ready(job)
+
+def stop_job(job):
+    """Job: stop the server."""
+    job.set_phase('stopping')
+    success, message = stop_minecraft_server()
+    status_cache.invalidate()
+    if success:
+        job.set_phase('stopped')
+    return success, message
+
+def restart_job(job):
+    """Job: stop the server if it is running, then start it again."""
+    if get_server_status() == 'running':
+        success, message = stop_job(job)
+        if not success:
+            return False, message
+        time.sleep(2)
+    return start_job(job)
+
+def install_jar_job(job, upload_path):
+    """Job: replace server.jar with an uploaded JAR, restarting if needed."""
+    was_running = get_server_status() == 'running'
+    if was_running:
+        stop_job(job)
+        time.sleep(2)
+    
+    job.set_phase('installing')
+    # Backup old JAR if it exists
+    jar_path = os.path.join(MC_DIR, 'server.jar')
+    if os.path.exists(jar_path):
+        backup_path = os.path.join(MC_DIR, f'server.jar.backup.{int(time.time())}')
+        shutil.copy2(jar_path, backup_path)
+        logger.info(f"Backed up old server.jar to {backup_path}")
+    os.replace(upload_path, jar_path)
+    status_cache.invalidate()
+    
+    message = 'Server JAR uploaded successfully'
+    if was_running:
+        success, start_msg = start_job(job)
+        message += f'. {start_msg}'
+    return True, message
+
+def install_world_job(job, zip_path, world_name):
+    """Job: extract an uploaded world, make it active and restart if needed."""
+    world_lock = lock_world(world_name, job)
+    try:
+        return _install_world(job, zip_path, world_name)
+    finally:
+        world_lock.release()
+
+def _install_world(job, zip_path, world_name):
+    was_running = get_server_status() == 'running'
+    if was_running:
+        stop_job(job)
+        time.sleep(2)
+    
+    job.set_phase('extracting')
+    # World goes directly in MC_DIR, not in a subdirectory
+    world_path = os.path.join(MC_DIR, world_name)
+    
+    # Remove existing world with same name
+    if os.path.exists(world_path):
+        # Backup existing world before removing
+        backup_path = world_path + f'.backup.{int(time.time())}'
+        shutil.move(world_path, backup_path)
+        logger.info(f"Backed up existing world to: {backup_path}")
+    
+    # Extract zip to temporary location first
+    temp_extract_path = os.path.join(MC_DIR, f'temp_extract_{int(time.time())}')
+    os.makedirs(temp_extract_path, exist_ok=True)
+    
+    try:
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            zip_ref.extractall(temp_extract_path)
+        
+        # Check if extracted content has a single root directory
+        extracted_items = os.listdir(temp_extract_path)
+        
+        if len(extracted_items) == 1 and os.path.isdir(os.path.join(temp_extract_path, extracted_items[0])):
+            # Single root directory - move its contents to world_path
+            root_dir = os.path.join(temp_extract_path, extracted_items[0])
+            shutil.move(root_dir, world_path)
+            logger.info(f"Extracted world from single root directory: {extracted_items[0]}")
+        else:
+            # Multiple items or files at root - move entire temp directory
+            shutil.move(temp_extract_path, world_path)
+            logger.info(f"Extracted world with multiple root items")
+        
+        # Verify the world has necessary files
+        if not os.path.exists(os.path.join(world_path, 'level.dat')):
+            logger.error(f"Uploaded world '{world_name}' missing level.dat file")
+            if os.path.exists(world_path):
+                shutil.rmtree(world_path)
+            return False, 'Invalid world: missing level.dat file. Make sure your zip contains the world data at the root level.'
+    except Exception as e:
+        # Log the error and clean up
+        logger.error(f"Error during world upload extraction: {e}", exc_info=True)
+        if os.path.exists(world_path):
+            shutil.rmtree(world_path)
+        raise
+    finally:
+        if os.path.exists(temp_extract_path):
+            shutil.rmtree(temp_extract_path)
+        if os.path.exists(zip_path):
+            os.remove(zip_path)
+    status_cache.invalidate()
+    
+    # Automatically set this as the active world
+    if server_properties.exists():
+        set_active_world(world_name)
+    
+    message = f'World "{world_name}" uploaded successfully and set as active world'
+    if was_running:
+        success, start_msg = start_job(job)
+        message += f'. Server restarted: {start_msg}'
+    else:
+        message += '. Start the server to use this world'
+    return True, message
+
+def set_active_world(world_name):
+    """Point level-name in server.properties at a world."""
+    server_properties.update({'level-name': world_name})
+    status_cache.invalidate()
+    logger.info(f"Set active world to '{world_name}'")
+
+def restore_job(job, backup_name, world_name):
+    """Job: restore a backup as a world, make it active and restart if needed.
+    
+    The restored world is assembled in a staging folder next to the world:
+    files the world already has are hardlinked, only differing ones are
+    extracted, in parallel. It then replaces the world in one rename, so
+    restore time and disk writes follow the size of the change.
+    """
+    backup = backup_catalog.get(backup_name)
+    if backup is None:
+        return False, 'Backup not found'
+    
+    job.set_phase('planning')
+    if backup['type'] == 'snapshot':
+        entries = snapshot_entries(SNAPSHOT_DIR, backup_name)
+    else:
+        entries = zip_entries(os.path.join(BACKUP_DIR, f"{backup_name}.zip"))
+    if not any(entry.rel == 'level.dat' for entry in entries):
+        return False, 'Invalid backup: missing level.dat file'
+    
+    world_lock = lock_world(world_name, job)
+    try:
+        was_running = get_server_status() == 'running'
+        if was_running:
+            stop_job(job)
+            time.sleep(2)
+        replaced, message = _restore_world(job, backup_name, entries, world_name)
+    finally:
+        world_lock.release()
+    if replaced is None:
+        if was_running:
+            _, start_msg = start_job(job)
+            message += f'. Server restarted: {start_msg}'
+        return False, message
+    
+    # The replaced world is kept until the restored one is up; it shares
+    # hardlinked files with it, so it is no use once the server writes
+    replaced_path = os.path.join(MC_DIR, f'.replaced_{world_name}')
+    if was_running:
+        success, start_msg = start_job(job)
+        message += f'. Server restarted: {start_msg}'
+        if not success and replaced:
+            return True, message + f'. The previous world is kept in {replaced_path}'
+    else:
+        message += '. Start the server to use this world'
+    if replaced:
+        shutil.rmtree(replaced_path, ignore_errors=True)
+        message += f'. The previous "{world_name}" was replaced and deleted'
+    return True, message
+
+def _restore_world(job, backup_name, entries, world_name):
+    """Stage a backup's files and swap them in as ``world_name``.
+    
+    Returns (replaced, message) with replaced None if the restore failed or
+    was cancelled, else whether an existing world was moved aside.
+    """
+    world_path = os.path.join(MC_DIR, world_name)
+    staging_path = os.path.join(MC_DIR, f'.restore_{world_name}')
+    replaced_path = os.path.join(MC_DIR, f'.replaced_{world_name}')
+    shutil.rmtree(replaced_path, ignore_errors=True)
+    job.progress = BackupProgress()
+    job.set_phase('restoring')
+    started = time.monotonic()
+    try:
+        stats = stage_restore(entries, world_path, staging_path, job.progress, job.cancel_event,
+                              workers=BACKUP_WORKERS)
+        check_cancelled(job.cancel_event)
+        job.set_phase('swapping')
+        replaced = swap_into_place(staging_path, world_path, replaced_path)
+        set_active_world(world_name)
+        elapsed = time.monotonic() - started
+        logger.info(f"Restored backup {backup_name} as world '{world_name}' in {elapsed:.1f}s: "
+                    f"{stats['files_written']} files written, {stats['files_reused']} unchanged")
+        message = (f'Backup "{backup_name}" restored as world "{world_name}" in {elapsed:.1f}s '
+                   f'({stats["files_written"]} files written, {stats["files_reused"]} unchanged)')
+    except Exception as e:
+        shutil.rmtree(staging_path, ignore_errors=True)
+        if isinstance(e, BackupCancelled):
+            logger.info(f"Restore of {backup_name} cancelled")
+            message = 'Restore cancelled, world left unchanged'
+        else:
+            logger.error(f"Restore of {backup_name} failed: {e}", exc_info=True)
+            message = f'Restore failed, world left unchanged: {e}'
+        return None, message
+    return replaced, message
+
+def backup_job(job, backup_name, mode=None, throttle=False, codec=None):
+    """Job: create a backup with progress reporting."""
+    success, message = create_backup(backup_name, job=job, mode=mode, throttle=throttle, codec=codec)
+    if success:
+        queue_replication()
+    return success, message
+
+def find_job(job_id):
+    """Look a job up in any of the job queues."""
+    for job_queue in (lifecycle_jobs, backup_jobs, replication_jobs):
+        job = job_queue.get(job_id)
+        if job is not None:
+            return job_queue, job
+    return None, None
+
+def zip_response(chunks, filename):
+    """Stream a zip built on the fly as a download."""
+    response = Response(stream_with_context(chunks), mimetype='application/zip')
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['X-Accel-Buffering'] = 'no'  # Disable proxy buffering (nginx)
+    return response
+
+def job_response(job, message):
+    """Build the 202 response for a queued job."""
+    return jsonify({'success': True, 'message': message, 'job_id': job.id, 'job': job.to_dict()}), 202
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """Count and time every request for /metrics, labelled by route pattern rather than URL."""
+    route = request.url_rule.rule if request.url_rule is not None else '(unmatched)'
+    request_count.inc(route, request.method, str(response.status_code))
+    # Requests refused before our timer started (e.g. rate limited) are counted but not timed
+    started = g.pop('request_started', None)
+    if started is not None:
+        request_latency.observe(time.perf_counter() - started, route, request.method)
+    return response
+
 @app.route('/')
 def index():
     if 'logged_in' not in session:
         return render_template('login.html')
-    return render_template('index.html')
+    return render_template('index.html', backup_throttle=BACKUP_THROTTLE, backup_codec=BACKUP_CODEC_POLICY.default.name,
+                           backup_codecs=available_codecs())
 
 @app.route('/login', methods=['POST'])
 @limiter.limit("10 per minute")
@@ -476,46 +1353,9 @@ def api_delete_user():
 @app.route('/api/status')
 @login_required
 def api_status():
-    """Get comprehensive server status."""
-    try:
-        status = get_server_status()
-        health = get_server_health()
-        
-        # Check if server.jar exists
-        has_jar = os.path.exists(os.path.join(MC_DIR, 'server.jar'))
-        
-        # Get world folders - look for directories with level.dat (Minecraft worlds)
-        worlds = []
-        if os.path.exists(MC_DIR):
-            for item in os.listdir(MC_DIR):
-                item_path = os.path.join(MC_DIR, item)
-                # Check if it's a directory and contains level.dat (Minecraft world indicator)
-                if os.path.isdir(item_path) and os.path.exists(os.path.join(item_path, 'level.dat')):
-                    worlds.append(item)
-        
-        # Check active world
-        properties_path = os.path.join(MC_DIR, 'server.properties')
-        active_world = 'world'
-        if os.path.exists(properties_path):
-            with open(properties_path, 'r') as f:
-                for line in f:
-                    if line.startswith('level-name='):
-                        active_world = line.split('=')[1].strip()
-                        break
-        
-        # Get backup count
-        backup_count = 0
-        if os.path.exists(BACKUP_DIR):
-            backup_count = len([f for f in os.listdir(BACKUP_DIR) if f.endswith('.zip')])
-        
-        return jsonify({
-            'status': status,
-            'has_jar': has_jar,
-            'worlds': worlds,
-            'active_world': active_world,
-            'health': health,
-            'backup_count': backup_count
-        })
+    """Get comprehensive server status, from the background-maintained snapshot."""
+    try:
+        return jsonify(status_cache.snapshot())
     except Exception as e:
         logger.error(f"Error getting status: {e}")
         return jsonify({'error': 'Failed to get status'}), 500
@@ -524,11 +1364,11 @@ def api_status():
 @login_required
 @limiter.limit("10 per minute")
 def api_start():
-    """Start the Minecraft server."""
+    """Queue a server start."""
     try:
-        success, message = start_minecraft_server()
-        logger.info(f"Server start requested by {session.get('username')}: {message}")
-        return jsonify({'success': success, 'message': message})
+        job = lifecycle_jobs.submit('start', start_job, user=session.get('username'))
+        logger.info(f"Server start requested by {session.get('username')} (job {job.id})")
+        return job_response(job, 'Server start queued')
     except Exception as e:
         logger.error(f"Error starting server: {e}")
         return jsonify({'success': False, 'message': 'Failed to start server'}), 500
@@ -537,11 +1377,11 @@ def api_start():
 @login_required
 @limiter.limit("10 per minute")
 def api_stop():
-    """Stop the Minecraft server."""
+    """Queue a server stop."""
     try:
-        success, message = stop_minecraft_server()
-        logger.info(f"Server stop requested by {session.get('username')}: {message}")
-        return jsonify({'success': success, 'message': message})
+        job = lifecycle_jobs.submit('stop', stop_job, user=session.get('username'))
+        logger.info(f"Server stop requested by {session.get('username')} (job {job.id})")
+        return job_response(job, 'Server stop queued')
     except Exception as e:
         logger.error(f"Error stopping server: {e}")
         return jsonify({'success': False, 'message': 'Failed to stop server'}), 500
@@ -550,25 +1390,65 @@ def api_stop():
 @login_required
 @limiter.limit("10 per minute")
 def api_restart():
-    """Restart the Minecraft server."""
+    """Queue a server restart."""
     try:
-        logger.info(f"Server restart requested by {session.get('username')}")
-        stop_minecraft_server()
-        time.sleep(2)
-        success, message = start_minecraft_server()
-        return jsonify({'success': success, 'message': message})
+        job = lifecycle_jobs.submit('restart', restart_job, user=session.get('username'))
+        logger.info(f"Server restart requested by {session.get('username')} (job {job.id})")
+        return job_response(job, 'Server restart queued')
     except Exception as e:
         logger.error(f"Error restarting server: {e}")
         return jsonify({'success': False, 'message': 'Failed to restart server'}), 500
 
+@app.route('/api/jobs', methods=['GET'])
+@login_required
+def api_list_jobs():
+    """List recent background jobs."""
+    jobs = lifecycle_jobs.list() + backup_jobs.list() + replication_jobs.list()
+    jobs.sort(key=lambda job: job.created, reverse=True)
+    return jsonify({'success': True, 'jobs': [job.to_dict() for job in jobs]})
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@login_required
+@limiter.exempt  # Polled every few seconds while a job runs
+def api_job_status(job_id):
+    """Get the status of a background job."""
+    _, job = find_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+@login_required
+def api_cancel_job(job_id):
+    """Cancel a queued or running background job."""
+    job_queue, job = find_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    if job.state == RUNNING and not job.cancellable:
+        return jsonify({'success': False, 'message': f'A running {job.name} job cannot be cancelled'}), 409
+    if not job_queue.cancel(job_id):
+        return jsonify({'success': False, 'message': 'Job already finished'}), 409
+    logger.info(f"Job {job_id} ({job.name}) cancelled by {session.get('username')}")
+    return jsonify({'success': True, 'message': 'Cancellation requested'})
+
 @app.route('/api/backup', methods=['POST'])
 @login_required
 @limiter.limit("5 per hour")
 def api_backup():
-    """Create a backup of the current world."""
+    """Queue a backup of the current world."""
     try:
         data = request.json or {}
         backup_name = data.get('name')
+        mode = data.get('mode', BACKUP_MODE)
+        if mode not in BACKUP_MODES:
+            return jsonify({'success': False, 'message': f"Invalid backup mode, use one of: {', '.join(BACKUP_MODES)}"}), 400
+        throttle = bool(data.get('throttle', BACKUP_THROTTLE))
+        codec = data.get('codec') or None
+        if codec is not None:
+            try:
+                get_codec(codec)
+            except ValueError as e:
+                return jsonify({'success': False, 'message': str(e)}), 400
         
         # Validate backup name if provided
         if backup_name:
@@ -576,15 +1456,10 @@ def api_backup():
             if not backup_name:
                 return jsonify({'success': False, 'message': 'Invalid backup name'}), 400
         
-        logger.info(f"Backup requested by {session.get('username')}")
-        success, message = create_backup(backup_name)
-        
-        if success:
-            logger.info(f"Backup created successfully: {message}")
-        else:
-            logger.error(f"Backup failed: {message}")
-        
-        return jsonify({'success': success, 'message': message})
+        job = backup_jobs.submit('backup', backup_job, backup_name, mode, throttle, codec,
+                                 user=session.get('username'), cancellable=True)
+        logger.info(f"Backup requested by {session.get('username')} (job {job.id})")
+        return job_response(job, 'Backup started')
     except Exception as e:
         logger.error(f"Error creating backup: {e}")
         return jsonify({'success': False, 'message': f'Backup failed: {str(e)}'}), 500
@@ -592,49 +1467,256 @@ def api_backup():
 @app.route('/api/backups', methods=['GET'])
 @login_required
 def api_list_backups():
-    """List all available backups."""
+    """List available backups, newest first, from the backup catalog."""
     try:
+        limit = request.args.get('limit', type=int)
+        offset = request.args.get('offset', 0, type=int)
         backups = []
-        if os.path.exists(BACKUP_DIR):
-            for file in os.listdir(BACKUP_DIR):
-                if file.endswith('.zip'):
-                    file_path = os.path.join(BACKUP_DIR, file)
-                    stat = os.stat(file_path)
-                    backups.append({
-                        'name': file,
-                        'size_mb': round(stat.st_size / (1024 * 1024), 2),
-                        'created': datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
-                    })
-        
-        # Sort by creation time (newest first)
-        backups.sort(key=lambda x: x['created'], reverse=True)
-        
-        return jsonify({'success': True, 'backups': backups})
+        for backup in backup_catalog.list(limit=limit, offset=offset):
+            item = {
+                'name': backup['name'],
+                'type': backup['type'],
+                'world': backup['world'],
+                'size_mb': round(backup['size'] / (1024 * 1024), 2),
+                'file_count': backup['file_count'],
+                'checksum': backup['checksum'],
+                'created': datetime.fromtimestamp(backup['created']).strftime('%Y-%m-%d %H:%M:%S'),
+                'created_at': backup['created']
+            }
+            if backup['type'] == 'zip':
+                item['file'] = f"{backup['name']}.zip"
+            else:
+                item['parent'] = backup['parent']
+                # False when region deltas need older snapshots to restore
+                item['standalone'] = backup['standalone']
+                # Disk space this snapshot added; the rest is shared with older ones
+                item['new_mb'] = round(backup['stored_size'] / (1024 * 1024), 2)
+            backups.append(item)
+        
+        return jsonify({'success': True, 'backups': backups, 'total': backup_catalog.count()})
     except Exception as e:
         logger.error(f"Error listing backups: {e}")
         return jsonify({'success': False, 'message': 'Failed to list backups'}), 500
 
+@app.route('/api/replication', methods=['POST'])
+@login_required
+@limiter.limit("10 per hour")
+def api_replicate():
+    """Queue a replication pass to the off-host object store."""
+    try:
+        job = queue_replication()
+        if job is None:
+            return jsonify({'success': False, 'message': 'Replication is not configured'}), 400
+        logger.info(f"Replication requested by {session.get('username')} (job {job.id})")
+        return job_response(job, 'Replication started')
+    except Exception as e:
+        logger.error(f"Error starting replication: {e}")
+        return jsonify({'success': False, 'message': f'Replication failed: {str(e)}'}), 500
+
+@app.route('/api/backups/<name>/download')
+@login_required
+def api_download_backup(name):
+    """Download a backup.
+    
+    Zip backups are served with Range support, so an interrupted download
+    can resume. Snapshots are folders, so they are streamed as a zip built
+    on the fly, with region deltas rebuilt into full region files.
+    """
+    try:
+        backup = backup_catalog.get(name)
+        if backup is None:
+            return jsonify({'success': False, 'message': 'Backup not found'}), 404
+        
+        if backup['type'] == 'zip':
+            backup_path = os.path.join(BACKUP_DIR, f"{name}.zip")
+            if not os.path.exists(backup_path):
+                return jsonify({'success': False, 'message': 'Backup file missing'}), 404
+            logger.info(f"Backup {name} downloaded by {session.get('username')}")
+            # conditional=True answers Range and If-Range requests with partial content
+            return send_file(backup_path, mimetype='application/zip', as_attachment=True,
+                             download_name=f"{name}.zip", conditional=True)
+        
+        manifest = load_manifest(os.path.join(SNAPSHOT_DIR, name))
+        if manifest is None:
+            return jsonify({'success': False, 'message': 'Backup files missing'}), 404
+        world_name = manifest['world']
+        manifests = {name: manifest}
+        files = [(rel, os.path.join(world_name, rel), entry['size']) for rel, entry in manifest['files'].items()]
+        
+        def open_entry(rel):
+            entry = manifest['files'][rel]
+            return open_snapshot_file(SNAPSHOT_DIR, name, world_name, rel, entry, manifests), entry['mtime_ns'] / 1e9
+        
+        logger.info(f"Snapshot {name} downloaded by {session.get('username')}")
+        return zip_response(stream_zip(files, BACKUP_CODEC_POLICY, open_entry), f"{name}.zip")
+    except Exception as e:
+        logger.error(f"Error downloading backup: {e}")
+        return jsonify({'success': False, 'message': f'Download failed: {str(e)}'}), 500
+
+@app.route('/api/backups/<name>/restore', methods=['POST'])
+@login_required
+@limiter.limit("10 per hour")
+def api_restore_backup(name):
+    """Queue a restore of a backup, over its own world or as a new one."""
+    try:
+        backup = backup_catalog.get(name)
+        if backup is None:
+            return jsonify({'success': False, 'message': 'Backup not found'}), 404
+        
+        data = request.json or {}
+        world_name = secure_filename(data.get('world') or backup['world'] or '')
+        if not world_name:
+            return jsonify({'success': False, 'message': 'Invalid world name'}), 400
+        
+        job = lifecycle_jobs.submit('restore', restore_job, name, world_name, user=session.get('username'),
+                                    cancellable=True)
+        logger.info(f"Restore of {name} as '{world_name}' requested by {session.get('username')} (job {job.id})")
+        return job_response(job, f'Restoring "{name}" as world "{world_name}"')
+    except Exception as e:
+        logger.error(f"Error restoring backup: {e}")
+        return jsonify({'success': False, 'message': f'Restore failed: {str(e)}'}), 500
+
+@app.route('/api/backups/<name>', methods=['DELETE'])
+@login_required
+def api_delete_backup(name):
+    """Delete a backup."""
+    try:
+        backup = backup_catalog.get(name)
+        if backup is None:
+            return jsonify({'success': False, 'message': 'Backup not found'}), 404
+        dependents = backup_catalog.dependents(name)
+        if dependents:
+            return jsonify({
+                'success': False,
+                'message': f"Needed to restore newer delta snapshots: {', '.join(dependents)}"
+            }), 409
+        if any(job.name == 'backup' for job in backup_jobs.pending()):
+            return jsonify({'success': False, 'message': 'Wait for the running backup to finish'}), 409
+        if name in restoring_backups():
+            return jsonify({'success': False, 'message': 'Backup is being restored'}), 409
+        
+        delete_backup(backup)
+        logger.info(f"Backup {name} deleted by {session.get('username')}")
+        return jsonify({'success': True, 'message': f'Backup {name} deleted'})
+    except Exception as e:
+        logger.error(f"Error deleting backup: {e}")
+        return jsonify({'success': False, 'message': f'Failed to delete backup: {str(e)}'}), 500
+
 @app.route('/api/console')
 @login_required
 def api_console():
-    """Get console output."""
+    """Get console output, optionally only the lines after a cursor."""
     try:
-        with console_lock:
-            output = list(console_output)
-        return jsonify({'output': output, 'line_count': len(output)})
+        since = request.args.get('since', type=int)
+        limit = min(request.args.get('limit', CONSOLE_PAGE_LINES, type=int), CONSOLE_MAX_PAGE_LINES)
+        if since is None:
+            output, cursor = console_output.snapshot(limit=limit)
+            truncated = True
+        else:
+            output, cursor, truncated = console_output.since(since, limit=limit)
+        return jsonify({
+            'output': output,
+            'line_count': len(output),
+            'cursor': cursor,
+            'truncated': truncated
+        })
     except Exception as e:
         logger.error(f"Error getting console output: {e}")
         return jsonify({'output': [], 'error': 'Failed to get console output'}), 500
 
+def parse_time_param(value):
+    """Parse a unix timestamp or ISO 8601 date/time query parameter."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+@app.route('/api/console/search')
+@login_required
+def api_console_search():
+    """Search the persistent console log."""
+    try:
+        q = request.args.get('q', '').strip()
+        if not q:
+            return jsonify({'success': False, 'message': 'No search query provided'}), 400
+        
+        try:
+            start = parse_time_param(request.args.get('from'))
+            end = parse_time_param(request.args.get('to'))
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Invalid from/to time'}), 400
+        
+        limit = min(request.args.get('limit', 200, type=int), CONSOLE_SEARCH_MAX_RESULTS)
+        matches = console_log.search(q, start, end, limit=limit)
+        for match in matches:
+            match['time'] = datetime.fromtimestamp(match['time']).strftime('%Y-%m-%d %H:%M:%S')
+        
+        return jsonify({'success': True, 'matches': matches, 'count': len(matches)})
+    except Exception as e:
+        logger.error(f"Error searching console log: {e}")
+        return jsonify({'success': False, 'message': 'Failed to search console log'}), 500
+
+@app.route('/api/console/stream')
+@login_required
+def api_console_stream():
+    """Stream console lines as Server-Sent Events.
+
+    Resumes after the ``Last-Event-ID`` header (sent automatically by
+    EventSource on reconnect) or a ``since`` query parameter.
+    """
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('since', 0, type=int)
+    
+    sub, backlog, truncated = console_output.subscribe(
+        since, maxsize=CONSOLE_STREAM_QUEUE_SIZE, limit=CONSOLE_PAGE_LINES)
+    
+    def format_event(item):
+        if item is CONSOLE_RESET:
+            return 'event: reset\ndata: \n\n'
+        seq, line = item
+        # A bare CR would end the SSE data field early
+        return f"id: {seq}\ndata: {line.replace(chr(13), '')}\n\n"
+    
+    def generate():
+        try:
+            yield 'retry: 2000\n\n'
+            if truncated:
+                yield format_event(CONSOLE_RESET)
+            for item in backlog:
+                yield format_event(item)
+            while not sub.dropped:
+                item = sub.get(timeout=CONSOLE_STREAM_KEEPALIVE)
+                yield ': keepalive\n\n' if item is None else format_event(item)
+            # Flush what was queued before the drop; the client reconnects
+            # with Last-Event-ID and resumes from the buffer
+            while (item := sub.get(timeout=0)) is not None:
+                yield format_event(item)
+            logger.info("Dropped slow console stream client")
+        finally:
+            console_output.unsubscribe(sub)
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Disable proxy buffering (nginx)
+    return response
+
 @app.route('/api/command', methods=['POST'])
 @login_required
 @limiter.limit("30 per minute")
 def api_command():
-    """Send a command to the Minecraft server."""
+    """Send a command to the Minecraft server.
+    
+    With ``wait`` set, the response includes the console lines the command
+    produced (see run_console_command); ``timeout`` and ``until`` tune it.
+    Without ``until`` the reply comes over RCON when it is reachable.
+    """
     global mc_process
     
     try:
-        if not mc_process or mc_process.poll() is not None:
+        if get_server_status() != 'running':
             return jsonify({'success': False, 'message': 'Server is not running'}), 400
         
         command = request.json.get('command', '').strip()
@@ -645,14 +1727,29 @@ def api_command():
         if '\n' in command or '\r' in command:
             return jsonify({'success': False, 'message': 'Invalid command format'}), 400
         
-        mc_process.stdin.write(f"{command}\n".encode())
-        mc_process.stdin.flush()
+        # Optionally wait for the lines the command prints
+        if request.json.get('wait'):
+            timeout = max(0.0, min(float(request.json.get('timeout', 5)), COMMAND_MAX_WAIT))
+            until = request.json.get('until') or None
+            if until is None and get_rcon_pool() and rcon_reachable():
+                # RCON returns the command's own response directly; waiting
+                # for a later console line needs the console
+                output, complete = server_command(command, timeout=timeout or 5, want_output=True), True
+            else:
+                output, complete = run_console_command(command, timeout=timeout, until=until)
+            logger.info(f"Command sent by {session.get('username')}: {command}")
+            return jsonify({'success': True, 'message': 'Command sent', 'output': output, 'complete': complete})
+        
+        server_command(command)
         
         logger.info(f"Command sent by {session.get('username')}: {command}")
         return jsonify({'success': True, 'message': 'Command sent'})
     except BrokenPipeError:
         logger.error("Broken pipe when sending command")
         return jsonify({'success': False, 'message': 'Server connection lost'}), 500
+    except RconError as e:
+        logger.error(f"RCON command failed: {e}")
+        return jsonify({'success': False, 'message': f'Failed to send command: {str(e)}'}), 502
     except Exception as e:
         logger.error(f"Failed to send command: {e}")
         return jsonify({'success': False, 'message': f'Failed to send command: {str(e)}'}), 500
@@ -674,30 +1771,13 @@ def api_upload_jar():
             logger.warning(f"Invalid JAR upload attempt by {session.get('username')}: {message}")
             return jsonify({'success': False, 'message': message}), 400
         
-        # Stop server if running
-        was_running = get_server_status() == 'running'
-        if was_running:
-            stop_minecraft_server()
-            time.sleep(2)
-        
-        # Backup old JAR if it exists
-        jar_path = os.path.join(MC_DIR, 'server.jar')
-        if os.path.exists(jar_path):
-            backup_path = os.path.join(MC_DIR, f'server.jar.backup.{int(time.time())}')
-            shutil.copy2(jar_path, backup_path)
-            logger.info(f"Backed up old server.jar to {backup_path}")
-        
-        # Save the new JAR file
-        file.save(jar_path)
+        # Save next to server.jar; the job swaps it in once the server is stopped
+        upload_path = os.path.join(MC_DIR, 'server.jar.upload')
+        file.save(upload_path)
         
         logger.info(f"Server JAR uploaded by {session.get('username')}: {file.filename}")
-        
-        message = 'Server JAR uploaded successfully'
-        if was_running:
-            success, start_msg = start_minecraft_server()
-            message += f'. {start_msg}'
-        
-        return jsonify({'success': True, 'message': message})
+        job = lifecycle_jobs.submit('install-jar', install_jar_job, upload_path, user=session.get('username'))
+        return job_response(job, 'Server JAR uploaded, installing...')
     except Exception as e:
         logger.error(f"Failed to upload JAR: {e}")
         return jsonify({'success': False, 'message': f'Failed to upload JAR: {str(e)}'}), 500
@@ -719,114 +1799,30 @@ def api_upload_world():
             logger.warning(f"Invalid world upload attempt by {session.get('username')}: {message}")
             return jsonify({'success': False, 'message': message}), 400
         
-        # Stop server if running
-        was_running = get_server_status() == 'running'
-        if was_running:
-            stop_minecraft_server()
-            time.sleep(2)
-        
         # Save uploaded zip
-        zip_path = os.path.join(MC_DIR, 'temp_world.zip')
+        zip_path = os.path.join(MC_DIR, f'temp_world_{int(time.time())}.zip')
         file.save(zip_path)
         
-        # Extract world
         world_name = secure_filename(file.filename.rsplit('.', 1)[0])
         if not world_name:
             world_name = f"world_{int(time.time())}"
         
-        # World goes directly in MC_DIR, not in a subdirectory
-        world_path = os.path.join(MC_DIR, world_name)
-        
-        # Remove existing world with same name
-        if os.path.exists(world_path):
-            # Backup existing world before removing
-            backup_path = world_path + f'.backup.{int(time.time())}'
-            shutil.move(world_path, backup_path)
-            logger.info(f"Backed up existing world to: {backup_path}")
-        
-        # Extract zip to temporary location first
-        temp_extract_path = os.path.join(MC_DIR, f'temp_extract_{int(time.time())}')
-        os.makedirs(temp_extract_path, exist_ok=True)
-        
+        # Check the archive up front so obvious problems are reported right away
         try:
             with zipfile.ZipFile(zip_path, 'r') as zip_ref:
                 # Security check: ensure no path traversal
                 for member in zip_ref.namelist():
                     if member.startswith('..') or member.startswith('/'):
                         os.remove(zip_path)
-                        shutil.rmtree(temp_extract_path)
                         return jsonify({'success': False, 'message': 'Invalid zip file structure'}), 400
-                zip_ref.extractall(temp_extract_path)
-            
-            # Check if extracted content has a single root directory
-            extracted_items = os.listdir(temp_extract_path)
-            
-            if len(extracted_items) == 1 and os.path.isdir(os.path.join(temp_extract_path, extracted_items[0])):
-                # Single root directory - move its contents to world_path
-                root_dir = os.path.join(temp_extract_path, extracted_items[0])
-                shutil.move(root_dir, world_path)
-                logger.info(f"Extracted world from single root directory: {extracted_items[0]}")
-            else:
-                # Multiple items or files at root - move entire temp directory
-                shutil.move(temp_extract_path, world_path)
-                logger.info(f"Extracted world with multiple root items")
-            
-            # Verify the world has necessary files
-            if not os.path.exists(os.path.join(world_path, 'level.dat')):
-                logger.error(f"Uploaded world '{world_name}' missing level.dat file")
-                if os.path.exists(world_path):
-                    shutil.rmtree(world_path)
-                return jsonify({'success': False, 'message': 'Invalid world: missing level.dat file. Make sure your zip contains the world data at the root level.'}), 400
-            
-            # Clean up
-            if os.path.exists(temp_extract_path):
-                shutil.rmtree(temp_extract_path)
+        except zipfile.BadZipFile:
             os.remove(zip_path)
-            
-        except Exception as e:
-            # Log the error and clean up
-            logger.error(f"Error during world upload extraction: {e}", exc_info=True)
-            if os.path.exists(temp_extract_path):
-                shutil.rmtree(temp_extract_path)
-            if os.path.exists(zip_path):
-                os.remove(zip_path)
-            if os.path.exists(world_path):
-                shutil.rmtree(world_path)
             raise
         
         logger.info(f"World '{world_name}' uploaded by {session.get('username')}")
-        
-        # Automatically set this as the active world
-        properties_path = os.path.join(MC_DIR, 'server.properties')
-        if os.path.exists(properties_path):
-            lines = []
-            found = False
-            with open(properties_path, 'r') as f:
-                for line in f:
-                    if line.startswith('level-name='):
-                        lines.append(f'level-name={world_name}\n')
-                        found = True
-                    else:
-                        lines.append(line)
-            
-            if not found:
-                lines.append(f'level-name={world_name}\n')
-            
-            # Write back atomically
-            temp_path = properties_path + '.tmp'
-            with open(temp_path, 'w') as f:
-                f.writelines(lines)
-            os.replace(temp_path, properties_path)
-            logger.info(f"Set active world to '{world_name}'")
-        
-        message = f'World "{world_name}" uploaded successfully and set as active world'
-        if was_running:
-            start_minecraft_server()
-            message += '. Server restarted'
-        else:
-            message += '. Start the server to use this world'
-        
-        return jsonify({'success': True, 'message': message})
+        job = lifecycle_jobs.submit('install-world', install_world_job, zip_path, world_name,
+                                    user=session.get('username'))
+        return job_response(job, f'World "{world_name}" uploaded, installing...')
     except zipfile.BadZipFile:
         logger.error(f"Bad zip file uploaded by {session.get('username')}")
         return jsonify({'success': False, 'message': 'Invalid or corrupted zip file'}), 400
@@ -834,6 +1830,41 @@ def api_upload_world():
         logger.error(f"Failed to upload world: {e}")
         return jsonify({'success': False, 'message': f'Failed to upload world: {str(e)}'}), 500
 
+@app.route('/api/worlds/<name>/export')
+@login_required
+def api_export_world(name):
+    """Download a world as a zip streamed straight from its folder.
+    
+    Nothing is staged on disk. A running server's active world is flushed
+    first, waiting at most EXPORT_FLUSH_TIMEOUT so the request thread isn't
+    held up, but files the server saves during the download may be captured
+    mid-write; use a backup for a guaranteed consistent copy.
+    """
+    try:
+        world_name = secure_filename(name)
+        world_path = os.path.join(MC_DIR, world_name)
+        if not world_name or not os.path.exists(os.path.join(world_path, 'level.dat')):
+            return jsonify({'success': False, 'message': 'World not found'}), 404
+        
+        policy = BACKUP_CODEC_POLICY
+        codec = request.args.get('codec')
+        if codec:
+            try:
+                policy = BACKUP_CODEC_POLICY.with_default(codec)
+            except ValueError as e:
+                return jsonify({'success': False, 'message': str(e)}), 400
+        
+        if get_server_status() == 'running' and read_server_property('level-name', 'world') == world_name:
+            if not flush_world(EXPORT_FLUSH_TIMEOUT):
+                logger.warning(f"Save of '{world_name}' not confirmed within {EXPORT_FLUSH_TIMEOUT}s, exporting anyway")
+        
+        files = scan_files(world_path, MC_DIR)
+        logger.info(f"World '{world_name}' exported by {session.get('username')}")
+        return zip_response(stream_zip(files, policy), f"{world_name}.zip")
+    except Exception as e:
+        logger.error(f"Error exporting world: {e}")
+        return jsonify({'success': False, 'message': f'Export failed: {str(e)}'}), 500
+
 @app.route('/api/set-world', methods=['POST'])
 @login_required
 def api_set_world():
@@ -848,29 +1879,7 @@ def api_set_world():
         if not world_name:
             return jsonify({'success': False, 'message': 'Invalid world name'}), 400
         
-        properties_path = os.path.join(MC_DIR, 'server.properties')
-        
-        # Read existing properties
-        lines = []
-        found = False
-        if os.path.exists(properties_path):
-            with open(properties_path, 'r') as f:
-                for line in f:
-                    if line.startswith('level-name='):
-                        lines.append(f'level-name={world_name}\n')
-                        found = True
-                    else:
-                        lines.append(line)
-        
-        # Add if not found
-        if not found:
-            lines.append(f'level-name={world_name}\n')
-        
-        # Write back atomically
-        temp_path = properties_path + '.tmp'
-        with open(temp_path, 'w') as f:
-            f.writelines(lines)
-        os.replace(temp_path, properties_path)
+        set_active_world(world_name)
         
         logger.info(f"Active world set to '{world_name}' by {session.get('username')}")
         return jsonify({'success': True, 'message': f'Active world set to "{world_name}". Restart server to apply.'})
@@ -878,23 +1887,45 @@ def api_set_world():
         logger.error(f"Failed to set world: {e}")
         return jsonify({'success': False, 'message': f'Failed to set world: {str(e)}'}), 500
 
-@app.route('/api/properties', methods=['GET', 'POST'])
+@app.route('/api/properties', methods=['GET', 'POST', 'PATCH'])
 @login_required
 def api_properties():
-    """Get or update server properties."""
-    properties_path = os.path.join(MC_DIR, 'server.properties')
+    """Get or update server properties.
     
+    GET returns the file text and its parsed values, POST replaces the whole
+    file, and PATCH sets individual keys ({"properties": {key: value}}, a
+    null value removes the key) leaving the rest of the file untouched.
+    """
     if request.method == 'GET':
         try:
-            if os.path.exists(properties_path):
-                with open(properties_path, 'r') as f:
-                    content = f.read()
-                return jsonify({'success': True, 'content': content})
+            if server_properties.exists():
+                return jsonify({'success': True, 'content': server_properties.read_text(),
+                                'properties': server_properties.as_dict()})
             return jsonify({'success': False, 'message': 'No server.properties found'})
         except Exception as e:
             logger.error(f"Failed to read properties: {e}")
             return jsonify({'success': False, 'message': 'Failed to read properties'}), 500
     
+    elif request.method == 'PATCH':
+        try:
+            changes = (request.json or {}).get('properties')
+            if not isinstance(changes, dict) or not changes:
+                return jsonify({'success': False, 'message': 'No properties provided'}), 400
+            for key, value in changes.items():
+                if not key.strip() or (value is not None and not isinstance(value, str)):
+                    return jsonify({'success': False, 'message': f'Invalid value for "{key}"'}), 400
+            
+            changed = server_properties.update(changes)
+            if changed:
+                status_cache.invalidate()
+            
+            logger.info(f"Server properties {', '.join(changed) or '(none)'} updated by {session.get('username')}")
+            return jsonify({'success': True, 'changed': changed,
+                            'message': f'{len(changed)} properties changed. Restart server to apply changes.'})
+        except Exception as e:
+            logger.error(f"Failed to update properties: {e}")
+            return jsonify({'success': False, 'message': f'Failed to update properties: {str(e)}'}), 500
+    
     else:  # POST
         try:
             content = request.json.get('content', '')
@@ -903,16 +1934,9 @@ def api_properties():
             if not isinstance(content, str):
                 return jsonify({'success': False, 'message': 'Invalid content format'}), 400
             
-            # Backup current properties
-            if os.path.exists(properties_path):
-                backup_path = properties_path + f'.backup.{int(time.time())}'
-                shutil.copy2(properties_path, backup_path)
-            
-            # Write new properties atomically
-            temp_path = properties_path + '.tmp'
-            with open(temp_path, 'w') as f:
-                f.write(content)
-            os.replace(temp_path, properties_path)
+            # Written atomically; the previous version is kept as a backup
+            server_properties.write_text(content)
+            status_cache.invalidate()
             
             logger.info(f"Server properties updated by {session.get('username')}")
             return jsonify({'success': True, 'message': 'Properties saved. Restart server to apply changes.'})
@@ -920,21 +1944,124 @@ def api_properties():
             logger.error(f"Failed to save properties: {e}")
             return jsonify({'success': False, 'message': f'Failed to save properties: {str(e)}'}), 500
 
+@app.route('/api/metrics/history')
+@login_required
+def api_metrics_history():
+    """Resource history for the last ?range= (e.g. 15m, 6h, 7d; default 1h).
+    
+    Served from the finest tier that covers the range: per second up to an
+    hour, per minute up to a day, per 15 minutes up to 30 days.
+    """
+    try:
+        seconds = parse_duration(request.args.get('range', '1h'))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid range, use e.g. 15m, 6h or 7d'}), 400
+    if seconds <= 0:
+        return jsonify({'success': False, 'message': 'Range must be positive'}), 400
+    
+    history = metrics_history.query(seconds)
+    return jsonify({'success': True, 'range_seconds': seconds, **history})
+
 @app.route('/api/health')
 @login_required
 def api_health():
     """Get detailed health information."""
     try:
-        health = get_server_health()
+        health = status_cache.snapshot()['health']
         return jsonify({
             'success': True,
             'health': health,
+            'console_log': console_log.stats(),
             'timestamp': datetime.now().isoformat()
         })
     except Exception as e:
         logger.error(f"Failed to get health: {e}")
         return jsonify({'success': False, 'message': 'Failed to get health info'}), 500
 
+# Prometheus metrics: scrape-time collectors and the /metrics endpoint
+@metrics_registry.collector
+def collect_metrics():
+    """Values read at scrape time: server health, console, backups and lock contention."""
+    health = status_cache.snapshot()['health']
+    memory_mb = health.get('memory_mb')
+    yield gauge('minecraft_up', 'Whether the Minecraft server is running', health['status'] == 'running')
+    yield gauge('minecraft_process_cpu_percent', 'Server process CPU use, percent of one core',
+                health.get('cpu_percent'))
+    yield gauge('minecraft_process_resident_memory_bytes', 'Server process resident memory',
+                memory_mb * 1024 * 1024 if memory_mb is not None else None)
+    yield gauge('minecraft_process_threads', 'Server process threads', health.get('threads'))
+    yield gauge('minecraft_process_open_fds', 'Server process open file descriptors', health.get('open_fds'))
+    yield gauge('minecraft_process_uptime_seconds', 'Server process uptime', health.get('uptime_seconds'))
+    yield counter('minecraft_process_read_bytes_total', 'Bytes the server process read from disk',
+                  health.get('read_bytes'))
+    yield counter('minecraft_process_written_bytes_total', 'Bytes the server process wrote to disk',
+                  health.get('write_bytes'))
+    yield gauge('minecraft_players_online', 'Players online', len(server_events.online))
+    yield counter('minecraft_lag_warnings_total', '"Can\'t keep up" warnings logged by the server',
+                  server_events.lag_total)
+    
+    yield from collect_jvm_metrics(health.get('jvm'))
+    
+    yield counter('minecraft_console_lines_total', 'Console lines ingested', console_output.cursor)
+    yield gauge('minecraft_console_buffer_lines', 'Console lines held in memory', len(console_output))
+    yield gauge('minecraft_console_buffer_bytes', 'Console bytes held in memory', console_output.bytes_used)
+    yield gauge('minecraft_console_buffer_capacity_bytes', 'Console buffer size', console_output.max_bytes)
+    yield counter('minecraft_console_lock_acquisitions_total', 'Console buffer lock acquisitions',
+                  console_lock.acquisitions)
+    yield counter('minecraft_console_lock_contended_total', 'Console buffer lock acquisitions that had to wait',
+                  console_lock.contended)
+    yield counter('minecraft_console_lock_wait_seconds_total', 'Time spent waiting for the console buffer lock',
+                  console_lock.wait_seconds)
+    log_stats = console_log.stats()
+    yield gauge('minecraft_console_log_segments', 'Console log segments on disk', log_stats['segments'])
+    yield gauge('minecraft_console_log_bytes', 'Console log bytes on disk', log_stats['bytes'])
+    yield counter('minecraft_console_log_dropped_lines_total', 'Console lines the log writer could not keep up with',
+                  log_stats['dropped_lines'])
+    
+    totals = backup_catalog.totals()
+    backups = gauge('minecraft_backups', 'Backups on disk, by type')
+    stored = gauge('minecraft_backup_stored_bytes', 'Disk space used by backups, by type')
+    for backup_type in ('zip', 'snapshot'):
+        count, size = totals.get(backup_type, (0, 0))
+        backups.add(count, {'type': backup_type})
+        stored.add(size, {'type': backup_type})
+    yield backups
+    yield stored
+    pending = gauge('minecraft_manager_jobs_pending', 'Background jobs queued or running, by queue')
+    for job_queue in (lifecycle_jobs, backup_jobs, replication_jobs):
+        pending.add(len(job_queue.pending()), {'queue': job_queue.name})
+    yield pending
+
+def collect_jvm_metrics(jvm):
+    """Heap, GC and thread families from a JvmSampler summary (none when it's unavailable)."""
+    if jvm is None:
+        return
+    used = gauge('minecraft_jvm_memory_used_bytes', 'JVM memory in use, by area')
+    committed = gauge('minecraft_jvm_memory_committed_bytes', 'JVM memory committed, by area')
+    limit = gauge('minecraft_jvm_memory_max_bytes', 'JVM memory limit, by area (0 if unbounded)')
+    for area, figures in jvm['generations'].items():
+        used.add(figures['used_mb'] * 1024 * 1024, {'area': area})
+        committed.add(figures['committed_mb'] * 1024 * 1024, {'area': area})
+        limit.add(figures['max_mb'] * 1024 * 1024, {'area': area})
+    collections = counter('minecraft_jvm_gc_collections_total', 'Garbage collections, by collector')
+    paused = counter('minecraft_jvm_gc_pause_seconds_total', 'Stop-the-world time, by collector')
+    for collector in jvm['gc']:
+        collections.add(collector['count'], {'collector': collector['name']})
+        paused.add(collector['seconds'], {'collector': collector['name']})
+    yield from (used, committed, limit, collections, paused)
+    yield gauge('minecraft_jvm_threads', 'Live JVM threads', jvm['threads'])
+    yield gauge('minecraft_jvm_daemon_threads', 'Live JVM daemon threads', jvm['daemon_threads'])
+
+@app.route('/metrics')
+@limiter.exempt
+def metrics():
+    """Prometheus metrics, for a logged-in session or a request bearing METRICS_TOKEN."""
+    token = request.headers.get('Authorization', '').removeprefix('Bearer ').encode('utf-8')
+    authorized = 'logged_in' in session or (METRICS_TOKEN and hmac.compare_digest(token, METRICS_TOKEN.encode('utf-8')))
+    if not authorized:
+        return jsonify({'error': 'Not authenticated'}), 401
+    return Response(metrics_registry.render(), content_type=METRICS_CONTENT_TYPE)
+
 # Error handlers
 @app.errorhandler(413)
 def request_entity_too_large(error):
@@ -954,6 +2081,11 @@ def internal_error(error):
     logger.error(f"Internal server error: {error}")
     return jsonify({'success': False, 'message': 'Internal server error'}), 500
 
+# Pick up backups made before the catalog existed or changed by hand
+backup_jobs.submit('catalog sync', sync_catalog_job)
+status_cache.start()
+metrics_sampler.start()
+
 if __name__ == '__main__':
     logger.info("Starting Minecraft Server Manager...")
     logger.info(f"MC_DIR: {MC_DIR}")
@@ -0,0 +1,705 @@
+import errno
+import hashlib
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeout
+
+try:
+    import fcntl
+except ImportError:  # Not on Windows
+    fcntl = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import lzma
+except ImportError:  # Python built without liblzma
+    lzma = None
+
+try:
+    from compression import zstd  # Python 3.14+
+except ImportError:
+    zstd = None
+
+COPY_CHUNK_SIZE = 1024 * 1024
+SPOOL_MEMORY_LIMIT = 32 * 1024 * 1024  # Compressed entries larger than this spill to disk
+ZIP64_LIMIT = 0xFFFFFFFF
+FICLONE = 0x40049409  # Linux ioctl sharing a file's extents copy-on-write (btrfs, XFS)
+LOW_PRIORITY_NICE = 10
+
+
+class BackupCancelled(Exception):
+    """Raised inside a backup when its job has been cancelled."""
+
+
+class Throttle:
+    """Paces backup I/O to a byte rate that backs off when the server lags.
+
+    ``max_rate`` caps bytes per second (None for no cap). ``lag_signal`` is
+    a callable returning a value that changes whenever the server reports
+    tick lag; each change halves the rate, down to ``min_rate``. After
+    ``recover_seconds`` without lag the rate grows back by a quarter per
+    interval until it reaches the cap, or the unthrottled speed seen before
+    the first backoff. Safe to share between compression threads.
+    """
+
+    def __init__(self, max_rate=None, lag_signal=None, min_rate=1024 * 1024, recover_seconds=10):
+        self.max_rate = max_rate
+        self.rate = max_rate
+        self.lag_signal = lag_signal
+        self.min_rate = min_rate
+        self.recover_seconds = recover_seconds
+        self.backoffs = 0
+        self.throttled_seconds = 0.0  # Wall time with at least one thread held back
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._total_bytes = 0
+        self._ceiling = max_rate
+        self._last_lag = lag_signal() if lag_signal else None
+        self._calm_since = self._started
+        self._window_start = self._started
+        self._window_bytes = 0
+        self._sleepers = 0
+        self._sleep_start = None
+
+    def consume(self, count):
+        """Account for ``count`` bytes and sleep as long as the rate requires."""
+        with self._lock:
+            now = time.monotonic()
+            self._total_bytes += count
+            self._adapt(now)
+            if self.rate is None:
+                return
+            if self._window_start + self._window_bytes / self.rate < now - 1:
+                self._restart_window(now)  # Don't bank more than a second of idle time
+            self._window_bytes += count
+            delay = self._window_start + self._window_bytes / self.rate - now
+            if delay <= 0:
+                return
+            if self._sleepers == 0:
+                self._sleep_start = now
+            self._sleepers += 1
+        time.sleep(delay)
+        with self._lock:
+            self._sleepers -= 1
+            if self._sleepers == 0:
+                self.throttled_seconds += time.monotonic() - self._sleep_start
+
+    def _adapt(self, now):
+        if self.lag_signal is None:
+            return
+        lag = self.lag_signal()
+        if lag != self._last_lag:
+            self._last_lag = lag
+            if self._ceiling is None:
+                elapsed = now - self._started
+                self._ceiling = max(self._total_bytes / elapsed if elapsed > 0 else 0, self.min_rate)
+            self.rate = max(self.min_rate, (self.rate or self._ceiling) / 2)
+            self.backoffs += 1
+            self._calm_since = now
+            self._restart_window(now)
+        elif self.rate is not None and self.rate < self._ceiling and now - self._calm_since >= self.recover_seconds:
+            self.rate = min(self._ceiling, self.rate * 1.25)
+            if self.rate >= self._ceiling and self.max_rate is None:
+                self.rate = None  # Fully recovered, run unthrottled again
+            self._calm_since = now
+            self._restart_window(now)
+
+    def _restart_window(self, now):
+        self._window_start = now
+        self._window_bytes = 0
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'rate_limit_mb_per_second': round(self.rate / (1024 * 1024), 2) if self.rate else None,
+                'backoffs': self.backoffs,
+                'throttled_seconds': round(self.throttled_seconds, 1),
+            }
+
+
+def lower_thread_priority():
+    """Give the calling thread low CPU and best-effort-lowest I/O priority.
+
+    On Linux both are per thread, so the rest of the manager is unaffected.
+    """
+    tid = threading.get_native_id()
+    try:
+        os.setpriority(os.PRIO_PROCESS, tid, max(os.getpriority(os.PRIO_PROCESS, tid), LOW_PRIORITY_NICE))
+    except (AttributeError, OSError):
+        pass  # Not supported on this platform
+    if psutil is not None and hasattr(psutil, 'IOPRIO_CLASS_BE'):
+        try:
+            psutil.Process(tid).ionice(psutil.IOPRIO_CLASS_BE, 7)
+        except (psutil.Error, OSError):
+            pass
+
+
+def run_low_priority(func, *args, **kwargs):
+    """Call ``func`` on a short-lived low priority thread and return its result.
+
+    A thread can't always raise its priority back afterwards, so the work
+    gets a thread of its own instead of lowering the caller's.
+    """
+    outcome = {}
+
+    def target():
+        lower_thread_priority()
+        try:
+            outcome['result'] = func(*args, **kwargs)
+        except BaseException as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=target, name='low-priority', daemon=True)
+    thread.start()
+    thread.join()
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome['result']
+
+
+class BackupProgress:
+    """Thread-safe running totals for a backup, readable while it runs.
+
+    With a ``throttle``, every chunk reported through ``add_bytes`` is
+    paced by it.
+    """
+
+    def __init__(self, throttle=None):
+        self.throttle = throttle
+        self._lock = threading.Lock()
+        self.files_total = 0
+        self.bytes_total = 0
+        self.files_done = 0
+        self.bytes_done = 0
+        self.current_file = None
+        self.started = time.time()
+
+    def add_bytes(self, count, throttled=True):
+        """Record ``count`` bytes processed; pass throttled=False for work that did no I/O."""
+        with self._lock:
+            self.bytes_done += count
+        if throttled and self.throttle is not None:
+            self.throttle.consume(count)
+
+    def file_done(self):
+        with self._lock:
+            self.files_done += 1
+
+    def to_dict(self):
+        with self._lock:
+            elapsed = time.time() - self.started
+            rate = self.bytes_done / elapsed if elapsed > 0 else 0
+            remaining = self.bytes_total - self.bytes_done
+            result = {
+                'files_total': self.files_total,
+                'files_done': self.files_done,
+                'bytes_total': self.bytes_total,
+                'bytes_done': self.bytes_done,
+                'percent': round(100 * self.bytes_done / self.bytes_total, 1) if self.bytes_total else 0,
+                'elapsed_seconds': round(elapsed, 1),
+                'mb_per_second': round(rate / (1024 * 1024), 2),
+                'eta_seconds': round(remaining / rate) if rate > 0 else None,
+                'current_file': self.current_file,
+            }
+        if self.throttle is not None:
+            result['throttle'] = self.throttle.to_dict()
+        return result
+
+
+def scan_files(root, base):
+    """Return [(path, arcname, size)] for every file under ``root``.
+
+    Arc names are relative to ``base`` so the archive keeps the world folder.
+    """
+    files = []
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                size = os.path.getsize(path)
+            except FileNotFoundError:
+                continue  # Deleted by the server while we walked
+            files.append((path, os.path.relpath(path, base), size))
+    return files
+
+
+def clone_file(src, dst):
+    """Copy ``src`` to ``dst`` as cheaply as the filesystem allows.
+
+    Tries a copy-on-write reflink first, which is instant and shares disk
+    blocks until either file changes, then falls back to a kernel-side copy.
+    Unlike a hardlink the result never changes when ``src`` is rewritten in
+    place. Returns True if the file was reflinked.
+    """
+    if fcntl is not None:
+        with open(src, 'rb') as fin, open(dst, 'wb') as fout:
+            try:
+                fcntl.ioctl(fout.fileno(), FICLONE, fin.fileno())
+                cloned = True
+            except OSError:
+                cloned = False
+        if cloned:
+            shutil.copystat(src, dst)
+            return True
+    shutil.copy2(src, dst)
+    return False
+
+
+def clone_files(entries, dest, cancel_event=None, deadline=None):
+    """Clone scan_files ``entries`` into ``dest`` under their arc names.
+
+    Returns (files, reflinked, pending): the clones, listed like scan_files,
+    how many of them were reflinked, and the entries left uncloned because
+    ``time.monotonic()`` passed ``deadline``. Reflinks take no space, but
+    once a file has to be copied the rest must fit too, so the first copy
+    checks for room and raises OSError (ENOSPC) before going on.
+    """
+    files = []
+    reflinked = 0
+    space_checked = False
+    for i, (path, arcname, _) in enumerate(entries):
+        check_cancelled(cancel_event)
+        if deadline is not None and time.monotonic() >= deadline:
+            return files, reflinked, entries[i:]
+        dst = os.path.join(dest, arcname)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        try:
+            cloned = clone_file(path, dst)
+        except FileNotFoundError:
+            continue
+        reflinked += cloned
+        files.append((dst, arcname, os.path.getsize(dst)))
+        if not cloned and not space_checked:
+            space_checked = True
+            needed = sum(size for _, _, size in entries[i + 1:])
+            free = shutil.disk_usage(dest).free
+            if needed > free:
+                raise OSError(errno.ENOSPC, f"Not enough space to stage a copy of the world: "
+                                            f"{needed // (1024 * 1024)} MB more needed, {free // (1024 * 1024)} MB free")
+    return files, reflinked, []
+
+
+def check_cancelled(cancel_event):
+    if cancel_event is not None and cancel_event.is_set():
+        raise BackupCancelled()
+
+
+class _Stored:
+    """Compressor for entries stored without compression."""
+
+    def compress(self, data):
+        return data
+
+    def flush(self):
+        return b''
+
+
+class Codec:
+    """A zip compression method: its header fields and a compressor factory.
+
+    ``compressor()`` returns a fresh object with ``compress(data)`` and
+    ``flush()``, producing the entry data exactly as zip readers expect it.
+    """
+
+    def __init__(self, name, method, compressor, version=20, flags=0):
+        self.name = name
+        self.method = method
+        self.compressor = compressor
+        self.version = version  # Zip version needed to extract
+        self.flags = flags  # Method-specific general purpose flag bits
+
+
+def get_codec(spec):
+    """Return the codec for 'store', 'deflate[-level]', 'lzma' or 'zstd[-level]'.
+
+    Only codecs this Python's zipfile can read back are offered, so every
+    backup can be restored by the manager. Raises ValueError otherwise.
+    """
+    name, _, level = spec.strip().lower().partition('-')
+    if level and not level.isdigit():
+        raise ValueError(f"Unknown compression codec: {spec}")
+    level = int(level) if level else None
+    if name == 'store' and level is None:
+        return Codec('store', zipfile.ZIP_STORED, _Stored)
+    if name == 'deflate' and (level is None or level <= 9):
+        level = 6 if level is None else level
+        return Codec(f'deflate-{level}', zipfile.ZIP_DEFLATED, lambda: zlib.compressobj(level, zlib.DEFLATED, -15))
+    if name == 'lzma' and level is None:
+        if lzma is None:
+            raise ValueError("lzma is not available in this Python")
+        # Flag bit 1: the stream ends with an end-of-stream marker
+        return Codec('lzma', zipfile.ZIP_LZMA, zipfile.LZMACompressor, version=63, flags=0x02)
+    if name == 'zstd' and (level is None or 1 <= level <= 22):
+        if zstd is None or not hasattr(zipfile, 'ZIP_ZSTANDARD'):
+            raise ValueError("zstd needs Python 3.14 or later")
+        level = 3 if level is None else level
+        return Codec(f'zstd-{level}', zipfile.ZIP_ZSTANDARD, lambda: zstd.ZstdCompressor(level), version=63)
+    raise ValueError(f"Unknown compression codec: {spec}")
+
+
+def available_codecs():
+    """Return the names of the usual codec choices this Python supports."""
+    names = ['store', 'deflate-1', 'deflate-6', 'deflate-9']
+    if lzma is not None:
+        names.append('lzma')
+    if zstd is not None and hasattr(zipfile, 'ZIP_ZSTANDARD'):
+        names += ['zstd-3', 'zstd-19']
+    return names
+
+
+class CodecPolicy:
+    """Chooses the codec for each file by its extension.
+
+    ``rules`` maps extensions to codec specs, e.g. ``{'.mca': 'store'}`` to
+    keep region files, whose chunks are already zlib-compressed, from being
+    compressed a second time. Other files use ``default``.
+    """
+
+    def __init__(self, default='deflate', rules=None):
+        self.default = get_codec(default)
+        self.rules = {'.' + ext.strip().lstrip('.').lower(): get_codec(spec) for ext, spec in (rules or {}).items()}
+
+    @classmethod
+    def parse(cls, default, rules):
+        """Build a policy from a rules string such as '.mca:store,.dat:deflate-9'."""
+        parsed = {}
+        for rule in rules.split(','):
+            if not rule.strip():
+                continue
+            ext, sep, spec = rule.partition(':')
+            if not sep:
+                raise ValueError(f"Invalid codec rule: {rule}")
+            parsed[ext] = spec
+        return cls(default, parsed)
+
+    def with_default(self, default):
+        """Return a copy of this policy with a different default codec."""
+        policy = CodecPolicy(default)
+        policy.rules = dict(self.rules)
+        return policy
+
+    def codec_for(self, path):
+        return self.rules.get(os.path.splitext(path)[1].lower(), self.default)
+
+    def describe(self):
+        return ', '.join([self.default.name] + [f"{ext} {codec.name}" for ext, codec in sorted(self.rules.items())])
+
+
+def write_zip(files, archive_path, progress=None, cancel_event=None, policy=None):
+    """Write ``files`` to a zip, compressing each with the codec ``policy``
+    picks for it (deflate by default).
+
+    The archive is built under a temporary name and only renamed into place
+    once complete, so a cancelled or failed run never leaves a half-written
+    zip behind. Returns the archive's sha256 hex digest, hashed as it is
+    written so the archive is never read back.
+    """
+    progress = progress or BackupProgress()
+    progress.files_total = len(files)
+    progress.bytes_total = sum(size for _, _, size in files)
+    policy = policy or CodecPolicy()
+    temp_path = archive_path + '.partial'
+    try:
+        with open(temp_path, 'wb') as f:
+            out = _HashingFile(f)
+            writer = ZipWriter(out)
+            for path, arcname, _ in files:
+                check_cancelled(cancel_event)
+                progress.current_file = arcname
+                codec = policy.codec_for(path)
+                result = compress_file(path, codec, progress, cancel_event)
+                if result is None:
+                    continue
+                mtime, crc, size, spool, compressed_size = result
+                with spool:
+                    writer.add(arcname, mtime, codec, crc, size, spool, compressed_size)
+                progress.file_done()
+            writer.close()
+        progress.current_file = None
+        os.replace(temp_path, archive_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return out.hexdigest()
+
+
+class _HashingFile:
+    """Write-through wrapper keeping a sha256 of everything written."""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self._digest = hashlib.sha256()
+
+    def write(self, data):
+        self._digest.update(data)
+        return self.fileobj.write(data)
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+
+class ZipWriter:
+    """Minimal streaming zip writer for entries compressed elsewhere.
+
+    ``zipfile`` insists on compressing entries itself, one at a time. This
+    writer only lays out headers around data that worker threads already
+    compressed, so compression can run on every core. ZIP64 records are
+    used where sizes, offsets or the entry count need them.
+    """
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.entries = []
+        self.offset = 0
+
+    def add(self, arcname, mtime, codec, crc, file_size, data, compressed_size):
+        """Append one entry, compressed with ``codec``, whose bytes are read from ``data``."""
+        name = arcname.replace(os.sep, '/').encode('utf-8')
+        dostime, dosdate = _dos_datetime(mtime)
+        zip64 = file_size >= ZIP64_LIMIT or compressed_size >= ZIP64_LIMIT
+        version = max(codec.version, 45 if zip64 else 20)
+        flags = 0x0800 | codec.flags
+        extra = struct.pack('<HHQQ', 0x0001, 16, file_size, compressed_size) if zip64 else b''
+        header = struct.pack(
+            '<IHHHHHIIIHH', 0x04034b50, version, flags, codec.method, dostime, dosdate, crc,
+            ZIP64_LIMIT if zip64 else compressed_size, ZIP64_LIMIT if zip64 else file_size,
+            len(name), len(extra),
+        )
+        self.fileobj.write(header + name + extra)
+        shutil.copyfileobj(data, self.fileobj, COPY_CHUNK_SIZE)
+        self.entries.append((name, self.offset, codec, flags, dostime, dosdate, crc, file_size, compressed_size))
+        self.offset += len(header) + len(name) + len(extra) + compressed_size
+
+    def add_streamed(self, arcname, mtime, codec, src, size_hint=0):
+        """Append one entry, compressing ``src`` as it is read.
+
+        Sizes and CRC follow the data in a data descriptor, so nothing is
+        buffered beyond one chunk. This is a generator: it yields after each
+        write so the caller can pass the output on. ``size_hint`` is the
+        expected size, which decides up front whether ZIP64 sizes are needed.
+        """
+        name = arcname.replace(os.sep, '/').encode('utf-8')
+        dostime, dosdate = _dos_datetime(mtime)
+        zip64 = size_hint * 1.05 >= ZIP64_LIMIT  # Same margin zipfile allows for growth
+        version = max(codec.version, 45 if zip64 else 20)
+        flags = 0x0800 | 0x0008 | codec.flags  # Bit 3: sizes in a data descriptor
+        extra = struct.pack('<HHQQ', 0x0001, 16, 0, 0) if zip64 else b''
+        header = struct.pack(
+            '<IHHHHHIIIHH', 0x04034b50, version, flags, codec.method, dostime, dosdate, 0,
+            ZIP64_LIMIT if zip64 else 0, ZIP64_LIMIT if zip64 else 0, len(name), len(extra),
+        )
+        self.fileobj.write(header + name + extra)
+        yield
+        compressor = codec.compressor()
+        crc = 0
+        file_size = 0
+        compressed_size = 0
+        for chunk in iter(lambda: src.read(COPY_CHUNK_SIZE), b''):
+            crc = zlib.crc32(chunk, crc)
+            file_size += len(chunk)
+            data = compressor.compress(chunk)
+            compressed_size += len(data)
+            self.fileobj.write(data)
+            yield
+        data = compressor.flush()
+        compressed_size += len(data)
+        if not zip64 and (file_size >= ZIP64_LIMIT or compressed_size >= ZIP64_LIMIT):
+            raise ValueError(f"{arcname} grew past 4 GB while being archived")
+        descriptor = struct.pack('<IIQQ' if zip64 else '<IIII', 0x08074b50, crc, compressed_size, file_size)
+        self.fileobj.write(data + descriptor)
+        self.entries.append((name, self.offset, codec, flags, dostime, dosdate, crc, file_size, compressed_size))
+        self.offset += len(header) + len(name) + len(extra) + compressed_size + len(descriptor)
+        yield
+
+    def close(self):
+        """Write the central directory."""
+        cd_offset = self.offset
+        cd = bytearray()
+        for name, offset, codec, flags, dostime, dosdate, crc, file_size, compressed_size in self.entries:
+            # ZIP64 extra holds, in order, only the fields that overflowed
+            fields = [v for v in (file_size, compressed_size, offset) if v >= ZIP64_LIMIT]
+            extra = struct.pack('<HH', 0x0001, 8 * len(fields)) + struct.pack(f'<{len(fields)}Q', *fields) if fields else b''
+            version = max(codec.version, 45 if fields else 20)
+            cd += struct.pack(
+                '<IHHHHHHIIIHHHHHII', 0x02014b50, (3 << 8) | 63, version, flags, codec.method,
+                dostime, dosdate, crc, min(compressed_size, ZIP64_LIMIT), min(file_size, ZIP64_LIMIT),
+                len(name), len(extra), 0, 0, 0, 0o100644 << 16, min(offset, ZIP64_LIMIT),
+            ) + name + extra
+        self.fileobj.write(cd)
+        cd_size = len(cd)
+        count = len(self.entries)
+        if count >= 0xFFFF or cd_size >= ZIP64_LIMIT or cd_offset >= ZIP64_LIMIT:
+            eocd64_offset = cd_offset + cd_size
+            self.fileobj.write(struct.pack('<IQHHIIQQQQ', 0x06064b50, 44, (3 << 8) | 45, 45, 0, 0,
+                                           count, count, cd_size, cd_offset))
+            self.fileobj.write(struct.pack('<IIQI', 0x07064b50, 0, eocd64_offset, 1))
+        self.fileobj.write(struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+                                       min(cd_size, ZIP64_LIMIT), min(cd_offset, ZIP64_LIMIT), 0))
+
+
+def _dos_datetime(mtime):
+    t = time.localtime(max(mtime, 315532800))  # Zip dates start in 1980
+    return ((t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+            ((t.tm_year - 1980) << 9) | (t.tm_mon << 4) | t.tm_mday)
+
+
+def compress_file(path, codec=None, progress=None, cancel_event=None):
+    """Compress one file with ``codec`` (deflate by default) into a spooled buffer.
+
+    Returns (mtime, crc, file_size, spool, compressed_size) with the spool
+    rewound, or None if the file disappeared.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_LIMIT)
+    compressor = (codec or get_codec('deflate')).compressor()
+    crc = 0
+    size = 0
+    try:
+        with open(path, 'rb') as f:
+            mtime = os.fstat(f.fileno()).st_mtime
+            while True:
+                chunk = f.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                check_cancelled(cancel_event)
+                crc = zlib.crc32(chunk, crc)
+                size += len(chunk)
+                spool.write(compressor.compress(chunk))
+                if progress is not None:
+                    progress.add_bytes(len(chunk))
+        spool.write(compressor.flush())
+    except FileNotFoundError:
+        spool.close()
+        return None
+    except BaseException:
+        spool.close()
+        raise
+    compressed_size = spool.tell()
+    spool.seek(0)
+    return mtime, crc, size, spool, compressed_size
+
+
+def write_zip_parallel(files, archive_path, progress=None, cancel_event=None, workers=4, policy=None,
+                       low_priority=False):
+    """Like write_zip, but compresses files on a pool of ``workers`` threads.
+
+    zlib, lzma and zstd release the GIL while compressing, so threads scale
+    across cores.
+    Results are written in submission order, with at most ``2 * workers``
+    compressed entries held at a time to bound memory. With ``low_priority``
+    the workers run at lowered CPU and I/O priority. Returns the archive's
+    sha256 hex digest like write_zip.
+    """
+    progress = progress or BackupProgress()
+    progress.files_total = len(files)
+    progress.bytes_total = sum(size for _, _, size in files)
+    policy = policy or CodecPolicy()
+    temp_path = archive_path + '.partial'
+    stop = threading.Event()  # Halts workers on cancel or on a write failure
+    try:
+        initializer = lower_thread_priority if low_priority else None
+        with ThreadPoolExecutor(max_workers=workers, initializer=initializer) as pool, \
+                open(temp_path, 'wb') as f:
+            out = _HashingFile(f)
+            writer = ZipWriter(out)
+            todo = iter(files)
+            pending = deque()
+
+            def submit_next():
+                for path, arcname, _ in todo:
+                    codec = policy.codec_for(path)
+                    pending.append((arcname, codec, pool.submit(compress_file, path, codec, progress, stop)))
+                    return
+
+            try:
+                for _ in range(2 * workers):
+                    submit_next()
+                while pending:
+                    arcname, codec, future = pending.popleft()
+                    while True:
+                        if cancel_event is not None and cancel_event.is_set():
+                            raise BackupCancelled()
+                        try:
+                            result = future.result(timeout=0.5)
+                            break
+                        except FuturesTimeout:
+                            continue
+                    submit_next()
+                    if result is None:
+                        continue
+                    mtime, crc, size, spool, compressed_size = result
+                    with spool:
+                        progress.current_file = arcname
+                        writer.add(arcname, mtime, codec, crc, size, spool, compressed_size)
+                    progress.file_done()
+            except BaseException:
+                stop.set()
+                for _, _, future in pending:
+                    future.cancel()
+                raise
+            writer.close()
+        progress.current_file = None
+        os.replace(temp_path, archive_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return out.hexdigest()
+
+
+class _Pipe:
+    """File-like sink collecting what a ZipWriter writes until it is drained."""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts.clear()
+        return data
+
+
+def _open_file(path):
+    f = open(path, 'rb')
+    return f, os.fstat(f.fileno()).st_mtime
+
+
+def stream_zip(files, policy=None, opener=None):
+    """Yield a zip of ``files`` piece by piece, for streaming in a response.
+
+    Nothing is written to disk and memory stays at about one chunk per
+    file, whatever the archive size. ``opener(path)`` returns a binary file
+    and its mtime; by default ``path`` is opened from disk. Files that
+    vanish before they are reached are skipped.
+    """
+    policy = policy or CodecPolicy()
+    opener = opener or _open_file
+    pipe = _Pipe()
+    writer = ZipWriter(pipe)
+    for path, arcname, size in files:
+        try:
+            src, mtime = opener(path)
+        except FileNotFoundError:
+            continue
+        with src:
+            for _ in writer.add_streamed(arcname, mtime, policy.codec_for(path), src, size):
+                data = pipe.drain()
+                if data:
+                    yield data
+    writer.close()
+    yield pipe.drain()
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import zipfile
+
+from snapshots import MANIFEST_NAME, delta_bases, load_manifest, snapshot_names
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS backups (
+    name TEXT PRIMARY KEY,
+    type TEXT NOT NULL,          -- 'zip' or 'snapshot'
+    world TEXT,
+    size INTEGER NOT NULL,       -- Bytes of world data the backup holds
+    stored_size INTEGER NOT NULL,  -- Bytes it added on disk
+    created REAL NOT NULL,
+    checksum TEXT,               -- sha256 of the zip, or of a snapshot's manifest
+    file_count INTEGER,
+    parent TEXT,
+    standalone INTEGER NOT NULL DEFAULT 1,
+    bases TEXT NOT NULL DEFAULT '[]'  -- JSON list of snapshots its region deltas need
+);
+CREATE INDEX IF NOT EXISTS backups_type_created ON backups (type, created);
+"""
+
+COLUMNS = ('name', 'type', 'world', 'size', 'stored_size', 'created', 'checksum',
+           'file_count', 'parent', 'standalone', 'bases')
+
+
+def file_checksum(path):
+    """Return the sha256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def zip_record(path, world=None, file_count=None, checksum=None):
+    """Build a catalog record for a zip backup."""
+    stat = os.stat(path)
+    if file_count is None or world is None:
+        try:
+            with zipfile.ZipFile(path) as zipf:
+                names = zipf.namelist()
+            file_count = len(names)
+            # Backups hold a single top-level world folder
+            folders = {name.split('/', 1)[0] for name in names}
+            world = world or (folders.pop() if len(folders) == 1 else None)
+        except zipfile.BadZipFile:
+            pass
+    return {
+        'name': os.path.basename(path)[:-len('.zip')],
+        'type': 'zip',
+        'world': world,
+        'size': stat.st_size,
+        'stored_size': stat.st_size,
+        'created': stat.st_mtime,
+        'checksum': checksum,
+        'file_count': file_count,
+        'parent': None,
+        'standalone': True,
+        'bases': [],
+    }
+
+
+def snapshot_record(directory, manifest):
+    """Build a catalog record for a snapshot from its manifest."""
+    stats = manifest['stats']
+    return {
+        'name': manifest['name'],
+        'type': 'snapshot',
+        'world': manifest['world'],
+        'size': manifest['size'],
+        'stored_size': stats.get('bytes_stored', stats['bytes_copied']),
+        'created': manifest['created'],
+        'checksum': file_checksum(os.path.join(directory, manifest['name'], MANIFEST_NAME)),
+        'file_count': manifest['file_count'],
+        'parent': manifest['parent'],
+        'standalone': manifest.get('standalone', True),
+        'bases': delta_bases(manifest),
+    }
+
+
+class BackupCatalog:
+    """SQLite index of every backup, so listing and retention need no disk scans.
+
+    Records are added and removed as backups are created and deleted;
+    ``sync`` reconciles the index with the backup directories, picking up
+    backups made before the catalog existed or removed by hand.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _db(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def add(self, record):
+        """Insert or replace a backup record."""
+        values = dict(record)
+        values['standalone'] = int(bool(values['standalone']))
+        values['bases'] = json.dumps(list(values['bases']))
+        with self._lock:
+            db = self._db()
+            with db:
+                db.execute(
+                    f"INSERT OR REPLACE INTO backups ({', '.join(COLUMNS)}) "
+                    f"VALUES ({', '.join('?' for _ in COLUMNS)})",
+                    [values[column] for column in COLUMNS],
+                )
+
+    def remove(self, name):
+        with self._lock:
+            db = self._db()
+            with db:
+                db.execute("DELETE FROM backups WHERE name = ?", (name,))
+
+    def get(self, name):
+        """Return one record, or None."""
+        with self._lock:
+            row = self._db().execute("SELECT * FROM backups WHERE name = ?", (name,)).fetchone()
+        return self._record(row) if row else None
+
+    def list(self, backup_type=None, limit=None, offset=0):
+        """Return records newest first, optionally of one type."""
+        query = "SELECT * FROM backups"
+        params = []
+        if backup_type is not None:
+            query += " WHERE type = ?"
+            params.append(backup_type)
+        query += " ORDER BY created DESC LIMIT ? OFFSET ?"
+        params += [-1 if limit is None else limit, offset]
+        with self._lock:
+            rows = self._db().execute(query, params).fetchall()
+        return [self._record(row) for row in rows]
+
+    def count(self, backup_type=None):
+        query = "SELECT COUNT(*) FROM backups"
+        params = []
+        if backup_type is not None:
+            query += " WHERE type = ?"
+            params.append(backup_type)
+        with self._lock:
+            return self._db().execute(query, params).fetchone()[0]
+
+    def totals(self):
+        """Return {type: (count, stored bytes)} over all backups."""
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT type, COUNT(*), COALESCE(SUM(stored_size), 0) FROM backups GROUP BY type"
+            ).fetchall()
+        return {backup_type: (count, stored) for backup_type, count, stored in rows}
+
+    def dependents(self, name):
+        """Return the names of snapshots whose region deltas need ``name``."""
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT name, bases FROM backups WHERE type = 'snapshot' AND standalone = 0"
+            ).fetchall()
+        return [row['name'] for row in rows if name in json.loads(row['bases'])]
+
+    def sync(self, backup_dir, snapshot_dir):
+        """Bring the catalog in line with what is on disk. Returns (added, removed)."""
+        known = {record['name']: record for record in self.list()}
+        on_disk = set()
+        added = 0
+        if os.path.isdir(backup_dir):
+            for file in os.listdir(backup_dir):
+                if file.endswith('.zip'):
+                    name = file[:-len('.zip')]
+                    on_disk.add(name)
+                    if name not in known:
+                        self.add(zip_record(os.path.join(backup_dir, file)))
+                        added += 1
+        for name in snapshot_names(snapshot_dir):
+            on_disk.add(name)
+            if name not in known:
+                manifest = load_manifest(os.path.join(snapshot_dir, name))
+                if manifest is not None:
+                    self.add(snapshot_record(snapshot_dir, manifest))
+                    added += 1
+        removed = [name for name in known if name not in on_disk]
+        for name in removed:
+            self.remove(name)
+        if added or removed:
+            logger.info(f"Backup catalog synced: {added} added, {len(removed)} removed")
+        return added, len(removed)
+
+    @staticmethod
+    def _record(row):
+        record = dict(row)
+        record['standalone'] = bool(record['standalone'])
+        record['bases'] = json.loads(record['bases'])
+        return record
@@ -0,0 +1,247 @@
+import os
+import queue
+import threading
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+
+# Marker pushed to subscribers when the buffer is cleared
+RESET = object()
+
+
+class ConsoleSubscriber:
+    """Bounded per-client queue of (seq, line) items fed by a ConsoleBuffer."""
+
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = False
+
+    def get(self, timeout):
+        """Return the next item, or None if nothing arrived within timeout."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+def iter_line_batches(stream, chunk_size=65536):
+    """Yield lists of decoded, non-empty lines read from a binary stream.
+
+    Reads whatever is available on the pipe (up to ``chunk_size`` bytes) with a
+    single syscall instead of one ``readline`` per line, so a chatty server
+    produces a few large batches rather than thousands of tiny reads.
+    """
+    fd = stream.fileno()
+    pending = b''
+    while True:
+        chunk = os.read(fd, chunk_size)
+        if not chunk:
+            break
+        data = pending + chunk
+        cut = data.rfind(b'\n') + 1
+        if not cut:
+            pending = data
+            continue
+        pending = data[cut:]
+        text = data[:cut].decode('utf-8', errors='ignore')
+        lines = [line for line in map(str.strip, text.split('\n')) if line]
+        if lines:
+            yield lines
+    # Output that was not newline-terminated before EOF
+    tail = pending.decode('utf-8', errors='ignore').strip()
+    if tail:
+        yield [tail]
+
+
+class ConsoleBuffer:
+    """Byte-budgeted console history where every line carries a sequence number.
+
+    Lines are stored UTF-8 encoded back to back in one preallocated bytearray
+    used as a ring, with a parallel ring of (offset, length) index entries.
+    The oldest lines are evicted as new ones need their space, so memory use
+    stays fixed at roughly ``max_bytes`` plus 8 bytes per indexed line no
+    matter how many lines are kept. Lines are only decoded when served.
+    ``lock`` can be any Lock-like object, e.g. one that measures contention.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_lines=None, lock=None):
+        self.lock = lock or threading.Lock()
+        self.max_bytes = max_bytes
+        # Size the index for an average line of 64 bytes unless told otherwise
+        self.max_lines = max_lines or max(1, max_bytes // 64)
+        self._data = bytearray(max_bytes)
+        self._offsets = array('I', bytes(4 * self.max_lines))
+        self._lengths = array('I', bytes(4 * self.max_lines))
+        self._first = 0  # Index slot of the oldest retained line
+        self._count = 0
+        self._head = 0  # Next write position in _data
+        self._used = 0  # Bytes held by retained lines
+        self._next_seq = 1
+        self._cleared_at = 0
+        self._subscribers = set()
+
+    def append(self, line):
+        """Append a single line and return its sequence number."""
+        with self.lock:
+            return self._append(line)
+
+    def extend(self, lines):
+        """Append several lines under one lock acquisition.
+
+        Runs of lines that fit before the end of the ring are copied in with
+        a single slice assignment rather than one at a time. Returns the
+        sequence number of the first line.
+        """
+        encoded = [line.encode('utf-8')[:self.max_bytes] for line in lines]
+        cum = [0, *accumulate(map(len, encoded))]
+        with self.lock:
+            first_seq = self._next_seq
+            i, n = 0, len(encoded)
+            while i < n:
+                if self._head + len(encoded[i]) > self.max_bytes:
+                    self._wrap()
+                # Longest run starting at i that fits before the end of the ring
+                j = bisect_right(cum, cum[i] + self.max_bytes - self._head) - 1
+                j = min(j, n, i + self.max_lines)
+                self._store_run(encoded, cum, i, j)
+                i = j
+            self._next_seq += n
+            if self._subscribers:
+                for k, line in enumerate(lines):
+                    self._publish((first_seq + k, line))
+            return first_seq
+
+    def _append(self, line):
+        encoded = [line.encode('utf-8')[:self.max_bytes]]
+        if self._head + len(encoded[0]) > self.max_bytes:
+            self._wrap()
+        self._store_run(encoded, [0, len(encoded[0])], 0, 1)
+        seq = self._next_seq
+        self._next_seq += 1
+        if self._subscribers:
+            self._publish((seq, line))
+        return seq
+
+    def _wrap(self):
+        # Not enough room before the end: everything still stored past the
+        # head is older than what sits before it, so drop it and wrap
+        while self._count and self._offsets[self._first] >= self._head:
+            self._evict_oldest()
+        self._head = 0
+
+    def _store_run(self, encoded, cum, i, j):
+        """Copy encoded[i:j], which fits before the end of the ring, at the head."""
+        head, size, run = self._head, cum[j] - cum[i], j - i
+        while self._count and (self._count + run > self.max_lines or self._overlaps_oldest(head, size)):
+            self._evict_oldest()
+
+        self._data[head:head + size] = b''.join(encoded[i:j])
+        base = head - cum[i]
+        offsets = array('I', [base + c for c in cum[i:j]])
+        lengths = array('I', map(len, encoded[i:j]))
+        slot = (self._first + self._count) % self.max_lines
+        split = min(run, self.max_lines - slot)
+        self._offsets[slot:slot + split] = offsets[:split]
+        self._lengths[slot:slot + split] = lengths[:split]
+        if split < run:
+            self._offsets[:run - split] = offsets[split:]
+            self._lengths[:run - split] = lengths[split:]
+        self._count += run
+        self._head += size
+        self._used += size
+
+    def _overlaps_oldest(self, start, size):
+        offset = self._offsets[self._first]
+        length = self._lengths[self._first]
+        # Zero-length lines still occupy an index slot at their offset
+        return offset < start + size and start < offset + max(length, 1)
+
+    def _evict_oldest(self):
+        self._used -= self._lengths[self._first]
+        self._first = (self._first + 1) % self.max_lines
+        self._count -= 1
+
+    def _line_at(self, i):
+        slot = (self._first + i) % self.max_lines
+        offset = self._offsets[slot]
+        return self._data[offset:offset + self._lengths[slot]].decode('utf-8', errors='ignore')
+
+    def _publish(self, item):
+        for sub in list(self._subscribers):
+            try:
+                sub.queue.put_nowait(item)
+            except queue.Full:
+                # Slow consumer - cut it loose rather than block the reader
+                sub.dropped = True
+                self._subscribers.discard(sub)
+
+    def subscribe(self, since=None, maxsize=1000, limit=1000):
+        """Register a live subscriber.
+
+        Returns ``(subscriber, backlog, truncated)`` where ``backlog`` holds the
+        (seq, line) pairs after ``since`` that were already buffered (at most
+        ``limit`` of them). Backlog and registration happen under one lock so
+        no line is missed or delivered twice.
+        """
+        sub = ConsoleSubscriber(maxsize)
+        with self.lock:
+            backlog, truncated = [], False
+            if since is not None:
+                backlog, truncated = self._entries_since(since, limit)
+            self._subscribers.add(sub)
+        return sub, backlog, truncated
+
+    def unsubscribe(self, sub):
+        """Stop delivering lines to a subscriber."""
+        with self.lock:
+            self._subscribers.discard(sub)
+
+    def clear(self):
+        """Drop all retained lines. Sequence numbers keep increasing."""
+        with self.lock:
+            self._first = self._count = self._head = self._used = 0
+            self._cleared_at = self.cursor
+            if self._subscribers:
+                self._publish(RESET)
+
+    @property
+    def cursor(self):
+        """Sequence number of the newest line ever appended (0 if none)."""
+        return self._next_seq - 1
+
+    def snapshot(self, limit=1000):
+        """Return (lines, cursor) for the newest ``limit`` retained lines."""
+        with self.lock:
+            start = max(0, self._count - limit)
+            return [self._line_at(i) for i in range(start, self._count)], self.cursor
+
+    def since(self, seq, limit=1000):
+        """Return lines newer than ``seq``.
+
+        Returns ``(lines, cursor, truncated)``. ``truncated`` is True when some
+        lines after ``seq`` are not included - they left the buffer, the
+        buffer was cleared since, ``seq`` is from a previous run, or there were
+        more than ``limit`` of them. The newest ``limit`` retained lines are
+        then returned and the caller should replace, not append to, what it has.
+        """
+        with self.lock:
+            entries, truncated = self._entries_since(seq, limit)
+            return [line for _, line in entries], self.cursor, truncated
+
+    def _entries_since(self, seq, limit):
+        cursor = self.cursor
+        first_seq = self._next_seq - self._count
+        truncated = seq > cursor or seq < first_seq - 1 or 0 < seq <= self._cleared_at
+        start = 0 if truncated else seq - first_seq + 1
+        if self._count - start > limit:
+            start = self._count - limit
+            truncated = True
+        return [(first_seq + i, self._line_at(i)) for i in range(start, self._count)], truncated
+
+    @property
+    def bytes_used(self):
+        """Bytes of line data currently retained."""
+        return self._used
+
+    def __len__(self):
+        return self._count
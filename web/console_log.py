@@ -0,0 +1,267 @@
+import gzip
+import json
+import logging
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = 'index.json'
+ACTIVE_SUFFIX = '.log'
+SEGMENT_SUFFIX = '.log.gz'
+
+
+class ConsoleLog:
+    """Persistent console history in rotating, gzip-compressed segments.
+
+    Lines are written by a background thread to an active plain-text segment,
+    one ``<unix time>\\t<seq>\\t<line>`` record per line. When the segment grows
+    past ``segment_bytes`` or ``segment_seconds`` old it is compressed and
+    added to a small JSON index recording its time and sequence range, which
+    lets searches skip segments outside the requested window.
+    """
+
+    def __init__(self, directory, segment_bytes=16 * 1024 * 1024, segment_seconds=3600,
+                 retention_days=30, queue_size=10000):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.retention_days = retention_days
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._index_lock = threading.Lock()
+        self._index = []
+        self._active = None  # Metadata of the segment being written
+        self._file = None
+        self._dropped = 0
+        self._thread = None
+
+    def start(self):
+        """Load the index, recover unfinished segments and start the writer."""
+        os.makedirs(self.directory, exist_ok=True)
+        self._index = self._load_index()
+        self._recover()
+        self._thread = threading.Thread(target=self._run, name='console-log', daemon=True)
+        self._thread.start()
+
+    def write(self, first_seq, lines):
+        """Queue a batch of lines for writing. Never blocks the caller."""
+        try:
+            self._queue.put_nowait((time.time(), first_seq, lines))
+        except queue.Full:
+            self._dropped += len(lines)
+            if self._dropped == len(lines):
+                logger.warning("Console log writer is falling behind, dropping lines")
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=1)
+            except queue.Empty:
+                item = None
+            try:
+                if item is not None:
+                    self._write_batch(*item)
+                if self._file:
+                    self._file.flush()
+                    if time.time() - self._active['start'] >= self.segment_seconds:
+                        self._rotate()
+            except Exception as e:
+                logger.error(f"Console log writer error: {e}")
+
+    def _write_batch(self, timestamp, first_seq, lines):
+        if self._file is None:
+            self._open_segment(timestamp, first_seq)
+        prefix = f"{timestamp:.3f}\t"
+        self._file.write(''.join(
+            f"{prefix}{first_seq + i}\t{line}\n" for i, line in enumerate(lines)
+        ).encode('utf-8'))
+        active = self._active
+        active['end'] = timestamp
+        active['last_seq'] = first_seq + len(lines) - 1
+        active['lines'] += len(lines)
+        if self._file.tell() >= self.segment_bytes:
+            self._rotate()
+
+    def _open_segment(self, timestamp, first_seq):
+        base = f"console_{time.strftime('%Y%m%d_%H%M%S', time.localtime(timestamp))}_{first_seq}"
+        name, n = base, 1
+        while (os.path.exists(os.path.join(self.directory, name + ACTIVE_SUFFIX))
+               or os.path.exists(os.path.join(self.directory, name + SEGMENT_SUFFIX))):
+            n += 1
+            name = f"{base}.{n}"
+        path = os.path.join(self.directory, name + ACTIVE_SUFFIX)
+        self._file = open(path, 'ab')
+        self._active = {
+            'file': name + SEGMENT_SUFFIX,
+            'start': timestamp,
+            'end': timestamp,
+            'first_seq': first_seq,
+            'last_seq': first_seq,
+            'lines': 0,
+        }
+
+    def _rotate(self):
+        """Compress the active segment and add it to the index."""
+        self._file.close()
+        self._file = None
+        active, self._active = self._active, None
+        self._finish_segment(os.path.join(self.directory, active['file'][:-len('.gz')]), active)
+        self._apply_retention()
+
+    def _finish_segment(self, plain_path, meta):
+        compressed_path = os.path.join(self.directory, meta['file'])
+        with open(plain_path, 'rb') as src, gzip.open(compressed_path + '.tmp', 'wb', compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.replace(compressed_path + '.tmp', compressed_path)
+        os.remove(plain_path)
+        meta['bytes'] = os.path.getsize(compressed_path)
+        with self._index_lock:
+            self._index.append(meta)
+            self._save_index()
+        logger.info(f"Archived console segment {meta['file']} ({meta['lines']} lines)")
+
+    def _apply_retention(self):
+        cutoff = time.time() - self.retention_days * 86400
+        with self._index_lock:
+            expired = [meta for meta in self._index if meta['end'] < cutoff]
+            if not expired:
+                return
+            self._index = [meta for meta in self._index if meta['end'] >= cutoff]
+            self._save_index()
+        for meta in expired:
+            try:
+                os.remove(os.path.join(self.directory, meta['file']))
+                logger.info(f"Removed expired console segment {meta['file']}")
+            except FileNotFoundError:
+                pass
+
+    def _load_index(self):
+        path = os.path.join(self.directory, INDEX_FILE)
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    return json.load(f)
+            except (json.JSONDecodeError, OSError) as e:
+                logger.error(f"Failed to load console log index: {e}")
+        return []
+
+    def _save_index(self):
+        path = os.path.join(self.directory, INDEX_FILE)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(self._index, f)
+        os.replace(temp_path, path)
+
+    def _recover(self):
+        """Compress plain segments left behind by a previous run."""
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(ACTIVE_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                first, last, count = None, None, 0
+                with open(path, 'rb') as f:
+                    for raw in f:
+                        parts = raw.split(b'\t', 2)
+                        if len(parts) < 3:
+                            continue
+                        if first is None:
+                            first = parts
+                        last = parts
+                        count += 1
+                if first is None:
+                    os.remove(path)
+                    continue
+                self._finish_segment(path, {
+                    'file': name + '.gz',
+                    'start': float(first[0]),
+                    'end': float(last[0]),
+                    'first_seq': int(first[1]),
+                    'last_seq': int(last[1]),
+                    'lines': count,
+                })
+            except Exception as e:
+                logger.error(f"Failed to recover console segment {name}: {e}")
+
+    def search(self, q, start=None, end=None, limit=200, workers=4):
+        """Find lines containing ``q`` (case-insensitive), newest first.
+
+        Only segments whose time range overlaps [start, end] are read; they
+        are scanned in parallel. Returns a list of dicts with time, seq and line.
+        """
+        start = start if start is not None else 0
+        end = end if end is not None else float('inf')
+        with self._index_lock:
+            paths = [
+                (os.path.join(self.directory, meta['file']), True)
+                for meta in self._index
+                if meta['end'] >= start and meta['start'] <= end
+            ]
+        active = self._active
+        if active and active['end'] >= start and active['start'] <= end:
+            paths.append((os.path.join(self.directory, active['file'][:-len('.gz')]), False))
+        if not paths:
+            return []
+
+        pattern = re.compile(re.escape(q.encode('utf-8')), re.IGNORECASE)
+        with ThreadPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+            results = pool.map(lambda p: _scan_segment(p[0], p[1], pattern, start, end, limit), paths)
+            matches = [match for segment in results for match in segment]
+        matches.sort(key=lambda m: (m['time'], m['seq']), reverse=True)
+        return matches[:limit]
+
+    def stats(self):
+        """Return segment count, compressed bytes and dropped line count."""
+        with self._index_lock:
+            return {
+                'segments': len(self._index),
+                'bytes': sum(meta.get('bytes', 0) for meta in self._index),
+                'dropped_lines': self._dropped,
+            }
+
+
+def _scan_segment(path, compressed, pattern, start, end, limit):
+    """Return up to ``limit`` newest matching records from one segment."""
+    try:
+        if compressed:
+            with gzip.open(path, 'rb') as f:
+                data = f.read()
+        else:
+            with open(path, 'rb') as f:
+                data = f.read()
+    except FileNotFoundError:
+        # Removed by retention or rotated while we were looking
+        return []
+
+    matches = deque(maxlen=limit)
+    pos = 0
+    while True:
+        m = pattern.search(data, pos)
+        if not m:
+            break
+        line_start = data.rfind(b'\n', 0, m.start()) + 1
+        line_end = data.find(b'\n', m.end())
+        if line_end == -1:
+            line_end = len(data)
+        pos = line_end + 1
+        parts = data[line_start:line_end].split(b'\t', 2)
+        if len(parts) < 3:
+            continue
+        # Match must fall in the message, not the time/seq prefix
+        message_start = line_end - len(parts[2])
+        if m.start() < message_start and not pattern.search(parts[2]):
+            continue
+        timestamp = float(parts[0])
+        if start <= timestamp <= end:
+            matches.append({
+                'time': timestamp,
+                'seq': int(parts[1]),
+                'line': parts[2].decode('utf-8', errors='ignore'),
+            })
+    return list(matches)
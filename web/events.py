@@ -0,0 +1,172 @@
+import re
+import threading
+import time
+from collections import deque
+
+# Cheap first pass over a whole batch: str.find for each keyword finds the
+# few lines worth a closer look; the detailed pattern for that kind then
+# decides. Order matters - it is the priority when a line has several.
+_KEYWORDS = [
+    (' joined the game', 'join'),
+    (' left the game', 'leave'),
+    ('Done (', 'done'),
+    ("Can't keep up!", 'lag'),
+    ('This crash report has been saved to', 'crash'),
+    ('Exception in server tick loop', 'crash'),
+    ('Encountered an unexpected exception', 'crash'),
+    ('Saved the game', 'save'),
+    ('Save complete', 'save'),
+    ('Exception', 'exception'),
+    ('Error', 'exception'),
+]
+
+# "[12:34:56] [Server thread/INFO]: " (vanilla), "[12:34:56 INFO]: " (Paper),
+# "[12:34:56] [Server thread/INFO] [minecraft/DedicatedServer]: " (Forge) or
+# "[12:34:56] [Server thread/INFO] (Minecraft) " (Fabric). Anchoring on it
+# keeps players from faking events through chat.
+_PREFIX = r"^(?:\[[^\]]+\] ?)+(?:\([^)]+\) )?:? ?"
+
+_PATTERNS = {
+    'join': re.compile(_PREFIX + r"(?P<player>[A-Za-z0-9_]{1,16}) joined the game$"),
+    'leave': re.compile(_PREFIX + r"(?P<player>[A-Za-z0-9_]{1,16}) left the game$"),
+    'done': re.compile(_PREFIX + r"Done \((?P<seconds>[\d.,]+)s\)!"),
+    'lag': re.compile(_PREFIX + r"Can't keep up!.*?Running (?P<ms>\d+)ms or (?P<ticks>\d+) ticks behind"),
+    'crash': re.compile(_PREFIX + r"(?:This crash report|Exception in server tick loop|Encountered an unexpected)"),
+    'save': re.compile(_PREFIX + r"(?:Saved the game|Save complete)"),
+    # Header line of a stack trace, e.g. "java.lang.IllegalStateException: ..."
+    'exception': re.compile(r"^(?P<exception>(?:[\w$]+\.)+[\w$]*(?:Exception|Error))(?::|$)"),
+}
+
+LAG_WINDOW_SECONDS = 60
+
+
+class ServerEvents:
+    """Live index of server state built from console lines.
+
+    Tracks online players and session durations, startup time, tick lag
+    warnings, exceptions, crashes and world saves. ``process`` is called by
+    the console reader with each batch of lines.
+    """
+
+    def __init__(self, session_history=100):
+        self.lock = threading.Lock()
+        self.lag_total = 0  # Lag warnings ever seen; cheap to poll for changes
+        self._session_history = session_history
+        self._ready = threading.Event()
+        self._reset_state()
+
+    def _reset_state(self):
+        self.started_at = time.time()
+        self.ready_at = None
+        self.startup_seconds = None
+        self.online = {}  # player -> join time
+        self.sessions = deque(maxlen=self._session_history)
+        self.lag_events = deque()  # (time, ticks behind) within LAG_WINDOW_SECONDS
+        self.last_lag = None
+        self.exceptions = 0
+        self.last_exception = None
+        self.crashes = 0
+        self.last_crash = None
+        self.last_save = None
+
+    def reset(self):
+        """Forget per-run state when the server starts or stops."""
+        with self.lock:
+            now = time.time()
+            for player, joined in self.online.items():
+                self.sessions.append({'player': player, 'joined': joined, 'left': now,
+                                      'seconds': round(now - joined)})
+            self._reset_state()
+            self._ready.clear()
+
+    def process(self, lines):
+        """Update state from a batch of console lines."""
+        text = '\n'.join(lines)
+        candidates = {}  # line start -> [(priority, kind)]
+        for priority, (keyword, kind) in enumerate(_KEYWORDS):
+            pos = text.find(keyword)
+            while pos != -1:
+                line_start = text.rfind('\n', 0, pos) + 1
+                candidates.setdefault(line_start, []).append((priority, kind))
+                line_end = text.find('\n', pos)
+                if line_end == -1:
+                    break
+                pos = text.find(keyword, line_end)
+        if not candidates:
+            return
+
+        now = time.time()
+        with self.lock:
+            for line_start in sorted(candidates):
+                line_end = text.find('\n', line_start)
+                line = text[line_start:line_end if line_end != -1 else len(text)]
+                for _, kind in sorted(candidates[line_start]):
+                    m = _PATTERNS[kind].search(line)
+                    if m:
+                        getattr(self, f'_on_{kind}')(m, line, now)
+                        break  # One event per line
+
+    def _on_join(self, m, line, now):
+        self.online[m.group('player')] = now
+
+    def _on_leave(self, m, line, now):
+        player = m.group('player')
+        joined = self.online.pop(player, None)
+        if joined is not None:
+            self.sessions.append({'player': player, 'joined': joined, 'left': now,
+                                  'seconds': round(now - joined)})
+
+    def _on_done(self, m, line, now):
+        self.ready_at = now
+        self.startup_seconds = float(m.group('seconds').replace(',', '.'))
+        self._ready.set()
+
+    def _on_lag(self, m, line, now):
+        ticks = int(m.group('ticks'))
+        self.lag_total += 1
+        self.lag_events.append((now, ticks))
+        self._prune_lag(now)
+        self.last_lag = {'time': now, 'ms_behind': int(m.group('ms')), 'ticks_behind': ticks}
+
+    def _on_crash(self, m, line, now):
+        self.crashes += 1
+        self.last_crash = {'time': now, 'line': line}
+
+    def _on_save(self, m, line, now):
+        self.last_save = now
+
+    def _on_exception(self, m, line, now):
+        self.exceptions += 1
+        self.last_exception = {'time': now, 'exception': m.group('exception'), 'line': line}
+
+    def wait_ready(self, timeout):
+        """Block until the server logs its Done line. Returns False on timeout."""
+        return self._ready.wait(timeout)
+
+    def _prune_lag(self, now):
+        while self.lag_events and self.lag_events[0][0] < now - LAG_WINDOW_SECONDS:
+            self.lag_events.popleft()
+
+    def snapshot(self):
+        """Return a JSON-serializable view of the current state."""
+        with self.lock:
+            now = time.time()
+            self._prune_lag(now)
+            return {
+                'ready': self.ready_at is not None,
+                'startup_seconds': self.startup_seconds,
+                'player_count': len(self.online),
+                'online_players': [
+                    {'name': player, 'online_seconds': round(now - joined)}
+                    for player, joined in sorted(self.online.items())
+                ],
+                'recent_sessions': list(self.sessions)[-10:],
+                'lag_warnings_per_minute': len(self.lag_events),
+                'ticks_behind_per_minute': sum(ticks for _, ticks in self.lag_events),
+                'last_lag': self.last_lag,
+                'exceptions': self.exceptions,
+                'last_exception': self.last_exception,
+                'crashes': self.crashes,
+                'last_crash': self.last_crash,
+                'last_save': self.last_save,
+            }
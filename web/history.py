@@ -0,0 +1,172 @@
+import logging
+import math
+import re
+import threading
+import time
+from array import array
+
+logger = logging.getLogger(__name__)
+
+# Finest first: one sample per second for an hour, per minute for a day,
+# per 15 minutes for 30 days
+DEFAULT_TIERS = ((1, 3600), (60, 1440), (900, 2880))
+
+_DURATION = re.compile(r'^(\d+(?:\.\d+)?)([smhd]?)$')
+_UNITS = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_duration(value):
+    """Parse '90', '90s', '15m', '6h' or '7d' into seconds."""
+    match = _DURATION.match(value.strip().lower())
+    if match is None:
+        raise ValueError(f"Invalid duration: {value}")
+    return float(match.group(1)) * _UNITS[match.group(2)]
+
+
+class Tier:
+    """Ring of ``capacity`` points, each aggregating ``resolution`` seconds of samples.
+
+    Storage is allocated up front in flat arrays, so memory stays fixed
+    however long the history runs.
+    """
+
+    def __init__(self, resolution, capacity, fields):
+        self.resolution = resolution
+        self.capacity = capacity
+        self.fields = fields
+        self.times = array('d', [0.0]) * capacity
+        self.values = [array('d', [math.nan]) * capacity for _ in fields]
+        self.size = 0
+        self._next = 0
+        self._bucket = None
+        self._totals = [0.0] * len(fields)
+        self._counts = [0] * len(fields)
+
+    def add(self, timestamp, values, modes):
+        """Fold one sample into the current point, closing it once its period is over."""
+        bucket = int(timestamp // self.resolution)
+        if bucket != self._bucket:
+            self._close(modes)
+            self._bucket = bucket
+        for i, value in enumerate(values):
+            if value is None:
+                continue
+            if not self._counts[i]:
+                self._totals[i] = value
+            elif modes[i] == 'max':
+                self._totals[i] = max(self._totals[i], value)
+            else:
+                self._totals[i] += value
+            self._counts[i] += 1
+
+    def _close(self, modes):
+        if self._bucket is None or not any(self._counts):
+            return
+        self.times[self._next] = self._bucket * self.resolution
+        for i, column in enumerate(self.values):
+            count = self._counts[i]
+            if not count:
+                column[self._next] = math.nan
+            else:
+                column[self._next] = self._totals[i] / count if modes[i] == 'mean' else self._totals[i]
+            self._totals[i] = 0.0
+            self._counts[i] = 0
+        self._next = (self._next + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def span(self):
+        return self.resolution * self.capacity
+
+    def since(self, start):
+        """Return (times, {field: values}) for closed points at or after ``start``, oldest first."""
+        first = (self._next - self.size) % self.capacity
+        order = [(first + i) % self.capacity for i in range(self.size)]
+        order = [i for i in order if self.times[i] >= start]
+        series = {}
+        for field, column in zip(self.fields, self.values):
+            series[field] = [None if math.isnan(column[i]) else round(column[i], 3) for i in order]
+        return [self.times[i] for i in order], series
+
+
+class MetricsHistory:
+    """Resource samples kept at several resolutions, coarser ones covering longer.
+
+    ``fields`` maps each series name to how samples merge into one point:
+    'mean' for gauges and rates, 'max' for peaks, 'sum' for event counts.
+    Every sample goes to every tier, so each tier aggregates raw samples
+    rather than already-rounded points of the tier below it.
+    """
+
+    def __init__(self, fields, tiers=DEFAULT_TIERS):
+        self.fields = tuple(fields)
+        self._modes = [fields[field] for field in self.fields]
+        self._lock = threading.Lock()
+        self.tiers = [Tier(resolution, capacity, self.fields) for resolution, capacity in tiers]
+
+    def add(self, timestamp, sample):
+        """Record a sample ({field: value}; missing or None fields are gaps)."""
+        values = [sample.get(field) for field in self.fields]
+        with self._lock:
+            for tier in self.tiers:
+                tier.add(timestamp, values, self._modes)
+
+    def query(self, seconds, now=None):
+        """Return the last ``seconds`` of history from the finest tier that covers them."""
+        now = time.time() if now is None else now
+        tier = next((t for t in self.tiers if t.span() >= seconds), self.tiers[-1])
+        with self._lock:
+            times, series = tier.since(now - seconds)
+        return {'resolution': tier.resolution, 'fields': list(self.fields), 'timestamps': times, 'series': series}
+
+
+class CounterRates:
+    """Turns ever-growing counters (bytes read, packets sent) into per-second rates."""
+
+    def __init__(self):
+        self._last = {}
+
+    def rates(self, timestamp, counters):
+        """Return {name: rate} since the previous call; None for a counter's first
+        reading or when it went backwards (the process restarted)."""
+        rates = {}
+        for name, value in counters.items():
+            previous = self._last.get(name)
+            if value is None:
+                rates[name] = None
+                continue
+            self._last[name] = (timestamp, value)
+            if previous is None or value < previous[1] or timestamp <= previous[0]:
+                rates[name] = None
+            else:
+                rates[name] = (value - previous[1]) / (timestamp - previous[0])
+        return rates
+
+
+class PeriodicSampler:
+    """Calls ``collect`` every ``interval`` seconds on a background thread and
+    records what it returns in ``history``; None (nothing to measure) is skipped."""
+
+    def __init__(self, collect, history, interval=1):
+        self.collect = collect
+        self.history = history
+        self.interval = interval
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True, name='metrics-sampler')
+            self._thread.start()
+
+    def _run(self):
+        next_run = time.monotonic()
+        while True:
+            try:
+                sample = self.collect()
+                if sample is not None:
+                    self.history.add(time.time(), sample)
+            except Exception as e:
+                logger.error(f"Failed to sample metrics: {e}")
+            # Keep to the cadence however long collecting took
+            next_run += self.interval
+            time.sleep(max(0.0, next_run - time.monotonic()))
+            next_run = max(next_run, time.monotonic() - self.interval)
@@ -0,0 +1,161 @@
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+
+class Job:
+    """A unit of background work and its observable state."""
+
+    def __init__(self, name, func, args, kwargs, user=None, cancellable=False):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.user = user
+        self.cancellable = cancellable  # Whether func stops when cancel_event is set
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.state = QUEUED
+        self.phase = None  # Free-form progress step, e.g. 'stopping' or 'ready'
+        self.message = None
+        self.progress = None  # Optional object with a to_dict() method
+        self.cancel_event = threading.Event()
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    def set_phase(self, phase):
+        logger.info(f"Job {self.id} ({self.name}): {phase}")
+        self.phase = phase
+
+    @property
+    def done(self):
+        return self.state in (SUCCEEDED, FAILED, CANCELLED)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'user': self.user,
+            'state': self.state,
+            'cancellable': self.cancellable,
+            'phase': self.phase,
+            'message': self.message,
+            'progress': self.progress.to_dict() if self.progress else None,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+        }
+
+
+class JobQueue:
+    """Runs submitted jobs one at a time on a single worker thread.
+
+    A job function receives the Job as its first argument and returns
+    ``(success, message)`` like the manager's other operations. Finished jobs
+    are kept for status lookups until ``history`` newer ones have finished.
+    ``on_done(queue, job)`` is called after each job finishes.
+    """
+
+    def __init__(self, name='jobs', history=100, on_done=None):
+        self.name = name
+        self.history = history
+        self.on_done = on_done
+        self._queue = queue.Queue()
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, name, func, *args, user=None, cancellable=False, **kwargs):
+        """Queue ``func(job, *args, **kwargs)`` and return the Job.
+
+        Pass ``cancellable=True`` only if ``func`` checks ``job.cancel_event``;
+        other jobs can still be cancelled while they are queued.
+        """
+        job = Job(name, func, args, kwargs, user=user, cancellable=cancellable)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._trim()
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        """Return all known jobs, newest first."""
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def pending(self):
+        """Return jobs that are queued or running."""
+        with self._lock:
+            return [job for job in self._jobs.values() if not job.done]
+
+    def cancel(self, job_id):
+        """Request cancellation. Returns False if the job is unknown, done, or
+        running and not cancellable.
+
+        A queued job is skipped; a running job sees its ``cancel_event`` set
+        and is expected to stop at its next check.
+        """
+        job = self.get(job_id)
+        if job is None or job.done or (job.state == RUNNING and not job.cancellable):
+            return False
+        job.cancel_event.set()
+        return True
+
+    def _trim(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job.cancel_event.is_set():
+                # Message and finish time first, so pollers never see a
+                # finished job without them
+                job.message = 'Cancelled before it started'
+                job.finished = time.time()
+                job.state = CANCELLED
+                self._done(job)
+                continue
+            job.state = RUNNING
+            job.started = time.time()
+            try:
+                success, message = job.func(job, *job.args, **job.kwargs)
+                if success:
+                    state = SUCCEEDED
+                else:
+                    state = CANCELLED if job.cancel_event.is_set() else FAILED
+            except Exception as e:
+                if job.cancel_event.is_set():
+                    state, message = CANCELLED, 'Cancelled'
+                else:
+                    logger.error(f"Job {job.id} ({job.name}) failed: {e}", exc_info=True)
+                    state, message = FAILED, str(e)
+            job.message = message
+            job.finished = time.time()
+            job.state = state
+            logger.info(f"Job {job.id} ({job.name}) {job.state}: {job.message}")
+            self._done(job)
+
+    def _done(self, job):
+        if self.on_done is not None:
+            try:
+                self.on_done(self, job)
+            except Exception as e:
+                logger.error(f"Job {job.id} ({job.name}) completion hook failed: {e}")
@@ -0,0 +1,206 @@
+import glob
+import logging
+import os
+import shutil
+import struct
+import subprocess
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PERFDATA_DIR = '/tmp'  # HotSpot always writes hsperfdata_<user>/<pid> here on Linux
+PERFDATA_MAGIC = b'\xca\xfe\xc0\xc0'
+JCMD_TIMEOUT = 10
+
+_PROLOGUE = '4sbbbbiiqii'  # magic, byte order, major, minor, accessible, used, overflow, ...
+_ENTRY = 'iiibbbbi'  # length, name offset, vector length, type, flags, units, variability, data offset
+MB = 1024 * 1024
+
+
+def find_perfdata(pid):
+    """Return the path of a JVM's hsperfdata file, or None."""
+    matches = glob.glob(os.path.join(PERFDATA_DIR, 'hsperfdata_*', str(pid)))
+    return matches[0] if matches else None
+
+
+def read_perfdata(path):
+    """Parse a HotSpot performance data file into {counter name: value}.
+
+    This is the shared-memory file jstat and jcmd PerfCounter.print read.
+    Longs come back as ints and byte vectors as strings; other types are
+    skipped. Returns None while the JVM has not finished setting it up.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:4] != PERFDATA_MAGIC:
+        raise ValueError(f"{path} is not a JVM performance data file")
+    order = '<' if data[4] == 1 else '>'
+    _, _, _, _, accessible, used, _, _, entry_offset, num_entries = struct.unpack_from(order + _PROLOGUE, data)
+    if not accessible:
+        return None
+    entry = struct.Struct(order + _ENTRY)
+    counters = {}
+    offset = entry_offset
+    for _ in range(num_entries):
+        if offset + entry.size > min(used, len(data)):
+            break
+        length, name_offset, vector_length, data_type, _, _, _, data_offset = entry.unpack_from(data, offset)
+        if length <= 0:
+            break
+        name_start = offset + name_offset
+        name = data[name_start:data.index(b'\0', name_start)].decode('ascii', 'replace')
+        start = offset + data_offset
+        if data_type == ord('J') and vector_length == 0:
+            counters[name] = struct.unpack_from(order + 'q', data, start)[0]
+        elif data_type == ord('B') and vector_length > 0:
+            counters[name] = data[start:start + vector_length].split(b'\0', 1)[0].decode('utf-8', 'replace')
+        offset += length
+    return counters
+
+
+def read_jcmd_counters(pid, jcmd='jcmd'):
+    """The same counters via ``jcmd <pid> PerfCounter.print``, for JVMs run without shared perf memory."""
+    result = subprocess.run([jcmd, str(pid), 'PerfCounter.print'], capture_output=True, text=True,
+                            timeout=JCMD_TIMEOUT)
+    if result.returncode != 0:
+        raise RuntimeError(f"jcmd failed: {(result.stderr or result.stdout).strip()}")
+    counters = {}
+    for line in result.stdout.splitlines()[1:]:  # The first line is "<pid>:"
+        name, sep, value = line.partition('=')
+        if not sep:
+            continue
+        if value.startswith('"'):
+            counters[name] = value.strip('"')
+        else:
+            try:
+                counters[name] = int(value)
+            except ValueError:
+                pass
+    return counters
+
+
+def _area(counters, prefix, used):
+    return {
+        'used_mb': round(used / MB, 1),
+        'committed_mb': round(counters.get(prefix + 'capacity', 0) / MB, 1),
+        'max_mb': round(counters.get(prefix + 'maxCapacity', 0) / MB, 1),
+    }
+
+
+def summarize(counters):
+    """Reduce raw HotSpot counters to heap, GC and thread figures.
+
+    Heap is split into the young generation (eden plus survivors), the old
+    generation and metaspace. GC times are the stop-the-world time each
+    collector has accumulated; tick counters are converted with
+    sun.os.hrt.frequency.
+    """
+    frequency = counters.get('sun.os.hrt.frequency') or 1
+    generations = {}
+    for index, area in enumerate(('young', 'old')):
+        prefix = f'sun.gc.generation.{index}.'
+        if prefix + 'capacity' not in counters:
+            continue
+        used = sum(counters.get(f'{prefix}space.{space}.used', 0)
+                   for space in range(counters.get(prefix + 'spaces', 0)))
+        generations[area] = _area(counters, prefix, used)
+    if 'sun.gc.metaspace.used' in counters:
+        generations['metaspace'] = _area(counters, 'sun.gc.metaspace.', counters['sun.gc.metaspace.used'])
+
+    collectors = []
+    for index in range(counters.get('sun.gc.policy.collectors', 3)):
+        prefix = f'sun.gc.collector.{index}.'
+        if prefix + 'invocations' not in counters:
+            continue
+        entry, exit = counters.get(prefix + 'lastEntryTime', 0), counters.get(prefix + 'lastExitTime', 0)
+        collectors.append({
+            'name': counters.get(prefix + 'name', f'collector {index}'),
+            'count': counters[prefix + 'invocations'],
+            'seconds': round(counters.get(prefix + 'time', 0) / frequency, 3),
+            # Exit before entry means a collection is in progress
+            'last_pause_ms': round((exit - entry) / frequency * 1000, 1) if exit >= entry > 0 else None,
+        })
+
+    heap = [generations[area] for area in ('young', 'old') if area in generations]
+    return {
+        'heap_used_mb': round(sum(area['used_mb'] for area in heap), 1),
+        'heap_committed_mb': round(sum(area['committed_mb'] for area in heap), 1),
+        'generations': generations,
+        'gc': collectors,
+        'gc_count': sum(collector['count'] for collector in collectors),
+        'gc_seconds': round(sum(collector['seconds'] for collector in collectors), 3),
+        'threads': counters.get('java.threads.live'),
+        'daemon_threads': counters.get('java.threads.daemon'),
+        'peak_threads': counters.get('java.threads.livePeak'),
+    }
+
+
+class JvmSampler:
+    """Reads heap, GC and thread telemetry from a running HotSpot JVM.
+
+    The JVM's hsperfdata file is read directly: it is what jstat reads, costs
+    one small file read and needs no JDK tools, which a JRE-only image does
+    not have. When it is unavailable (-XX:-UsePerfData or
+    -XX:+PerfDisableSharedMem) and jcmd is installed, ``jcmd PerfCounter.print``
+    is used instead; that starts a JVM per call, so it runs at most every
+    ``jcmd_interval`` seconds and a cached sample is returned in between.
+
+    Each sample carries its ``timestamp`` and ``recent_pause_ms``, the
+    longest pause of the collections that ran since the previous fresh
+    sample (None on cached samples or when none ran).
+    """
+
+    def __init__(self, jcmd_interval=15):
+        self.jcmd_interval = jcmd_interval
+        self.jcmd = shutil.which('jcmd')
+        self._lock = threading.Lock()
+        self._pid = None
+        self._source = None
+        self._last = None  # (monotonic time, sample)
+        self._counts = {}
+        self._warned = None
+        self._failed_at = None  # Retry a failed read only after jcmd_interval
+
+    def sample(self, pid, max_age=None):
+        """Return the JVM summary for ``pid``, or None if it can't be read."""
+        with self._lock:
+            if pid != self._pid:
+                self._pid, self._source, self._last, self._counts = pid, None, None, {}
+                self._failed_at = None
+            min_age = self.jcmd_interval if self._source == 'jcmd' else 0
+            if self._last is not None:
+                taken, sample = self._last
+                if time.monotonic() - taken <= max(max_age or 0, min_age):
+                    return dict(sample, recent_pause_ms=None)
+            if self._failed_at is not None and time.monotonic() - self._failed_at < self.jcmd_interval:
+                return None
+            try:
+                counters, self._source = self._read(pid)
+            except Exception as e:
+                if self._warned != pid:
+                    logger.warning(f"JVM telemetry unavailable for PID {pid}: {e}")
+                    self._warned = pid
+                self._failed_at = time.monotonic()
+                return None
+            self._failed_at = None
+            if counters is None:
+                return None
+            sample = summarize(counters)
+            sample['source'] = self._source
+            sample['timestamp'] = time.time()
+            pauses = [collector['last_pause_ms'] for collector in sample['gc']
+                      if collector['count'] > self._counts.get(collector['name'], collector['count'])
+                      and collector['last_pause_ms'] is not None]
+            sample['recent_pause_ms'] = max(pauses) if pauses else None
+            self._counts = {collector['name']: collector['count'] for collector in sample['gc']}
+            self._last = (time.monotonic(), sample)
+            return sample
+
+    def _read(self, pid):
+        path = find_perfdata(pid)
+        if path is not None:
+            return read_perfdata(path), 'perfdata'
+        if self.jcmd is not None:
+            return read_jcmd_counters(pid, self.jcmd), 'jcmd'
+        raise FileNotFoundError("no hsperfdata file (started with -XX:-UsePerfData?) and jcmd is not installed")
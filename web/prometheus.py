@@ -0,0 +1,191 @@
+import threading
+import time
+from bisect import bisect_left
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Request latencies, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value):
+    if value is None:
+        return 'NaN'
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+class Family:
+    """One metric as exposed: name, type, help and its samples.
+
+    ``samples`` are (suffix, labels, value); the suffix is '' for gauges and
+    counters, or '_bucket', '_sum' and '_count' for histograms.
+    """
+
+    def __init__(self, name, kind, help, samples=None):
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.samples = samples or []
+
+    def add(self, value, labels=None, suffix=''):
+        self.samples.append((suffix, labels or {}, value))
+        return self
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples:
+            lines.append(f"{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines)
+
+
+def gauge(name, help, value=None, labels=None):
+    """A gauge family, with one sample unless ``value`` is None (unknown)."""
+    family = Family(name, 'gauge', help)
+    return family if value is None else family.add(value, labels)
+
+
+def counter(name, help, value=None, labels=None):
+    """A counter family read from a running total kept elsewhere."""
+    family = Family(name, 'counter', help)
+    return family if value is None else family.add(value, labels)
+
+
+class Counter:
+    """A counter updated in place, with one series per combination of label values."""
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def collect(self):
+        family = Family(self.name, 'counter', self.help)
+        with self._lock:
+            for labelvalues, value in sorted(self._values.items()):
+                family.add(value, dict(zip(self.labelnames, labelvalues)))
+        return family
+
+
+class Histogram:
+    """Counts observations into cumulative buckets, per combination of label values.
+
+    An observation costs a bisect and a few additions under a lock, cheap
+    enough to time every request.
+    """
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # label values -> [per-bucket counts (last is +Inf), sum]
+
+    def observe(self, value, *labelvalues):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def collect(self):
+        family = Family(self.name, 'histogram', self.help)
+        with self._lock:
+            items = sorted((labelvalues, list(counts), total) for labelvalues, (counts, total) in self._series.items())
+        for labelvalues, counts, total in items:
+            labels = dict(zip(self.labelnames, labelvalues))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                family.add(cumulative, dict(labels, le=_format_value(float(bound))), '_bucket')
+            family.add(total, labels, '_sum')
+            family.add(cumulative, labels, '_count')
+        return family
+
+
+class TimedLock:
+    """A threading.Lock that counts how long acquirers wait for it.
+
+    The uncontended path is a single non-blocking acquire with no clock
+    reads; only acquirers that have to wait are timed. The counters are
+    updated while the lock is held, so they need no lock of their own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_seconds = 0.0
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self._lock.acquire(False):
+            self.acquisitions += 1
+            return True
+        if not blocking:
+            return False
+        started = time.perf_counter()
+        if not self._lock.acquire(True, timeout):
+            return False
+        self.acquisitions += 1
+        self.contended += 1
+        self.wait_seconds += time.perf_counter() - started
+        return True
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc_info):
+        self._lock.release()
+
+
+class Registry:
+    """Metrics to expose: instruments updated in place plus collectors that
+    read current values (health, buffer depth, ...) at scrape time."""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, func):
+        """Register ``func() -> iterable of Family``; usable as a decorator."""
+        self._collectors.append(func)
+        return func
+
+    def render(self):
+        families = [metric.collect() for metric in self._metrics]
+        for func in self._collectors:
+            families.extend(func())
+        return '\n'.join(family.render() for family in families) + '\n'
@@ -0,0 +1,206 @@
+import glob
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_ESCAPES = {'t': '\t', 'n': '\n', 'r': '\r', 'f': '\f'}
+_KEY_END = re.compile(r'(?<!\\)(?:\\\\)*[=:\s]')
+
+
+def _unescape(text):
+    """Decode the backslash escapes Java's Properties writes (\\:, \\=, \\uXXXX, ...)."""
+    out = []
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if char == '\\' and i + 1 < len(text):
+            nxt = text[i + 1]
+            if nxt == 'u' and i + 6 <= len(text):
+                try:
+                    out.append(chr(int(text[i + 2:i + 6], 16)))
+                    i += 6
+                    continue
+                except ValueError:
+                    pass
+            out.append(_ESCAPES.get(nxt, nxt))
+            i += 2
+        else:
+            out.append(char)
+            i += 1
+    return ''.join(out)
+
+
+def _escape(text, key=False):
+    """Encode a key or value the way Java's Properties.store does."""
+    out = []
+    for i, char in enumerate(text):
+        if char == '\\':
+            out.append('\\\\')
+        elif char in '\t\n\r\f':
+            out.append('\\' + {'\t': 't', '\n': 'n', '\r': 'r', '\f': 'f'}[char])
+        elif char in '=:#!':
+            out.append('\\' + char)
+        elif char == ' ' and (key or i == 0):
+            out.append('\\ ')
+        else:
+            out.append(char)
+    return ''.join(out)
+
+
+def _continues(line):
+    """Whether a logical line carries on to the next: an odd number of trailing backslashes."""
+    stripped = line.rstrip('\r\n')
+    return (len(stripped) - len(stripped.rstrip('\\'))) % 2 == 1
+
+
+def parse(text):
+    """Split properties text into [(key, raw lines, value)], one item per
+    logical line; comments and blank lines come through with key None."""
+    entries = []
+    lines = text.splitlines(keepends=True)
+    i = 0
+    while i < len(lines):
+        raw = [lines[i]]
+        stripped = lines[i].lstrip()
+        if not stripped.strip() or stripped[0] in '#!':
+            entries.append((None, raw, None))
+            i += 1
+            continue
+        while _continues(raw[-1]) and i + len(raw) < len(lines):
+            raw.append(lines[i + len(raw)])
+        i += len(raw)
+        logical = stripped.rstrip('\r\n')
+        for line in raw[1:]:
+            logical = logical[:-1] + line.lstrip().rstrip('\r\n')
+        match = _KEY_END.search(logical)
+        if match is None:
+            key, value = logical, ''
+        else:
+            key = logical[:match.end() - 1]
+            value = logical[match.end() - 1:].lstrip(' \t\f')
+            if value[:1] in ('=', ':'):
+                value = value[1:].lstrip(' \t\f')
+        entries.append((_unescape(key), raw, _unescape(value)))
+    return entries
+
+
+class PropertiesFile:
+    """server.properties, parsed once and cached until the file changes.
+
+    Reads cost one stat while the file is unchanged. Comments, blank lines
+    and key order survive updates, and only the changed lines are
+    rewritten. Every write replaces the file atomically and keeps a
+    ``.backup.<timestamp>`` copy of the previous version, up to ``history``
+    of them.
+    """
+
+    def __init__(self, path, history=5):
+        self.path = path
+        self.history = history
+        self._lock = threading.Lock()
+        self._stat = False  # Not read yet
+        self._entries = []
+        self._values = {}
+
+    def _load(self):
+        """Re-parse the file if it changed since it was last read. Call with the lock held."""
+        try:
+            st = os.stat(self.path)
+            stat = (st.st_mtime_ns, st.st_ino, st.st_size)
+        except FileNotFoundError:
+            stat = None
+        if stat == self._stat:
+            return
+        text = ''
+        if stat is not None:
+            with open(self.path, 'r', encoding='utf-8', errors='surrogateescape') as f:
+                text = f.read()
+        self._set(parse(text), stat)
+
+    def _set(self, entries, stat):
+        self._entries = entries
+        self._values = {key: value for key, _, value in entries if key is not None}
+        self._stat = stat
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def get(self, key, default=None):
+        with self._lock:
+            self._load()
+            return self._values.get(key, default)
+
+    def as_dict(self):
+        with self._lock:
+            self._load()
+            return dict(self._values)
+
+    def read_text(self):
+        with self._lock:
+            self._load()
+            return ''.join(''.join(raw) for _, raw, _ in self._entries)
+
+    def update(self, changes):
+        """Set keys to new values (None removes a key) in one atomic write.
+
+        Keys already in the file keep their place; new ones are appended.
+        Returns the keys whose value actually changed.
+        """
+        with self._lock:
+            self._load()
+            changed = [key for key, value in changes.items() if self._values.get(key) != value]
+            if not changed:
+                return []
+            lines = []
+            for key, raw, _ in self._entries:
+                if key in changed:
+                    if changes[key] is None:
+                        continue
+                    raw = [f"{_escape(key, key=True)}={_escape(changes[key])}\n"]
+                lines.extend(raw)
+            text = ''.join(lines)
+            if text and not text.endswith('\n'):
+                text += '\n'
+            for key in changed:
+                if changes[key] is not None and key not in self._values:
+                    text += f"{_escape(key, key=True)}={_escape(changes[key])}\n"
+            self._write(text)
+            return changed
+
+    def write_text(self, text):
+        """Replace the whole file."""
+        with self._lock:
+            self._write(text)
+
+    def _write(self, text):
+        """Back up the current file, then replace it. Call with the lock held."""
+        if os.path.exists(self.path):
+            backup_path = f"{self.path}.backup.{int(time.time())}"
+            if not os.path.exists(backup_path):
+                shutil.copy2(self.path, backup_path)
+            self._prune_backups()
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8', errors='surrogateescape') as f:
+            f.write(text)
+        os.replace(temp_path, self.path)
+        st = os.stat(self.path)
+        self._set(parse(text), (st.st_mtime_ns, st.st_ino, st.st_size))
+
+    def backups(self):
+        """Return backup copies of the file, newest first."""
+        def timestamp(path):
+            suffix = path.rsplit('.', 1)[-1]
+            return int(suffix) if suffix.isdigit() else 0
+        return sorted(glob.glob(glob.escape(self.path) + '.backup.*'), key=timestamp, reverse=True)
+
+    def _prune_backups(self):
+        for path in self.backups()[self.history:]:
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"Failed to remove old properties backup {path}: {e}")
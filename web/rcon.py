@@ -0,0 +1,178 @@
+import itertools
+import logging
+import queue
+import socket
+import struct
+
+logger = logging.getLogger(__name__)
+
+SERVERDATA_AUTH = 3
+SERVERDATA_EXECCOMMAND = 2
+SERVERDATA_RESPONSE_VALUE = 0
+
+MAX_PACKET_SIZE = 4110  # Largest packet a Minecraft server sends or accepts
+
+
+class RconError(Exception):
+    """Raised when an RCON command cannot be delivered or answered."""
+
+
+class RconAuthError(RconError):
+    """Raised when the server rejects the RCON password."""
+
+
+def encode_packet(request_id, packet_type, payload):
+    """Build one RCON packet."""
+    body = struct.pack('<ii', request_id, packet_type) + payload.encode('utf-8') + b'\x00\x00'
+    return struct.pack('<i', len(body)) + body
+
+
+def read_packet(sock):
+    """Read one RCON packet and return (request_id, type, payload)."""
+    header = _recv_exact(sock, 4)
+    (length,) = struct.unpack('<i', header)
+    if length < 10 or length > MAX_PACKET_SIZE:
+        raise RconError(f"Invalid RCON packet length {length}")
+    body = _recv_exact(sock, length)
+    request_id, packet_type = struct.unpack('<ii', body[:8])
+    return request_id, packet_type, body[8:-2].decode('utf-8', errors='replace')
+
+
+def _recv_exact(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise RconError("RCON connection closed")
+        data += chunk
+    return bytes(data)
+
+
+class RconConnection:
+    """A single authenticated RCON connection."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, host, port, password, timeout=5):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.timeout = timeout
+        self.sock = None
+
+    def connect(self):
+        """Open the socket and authenticate."""
+        self.close()
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            request_id = next(self._ids)
+            sock.sendall(encode_packet(request_id, SERVERDATA_AUTH, self.password))
+            while True:
+                response_id, packet_type, _ = read_packet(sock)
+                # Some servers send an empty RESPONSE_VALUE before the auth reply
+                if packet_type == SERVERDATA_EXECCOMMAND or response_id == -1:
+                    break
+            if response_id == -1:
+                raise RconAuthError("RCON authentication failed")
+        except BaseException:
+            sock.close()
+            raise
+        self.sock = sock
+
+    def command(self, command, timeout=None):
+        """Run a command and return the full response text.
+
+        Long responses arrive split over several packets. A second, empty
+        packet is sent behind the command; since the server answers in order,
+        its reply marks the end of the command's output.
+        """
+        if self.sock is None:
+            self.connect()
+        self.sock.settimeout(timeout or self.timeout)
+        request_id = next(self._ids)
+        end_id = next(self._ids)
+        self.sock.sendall(
+            encode_packet(request_id, SERVERDATA_EXECCOMMAND, command)
+            + encode_packet(end_id, SERVERDATA_RESPONSE_VALUE, '')
+        )
+        parts = []
+        while True:
+            response_id, _, payload = read_packet(self.sock)
+            if response_id == end_id:
+                return ''.join(parts)
+            if response_id == request_id:
+                parts.append(payload)
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+
+class RconPool:
+    """Pool of persistent RCON connections.
+
+    Each connection runs one command at a time, so up to ``size`` commands
+    can be in flight at once. Connections are opened lazily and reopened
+    after a failure; a command that fails on a stale connection is retried
+    once on a fresh one.
+    """
+
+    def __init__(self, host, port, password, size=4, timeout=5):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        for _ in range(size):
+            self._idle.put(RconConnection(host, port, password, timeout))
+
+    def command(self, command, timeout=None):
+        """Run a command on a pooled connection and return its response."""
+        try:
+            conn = self._idle.get(timeout=timeout or self.timeout)
+        except queue.Empty:
+            raise RconError("No RCON connection available")
+        try:
+            for attempt in range(2):
+                fresh = conn.sock is None
+                try:
+                    return conn.command(command, timeout)
+                except RconAuthError:
+                    conn.close()
+                    raise
+                except socket.timeout as e:
+                    # The command may still be running - never send it twice
+                    conn.close()
+                    raise RconError(f"RCON command timed out: {command}") from e
+                except (OSError, RconError) as e:
+                    conn.close()
+                    if fresh or attempt:
+                        raise RconError(f"RCON command failed: {e}") from e
+                    logger.info(f"RCON connection lost, reconnecting: {e}")
+        finally:
+            self._idle.put(conn)
+
+    def available(self):
+        """Return True if a connection can be made and authenticated."""
+        try:
+            self.command('list')
+            return True
+        except RconError:
+            return False
+
+    def close(self):
+        """Close every idle connection. They reconnect on next use."""
+        idle = []
+        while True:
+            try:
+                idle.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        for conn in idle:
+            conn.close()
+            self._idle.put(conn)
@@ -0,0 +1,143 @@
+import struct
+
+# An Anvil region (.mca) file starts with two 4 KB tables of 1024 entries:
+# chunk locations (3-byte sector offset, 1-byte sector count) and chunk save
+# timestamps in seconds. Each chunk lives at its offset as a 4-byte length,
+# a compression byte and the compressed data.
+#
+# A delta stores one version of a region relative to another: per chunk its
+# timestamp and whether it is absent, unchanged from the base version, or
+# stored in the delta itself.
+SECTOR_BYTES = 4096
+CHUNKS = 1024
+HEADER_BYTES = 2 * SECTOR_BYTES
+MAX_CHUNK_SECTORS = 255
+
+DELTA_MAGIC = b'MCAD'
+DELTA_VERSION = 1
+DELTA_ENTRY = struct.Struct('>IBI')  # timestamp, kind, payload length
+DELTA_HEADER_BYTES = len(DELTA_MAGIC) + 2 + CHUNKS * DELTA_ENTRY.size
+
+ABSENT = 0
+FROM_BASE = 1
+STORED = 2
+
+
+class RegionError(Exception):
+    """Raised when a region file or delta is malformed."""
+
+
+def parse_region(data):
+    """Return 1024 (timestamp, raw chunk) pairs from a region file's bytes.
+
+    Raw chunks keep their length prefix and compression byte so they can be
+    written back unchanged; absent chunks are (0, None).
+    """
+    if len(data) < HEADER_BYTES:
+        if not data:
+            return [(0, None)] * CHUNKS  # The server creates regions empty
+        raise RegionError("Region file shorter than its header")
+    locations = struct.unpack_from(f'>{CHUNKS}I', data, 0)
+    timestamps = struct.unpack_from(f'>{CHUNKS}I', data, SECTOR_BYTES)
+    chunks = []
+    for location, timestamp in zip(locations, timestamps):
+        offset = (location >> 8) * SECTOR_BYTES
+        if location == 0:
+            chunks.append((0, None))
+            continue
+        if offset < HEADER_BYTES or offset + 5 > len(data):
+            raise RegionError(f"Chunk offset {offset} outside the file")
+        (length,) = struct.unpack_from('>I', data, offset)
+        if length == 0 or offset + 4 + length > len(data):
+            raise RegionError(f"Chunk at {offset} overruns the file")
+        chunks.append((timestamp, data[offset:offset + 4 + length]))
+    return chunks
+
+
+def region_timestamps(data):
+    """Return the 1024 chunk timestamps of a region or delta, 0 for absent chunks."""
+    if data[:len(DELTA_MAGIC)] == DELTA_MAGIC:
+        return [timestamp if kind != ABSENT else 0 for timestamp, kind, _ in _delta_entries(data)]
+    if len(data) < HEADER_BYTES:
+        return [0] * CHUNKS
+    locations = struct.unpack_from(f'>{CHUNKS}I', data, 0)
+    timestamps = struct.unpack_from(f'>{CHUNKS}I', data, SECTOR_BYTES)
+    return [timestamp if location else 0 for location, timestamp in zip(locations, timestamps)]
+
+
+def build_region(chunks):
+    """Lay out a region file from 1024 (timestamp, raw chunk) pairs.
+
+    Chunks are packed in index order, so the result holds the same chunks
+    as the original file but not necessarily the same bytes.
+    """
+    locations = []
+    timestamps = []
+    body = bytearray()
+    sector = HEADER_BYTES // SECTOR_BYTES
+    for timestamp, raw in chunks:
+        if raw is None:
+            locations.append(0)
+            timestamps.append(0)
+            continue
+        count = -(-len(raw) // SECTOR_BYTES)
+        if count > MAX_CHUNK_SECTORS:
+            raise RegionError(f"Chunk of {len(raw)} bytes does not fit a region entry")
+        locations.append((sector << 8) | count)
+        timestamps.append(timestamp)
+        body += raw
+        body += bytes(count * SECTOR_BYTES - len(raw))
+        sector += count
+    return struct.pack(f'>{CHUNKS}I', *locations) + struct.pack(f'>{CHUNKS}I', *timestamps) + bytes(body)
+
+
+def build_delta(chunks, base_timestamps, base_saved_before):
+    """Encode ``chunks`` relative to a base version with ``base_timestamps``.
+
+    A chunk is taken from the base only when its timestamp matches and was
+    saved before ``base_saved_before`` (whole seconds), the moment the base
+    was read: a chunk saved in that same second might have changed after
+    the base copy without its timestamp moving. Returns (delta bytes,
+    number of chunks stored).
+    """
+    entries = bytearray(DELTA_MAGIC + struct.pack('>H', DELTA_VERSION))
+    payload = bytearray()
+    stored = 0
+    for (timestamp, raw), base_timestamp in zip(chunks, base_timestamps):
+        if raw is None:
+            entries += DELTA_ENTRY.pack(0, ABSENT, 0)
+        elif timestamp == base_timestamp and 0 < base_timestamp < base_saved_before:
+            entries += DELTA_ENTRY.pack(timestamp, FROM_BASE, 0)
+        else:
+            entries += DELTA_ENTRY.pack(timestamp, STORED, len(raw))
+            payload += raw
+            stored += 1
+    return bytes(entries + payload), stored
+
+
+def _delta_entries(data):
+    if data[:len(DELTA_MAGIC)] != DELTA_MAGIC or len(data) < DELTA_HEADER_BYTES:
+        raise RegionError("Not a region delta")
+    (version,) = struct.unpack_from('>H', data, len(DELTA_MAGIC))
+    if version != DELTA_VERSION:
+        raise RegionError(f"Unsupported region delta version {version}")
+    return list(DELTA_ENTRY.iter_unpack(data[len(DELTA_MAGIC) + 2:DELTA_HEADER_BYTES]))
+
+
+def apply_delta(data, base_chunks):
+    """Return the chunks a delta describes, given its base version's chunks."""
+    chunks = []
+    offset = DELTA_HEADER_BYTES
+    for (timestamp, kind, length), (_, base_raw) in zip(_delta_entries(data), base_chunks):
+        if kind == ABSENT:
+            chunks.append((0, None))
+        elif kind == FROM_BASE:
+            if base_raw is None:
+                raise RegionError("Delta refers to a chunk missing from its base")
+            chunks.append((timestamp, base_raw))
+        else:
+            if offset + length > len(data):
+                raise RegionError("Delta payload truncated")
+            chunks.append((timestamp, data[offset:offset + length]))
+            offset += length
+    return chunks
@@ -0,0 +1,273 @@
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from backups import BackupProgress, check_cancelled
+from s3 import S3Error
+from snapshots import MANIFEST_NAME, delta_bases, hash_file, load_manifest, select_prunable, stored_path
+
+logger = logging.getLogger(__name__)
+
+MIN_PART_SIZE = 5 * 1024 * 1024  # S3's minimum for every part but the last
+MAX_PARTS = 10000
+
+
+def _md5(data):
+    return hashlib.md5(data).hexdigest()
+
+
+def multipart_etag(part_md5s):
+    """ETag S3 gives an object assembled from parts with these MD5 digests."""
+    digest = hashlib.md5(b''.join(bytes.fromhex(md5) for md5 in part_md5s)).hexdigest()
+    return f"{digest}-{len(part_md5s)}"
+
+
+class Replicator:
+    """Copies backups to an S3-compatible bucket and applies retention there.
+
+    Layout under ``prefix``::
+
+        zips/<name>.zip                 zip backups
+        snapshots/<name>/manifest.json  snapshot manifests, each file naming its blob
+        blobs/<sha256>                  snapshot file contents, stored once however
+                                        many snapshots share them
+
+    Files larger than ``part_size`` go up as multipart uploads with parts
+    sent on ``workers`` threads; an interrupted upload is resumed from the
+    parts the store already holds, recorded in ``state_dir``. Every part
+    and object is checked against its MD5 and the whole file's sha256 is
+    kept in its metadata. ``throttle`` (a backups.Throttle) caps bandwidth
+    across all threads.
+    """
+
+    def __init__(self, client, prefix='', workers=4, part_size=16 * 1024 * 1024, throttle=None, state_dir=None):
+        self.client = client
+        self.prefix = prefix
+        self.workers = workers
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.throttle = throttle
+        self.state_dir = state_dir
+        self._manifests = {}  # Remote snapshot manifests, which never change once written
+
+    def _key(self, *parts):
+        return self.prefix + '/'.join(parts)
+
+    # Listing and retention
+
+    def remote_backups(self):
+        """Return the backups in the bucket as [{name, type, created, bases}]."""
+        backups = []
+        for item in self.client.list_objects(self._key('zips/')):
+            name = item['key'][len(self._key('zips/')):]
+            if name.endswith('.zip') and '/' not in name:
+                modified = datetime.strptime(item['last_modified'][:19], '%Y-%m-%dT%H:%M:%S')
+                created = modified.replace(tzinfo=timezone.utc).timestamp()
+                backups.append({'name': name[:-len('.zip')], 'type': 'zip', 'created': created, 'bases': []})
+        for item in self.client.list_objects(self._key('snapshots/')):
+            name, _, file = item['key'][len(self._key('snapshots/')):].partition('/')
+            if file == MANIFEST_NAME:
+                manifest = self._remote_manifest(name)
+                backups.append({'name': name, 'type': 'snapshot', 'created': manifest['created'],
+                                'bases': delta_bases(manifest)})
+        return backups
+
+    def _remote_manifest(self, name):
+        if name not in self._manifests:
+            self._manifests[name] = json.loads(self.client.get_object(self._key('snapshots', name, MANIFEST_NAME)))
+        return self._manifests[name]
+
+    def apply_retention(self, keep):
+        """Apply local retention to the bucket: keep the newest ``keep`` zips and
+        snapshots, and the older snapshots their region deltas build on.
+
+        Works from what the bucket holds, so losing the local backups never
+        removes remote ones. Returns the names removed.
+        """
+        backups = self.remote_backups()
+        zips = sorted((b for b in backups if b['type'] == 'zip'), key=lambda b: b['created'], reverse=True)
+        removed = [b['name'] for b in zips[keep:]]
+        removed += select_prunable([b for b in backups if b['type'] == 'snapshot'], keep)
+        by_name = {b['name']: b for b in backups}
+        for name in removed:
+            self.remove(by_name[name])
+        if any(by_name[name]['type'] == 'snapshot' for name in removed):
+            self.collect_garbage()
+        return removed
+
+    def remove(self, backup):
+        """Delete a backup from the bucket. Snapshot blobs are left for collect_garbage."""
+        if backup['type'] == 'zip':
+            self.client.delete_object(self._key('zips', f"{backup['name']}.zip"))
+        else:
+            self.client.delete_object(self._key('snapshots', backup['name'], MANIFEST_NAME))
+            self._manifests.pop(backup['name'], None)
+        logger.info(f"Removed backup {backup['name']} from the replica")
+
+    def collect_garbage(self):
+        """Delete blobs no remaining snapshot refers to. Returns how many."""
+        referenced = set()
+        for backup in self.remote_backups():
+            if backup['type'] == 'snapshot':
+                referenced.update(entry['blob'] for entry in self._remote_manifest(backup['name'])['files'].values())
+        removed = 0
+        for item in list(self.client.list_objects(self._key('blobs/'))):
+            if item['key'][len(self._key('blobs/')):] not in referenced:
+                self.client.delete_object(item['key'])
+                removed += 1
+        return removed
+
+    # Uploads
+
+    def replicate(self, backup, backup_dir, snapshot_dir, progress=None, cancel_event=None):
+        """Upload one local backup (a catalog record). Returns bytes uploaded."""
+        progress = progress or BackupProgress()
+        if backup['type'] == 'zip':
+            path = os.path.join(backup_dir, f"{backup['name']}.zip")
+            return self.upload_file(self._key('zips', f"{backup['name']}.zip"), path,
+                                    {'sha256': backup['checksum']} if backup['checksum'] else None,
+                                    progress, cancel_event, parallel=True)
+        return self._replicate_snapshot(snapshot_dir, backup['name'], progress, cancel_event)
+
+    def _replicate_snapshot(self, directory, name, progress, cancel_event):
+        manifest = load_manifest(os.path.join(directory, name))
+        if manifest is None:
+            raise FileNotFoundError(f"Snapshot {name} not found")
+        known = {item['key'][len(self._key('blobs/')):] for item in self.client.list_objects(self._key('blobs/'))}
+        remote = dict(manifest, files={})
+        uploads = {}
+        for rel, entry in manifest['files'].items():
+            path = stored_path(directory, name, manifest['world'], rel, entry)
+            # A region delta is stored as itself, not as the region it rebuilds
+            blob = hash_file(path) if entry.get('delta') else entry['sha256']
+            remote['files'][rel] = dict(entry, blob=blob)
+            if blob not in known:
+                uploads[blob] = path
+
+        def upload_blob(item):
+            blob, path = item
+            return self.upload_file(self._key('blobs', blob), path, {'sha256': blob}, progress, cancel_event)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            uploaded = sum(pool.map(upload_blob, uploads.items()))
+        check_cancelled(cancel_event)
+        # The manifest goes last: a snapshot is in the bucket once its manifest is
+        data = json.dumps(remote, indent=2).encode('utf-8')
+        self.client.put_object(self._key('snapshots', name, MANIFEST_NAME), data)
+        self._manifests[name] = remote
+        return uploaded + len(data)
+
+    def upload_file(self, key, path, metadata=None, progress=None, cancel_event=None, parallel=False):
+        """Upload a file, as one request or, above part_size, in parts.
+
+        With ``parallel`` the parts go up on ``workers`` threads. Returns
+        bytes uploaded.
+        """
+        size = os.path.getsize(path)
+        if size <= self.part_size:
+            with open(path, 'rb') as f:
+                data = f.read()
+            check_cancelled(cancel_event)
+            etag = self.client.put_object(key, data, metadata, throttle=self.throttle)
+            if etag and etag != _md5(data):
+                raise S3Error(f"Checksum mismatch after uploading {key}")
+            if progress is not None:
+                progress.add_bytes(size, throttled=False)
+            return size
+        return self._upload_multipart(key, path, size, metadata, progress, cancel_event, parallel)
+
+    def _state_path(self, key):
+        if self.state_dir is None:
+            return None
+        return os.path.join(self.state_dir, hashlib.sha256(key.encode('utf-8')).hexdigest()[:32] + '.json')
+
+    def _load_state(self, key, path, size):
+        state_path = self._state_path(key)
+        if state_path is None or not os.path.exists(state_path):
+            return None
+        with open(state_path, 'r') as f:
+            state = json.load(f)
+        if state['key'] != key or state['size'] != size or state['mtime_ns'] != os.stat(path).st_mtime_ns:
+            return None  # The file changed since; its parts are no use
+        return state
+
+    def _save_state(self, state):
+        state_path = self._state_path(state['key'])
+        if state_path is None:
+            return
+        os.makedirs(self.state_dir, exist_ok=True)
+        temp_path = state_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(temp_path, state_path)
+
+    def _clear_state(self, key):
+        state_path = self._state_path(key)
+        if state_path is not None and os.path.exists(state_path):
+            os.remove(state_path)
+
+    def discard_stale_uploads(self):
+        """Abort unfinished uploads whose local file is gone, e.g. rotated away
+        before replication caught up. Returns how many."""
+        if self.state_dir is None or not os.path.isdir(self.state_dir):
+            return 0
+        discarded = 0
+        for file in os.listdir(self.state_dir):
+            if not file.endswith('.json'):
+                continue
+            with open(os.path.join(self.state_dir, file), 'r') as f:
+                state = json.load(f)
+            if not os.path.exists(state['path']):
+                self.client.abort_multipart_upload(state['key'], state['upload_id'])
+                self._clear_state(state['key'])
+                discarded += 1
+        return discarded
+
+    def _upload_multipart(self, key, path, size, metadata, progress, cancel_event, parallel):
+        state = self._load_state(key, path, size)
+        existing = {}
+        if state is not None:
+            try:
+                existing = self.client.list_parts(key, state['upload_id'])
+                logger.info(f"Resuming upload of {key}: {len(existing)} parts already stored")
+            except S3Error as e:
+                if e.status != 404:
+                    raise
+                state = None  # The store expired or aborted the upload
+        if state is None:
+            part_size = max(self.part_size, -(-size // MAX_PARTS))
+            state = {'key': key, 'path': path, 'size': size, 'mtime_ns': os.stat(path).st_mtime_ns,
+                     'part_size': part_size, 'upload_id': self.client.create_multipart_upload(key, metadata)}
+            self._save_state(state)
+        part_size = state['part_size']
+        count = -(-size // part_size)
+
+        def upload_part(number):
+            check_cancelled(cancel_event)
+            with open(path, 'rb') as f:
+                f.seek((number - 1) * part_size)
+                data = f.read(part_size)
+            md5 = _md5(data)
+            stored = existing.get(number)
+            if stored is not None and stored['etag'] == md5 and stored['size'] == len(data):
+                if progress is not None:
+                    progress.add_bytes(len(data), throttled=False)
+                return md5, 0
+            etag = self.client.upload_part(key, state['upload_id'], number, data, throttle=self.throttle)
+            if etag != md5:
+                raise S3Error(f"Checksum mismatch for part {number} of {key}")
+            if progress is not None:
+                progress.add_bytes(len(data), throttled=False)
+            return md5, len(data)
+
+        with ThreadPoolExecutor(max_workers=self.workers if parallel else 1) as pool:
+            results = list(pool.map(upload_part, range(1, count + 1)))
+        part_md5s = [md5 for md5, _ in results]
+        etag = self.client.complete_multipart_upload(key, state['upload_id'], list(enumerate(part_md5s, 1)))
+        if etag and etag != multipart_etag(part_md5s):
+            raise S3Error(f"Checksum mismatch after assembling {key}")
+        self._clear_state(key)
+        return sum(uploaded for _, uploaded in results)
+
@@ -0,0 +1,216 @@
+import ctypes
+import ctypes.util
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from backups import COPY_CHUNK_SIZE, BackupProgress, check_cancelled, clone_file
+from regions import build_region
+from snapshots import load_manifest, resolve_region, stored_path
+
+logger = logging.getLogger(__name__)
+
+RENAME_EXCHANGE = 2  # renameat2 flag: swap two paths in one step
+AT_FDCWD = -100
+
+
+class RestoreEntry:
+    """One file of a backup: where it goes, how to tell if the world already
+    has it, and how to write it."""
+
+    def __init__(self, rel, size, mtime, is_current, write):
+        self.rel = rel
+        self.size = size
+        self.mtime = mtime  # Seconds, applied to the restored file
+        self.is_current = is_current  # is_current(path) -> bool
+        self.write = write  # write(dst)
+
+
+def file_crc32(path):
+    crc = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b''):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _safe_rel(rel):
+    """Reject absolute paths and parent references from an archive."""
+    norm = os.path.normpath(rel)
+    if os.path.isabs(norm) or norm == '..' or norm.startswith('..' + os.sep):
+        raise ValueError(f"Unsafe path in backup: {rel}")
+    return norm
+
+
+def zip_entries(archive_path):
+    """Plan a restore from a zip backup holding one top-level world folder.
+
+    A world file counts as current when its size and CRC-32 match the
+    archive entry, so only differing files are decompressed.
+    """
+    with zipfile.ZipFile(archive_path) as zipf:
+        infos = [info for info in zipf.infolist() if not info.is_dir()]
+    roots = {info.filename.split('/', 1)[0] for info in infos}
+    if len(roots) != 1 or any('/' not in info.filename for info in infos):
+        raise ValueError("Backup archive must contain a single world folder")
+    local = threading.local()  # One ZipFile handle per extraction thread
+
+    def make_entry(info):
+        def is_current(path):
+            return os.path.getsize(path) == info.file_size and file_crc32(path) == info.CRC
+
+        def write(dst):
+            if not hasattr(local, 'zipf'):
+                local.zipf = zipfile.ZipFile(archive_path)
+            with local.zipf.open(info) as src, open(dst, 'wb') as out:
+                shutil.copyfileobj(src, out, COPY_CHUNK_SIZE)
+
+        return RestoreEntry(_safe_rel(info.filename.split('/', 1)[1]), info.file_size,
+                            time.mktime(info.date_time + (0, 0, -1)), is_current, write)
+
+    return [make_entry(info) for info in infos]
+
+
+def snapshot_entries(directory, name):
+    """Plan a restore from a snapshot.
+
+    A world file counts as current when it matches the manifest's size and
+    mtime, or failing that its sha256. Files are cloned out of the snapshot,
+    never hardlinked, since the server rewrites world files in place.
+    """
+    manifest = load_manifest(os.path.join(directory, name))
+    if manifest is None:
+        raise FileNotFoundError(f"Snapshot {name} not found")
+    world_name = manifest['world']
+    manifests = {name: manifest}
+
+    def make_entry(rel, entry):
+        def is_current(path):
+            st = os.stat(path)
+            if st.st_size != entry['size']:
+                return False
+            return st.st_mtime_ns == entry['mtime_ns'] or file_sha256(path) == entry['sha256']
+
+        def write(dst):
+            if entry.get('delta'):
+                with open(dst, 'wb') as f:
+                    f.write(build_region(resolve_region(directory, name, world_name, rel, manifests)))
+            else:
+                clone_file(stored_path(directory, name, world_name, rel, entry), dst)
+
+        return RestoreEntry(_safe_rel(rel), entry['size'], entry['mtime_ns'] / 1e9, is_current, write)
+
+    return [make_entry(rel, entry) for rel, entry in manifest['files'].items()]
+
+
+def stage_restore(entries, world_path, staging_path, progress=None, cancel_event=None, workers=4):
+    """Build the restored world in ``staging_path``.
+
+    Files the current world already has are hardlinked from it; the rest are
+    written from the backup. Checks and writes run on ``workers`` threads.
+    Returns stats on what was reused and rewritten.
+    """
+    progress = progress or BackupProgress()
+    progress.files_total = len(entries)
+    progress.bytes_total = sum(entry.size for entry in entries)
+    stats = {'files_reused': 0, 'files_written': 0, 'bytes_reused': 0, 'bytes_written': 0}
+    stats_lock = threading.Lock()
+
+    def restore_one(entry):
+        check_cancelled(cancel_event)
+        dst = os.path.join(staging_path, entry.rel)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        current = os.path.join(world_path, entry.rel)
+        reused = False
+        try:
+            if entry.is_current(current):
+                os.link(current, dst)
+                reused = True
+        except OSError:
+            pass  # Missing from the world, or not linkable: write it
+        if not reused:
+            entry.write(dst)
+            os.utime(dst, (entry.mtime, entry.mtime))
+        kind = 'reused' if reused else 'written'
+        with stats_lock:
+            stats[f'files_{kind}'] += 1
+            stats[f'bytes_{kind}'] += entry.size
+        progress.current_file = entry.rel
+        progress.add_bytes(entry.size)
+        progress.file_done()
+
+    shutil.rmtree(staging_path, ignore_errors=True)
+    os.makedirs(staging_path)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(restore_one, entry) for entry in entries]
+            try:
+                for future in futures:
+                    future.result()
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+    except BaseException:
+        shutil.rmtree(staging_path, ignore_errors=True)
+        raise
+    progress.current_file = None
+    return stats
+
+
+def _renameat2():
+    libc_name = ctypes.util.find_library('c')
+    if not libc_name:
+        return None
+    libc = ctypes.CDLL(libc_name, use_errno=True)
+    return getattr(libc, 'renameat2', None)
+
+
+def exchange_paths(a, b):
+    """Atomically swap two paths. Returns False where the OS can't do that."""
+    renameat2 = _renameat2()
+    if renameat2 is None:
+        return False
+    if renameat2(AT_FDCWD, os.fsencode(a), AT_FDCWD, os.fsencode(b), RENAME_EXCHANGE) == 0:
+        return True
+    err = ctypes.get_errno()
+    if err in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):  # Filesystem or kernel can't exchange
+        return False
+    raise OSError(err, os.strerror(err), a)
+
+
+def swap_into_place(staging_path, world_path, old_path):
+    """Replace ``world_path`` with ``staging_path``, moving the old world to ``old_path``.
+
+    Uses an atomic exchange where available so the world path always holds
+    a complete world; otherwise two renames, putting the old world back if
+    the second fails. Returns True if there was an old world to move.
+    """
+    if not os.path.exists(world_path):
+        os.rename(staging_path, world_path)
+        return False
+    if exchange_paths(staging_path, world_path):
+        os.rename(staging_path, old_path)  # Now holds the old world
+        return True
+    os.rename(world_path, old_path)
+    try:
+        os.rename(staging_path, world_path)
+    except OSError:
+        os.rename(old_path, world_path)
+        raise
+    return True
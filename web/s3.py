@@ -0,0 +1,249 @@
+import base64
+import hashlib
+import hmac
+import http.client
+import logging
+import threading
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from urllib.parse import quote, urlsplit
+
+logger = logging.getLogger(__name__)
+
+REQUEST_ATTEMPTS = 4  # Tries per request on connection errors and 5xx replies
+SEND_BLOCK_SIZE = 64 * 1024
+
+
+class S3Error(Exception):
+    """Raised when an object store request fails."""
+
+    def __init__(self, message, status=None, code=None):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+
+
+def sign_request(method, host, path, params, headers, payload_hash, access_key, secret_key, region, amz_date):
+    """Return the AWS Signature Version 4 Authorization header for a request.
+
+    ``headers`` must include every header to be signed, host and x-amz-date
+    among them; names are signed lowercased.
+    """
+    canonical_query = '&'.join(
+        f"{quote(str(key), safe='~')}={quote(str(value), safe='~')}" for key, value in sorted(params.items())
+    )
+    signed = sorted((name.lower(), ' '.join(str(value).split())) for name, value in headers.items())
+    canonical_headers = ''.join(f"{name}:{value}\n" for name, value in signed)
+    signed_headers = ';'.join(name for name, _ in signed)
+    canonical_request = '\n'.join([
+        method, quote(path, safe='/~'), canonical_query, canonical_headers, signed_headers, payload_hash,
+    ])
+    scope = f"{amz_date[:8]}/{region}/s3/aws4_request"
+    string_to_sign = '\n'.join([
+        'AWS4-HMAC-SHA256', amz_date, scope, hashlib.sha256(canonical_request.encode('utf-8')).hexdigest(),
+    ])
+    key = ('AWS4' + secret_key).encode('utf-8')
+    for part in (amz_date[:8], region, 's3', 'aws4_request'):
+        key = hmac.new(key, part.encode('utf-8'), hashlib.sha256).digest()
+    signature = hmac.new(key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+    return (f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, "
+            f"SignedHeaders={signed_headers}, Signature={signature}")
+
+
+class _ThrottledBody:
+    """File-like request body that paces its reads through a throttle."""
+
+    def __init__(self, data, throttle):
+        self.data = memoryview(data)
+        self.throttle = throttle
+        self.position = 0
+
+    def read(self, size=-1):
+        if size < 0:
+            size = len(self.data) - self.position
+        chunk = self.data[self.position:self.position + size]
+        self.position += len(chunk)
+        if chunk:
+            self.throttle.consume(len(chunk))
+        return bytes(chunk)
+
+
+def _text(element, tag):
+    found = element.find(f'{{*}}{tag}')
+    return found.text if found is not None else None
+
+
+class S3Client:
+    """Minimal client for S3-compatible object stores.
+
+    Covers the calls replication needs, signed with Signature Version 4 and
+    addressed path-style (``endpoint/bucket/key``), which AWS, MinIO, Ceph,
+    Backblaze B2 and Cloudflare R2 all accept. Every upload carries its
+    MD5 and SHA-256 so the store rejects corrupted bodies. Each thread gets
+    its own keep-alive connection.
+    """
+
+    def __init__(self, endpoint, bucket, access_key, secret_key, region='us-east-1', timeout=60):
+        parsed = urlsplit(endpoint)
+        self.secure = parsed.scheme == 'https'
+        self.host = parsed.netloc
+        self.base_path = parsed.path.rstrip('/')
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            connection_class = http.client.HTTPSConnection if self.secure else http.client.HTTPConnection
+            conn = connection_class(self.host, timeout=self.timeout, blocksize=SEND_BLOCK_SIZE)
+            self._local.conn = conn
+        return conn
+
+    def _drop_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def request(self, method, key='', params=None, body=b'', headers=None, throttle=None, allow=()):
+        """Send one signed request and return (status, headers, body).
+
+        Connection errors and 5xx replies are retried with backoff. Other
+        error replies raise S3Error unless their status is in ``allow``.
+        """
+        params = params or {}
+        path = f"{self.base_path}/{self.bucket}" + (f"/{key}" if key else '')
+        payload_hash = hashlib.sha256(body).hexdigest()
+        last_error = None
+        for attempt in range(REQUEST_ATTEMPTS):
+            if attempt:
+                time.sleep(min(2 ** attempt, 10))
+            amz_date = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+            signed = {'host': self.host, 'x-amz-date': amz_date, 'x-amz-content-sha256': payload_hash}
+            signed.update(headers or {})
+            request_headers = dict(signed)
+            request_headers['Authorization'] = sign_request(
+                method, self.host, path, params, signed, payload_hash,
+                self.access_key, self.secret_key, self.region, amz_date,
+            )
+            request_headers['Content-Length'] = str(len(body))
+            query = '&'.join(f"{quote(str(k), safe='~')}={quote(str(v), safe='~')}" for k, v in sorted(params.items()))
+            url = quote(path, safe='/~') + (f"?{query}" if query else '')
+            try:
+                conn = self._connection()
+                conn.request(method, url, body=_ThrottledBody(body, throttle) if throttle and body else body,
+                             headers=request_headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                self._drop_connection()
+                last_error = S3Error(f"{method} {path} failed: {e}")
+                logger.warning(f"{last_error} (attempt {attempt + 1}/{REQUEST_ATTEMPTS})")
+                continue
+            response_headers = {name.lower(): value for name, value in response.getheaders()}
+            if response.status >= 500:
+                last_error = self._error(method, path, response.status, data)
+                logger.warning(f"{last_error} (attempt {attempt + 1}/{REQUEST_ATTEMPTS})")
+                continue
+            if response.status >= 300 and response.status not in allow:
+                raise self._error(method, path, response.status, data)
+            return response.status, response_headers, data
+        raise last_error
+
+    @staticmethod
+    def _error(method, path, status, data):
+        code = message = None
+        try:
+            root = ET.fromstring(data)
+            code = _text(root, 'Code')
+            message = _text(root, 'Message')
+        except ET.ParseError:
+            pass
+        return S3Error(f"{method} {path} failed: {status} {code or ''} {message or ''}".rstrip(), status, code)
+
+    @staticmethod
+    def _upload_headers(data, metadata=None):
+        headers = {'content-md5': base64.b64encode(hashlib.md5(data).digest()).decode('ascii')}
+        for name, value in (metadata or {}).items():
+            headers[f'x-amz-meta-{name}'] = str(value)
+        return headers
+
+    def get_object(self, key):
+        return self.request('GET', key)[2]
+
+    def put_object(self, key, data, metadata=None, throttle=None):
+        """Upload a whole object; returns its ETag."""
+        _, headers, _ = self.request('PUT', key, body=data, headers=self._upload_headers(data, metadata),
+                                     throttle=throttle)
+        return headers.get('etag', '').strip('"')
+
+    def delete_object(self, key):
+        self.request('DELETE', key, allow=(404,))
+
+    def list_objects(self, prefix=''):
+        """Yield {'key', 'size', 'etag', 'last_modified'} for every object under ``prefix``."""
+        params = {'list-type': '2', 'prefix': prefix}
+        while True:
+            root = ET.fromstring(self.request('GET', params=params)[2])
+            for item in root.findall('{*}Contents'):
+                yield {
+                    'key': _text(item, 'Key'),
+                    'size': int(_text(item, 'Size') or 0),
+                    'etag': (_text(item, 'ETag') or '').strip('"'),
+                    'last_modified': _text(item, 'LastModified'),
+                }
+            token = _text(root, 'NextContinuationToken')
+            if _text(root, 'IsTruncated') != 'true' or not token:
+                return
+            params = dict(params, **{'continuation-token': token})
+
+    def create_multipart_upload(self, key, metadata=None):
+        """Start a multipart upload; returns its upload id."""
+        headers = {f'x-amz-meta-{name}': str(value) for name, value in (metadata or {}).items()}
+        root = ET.fromstring(self.request('POST', key, params={'uploads': ''}, headers=headers)[2])
+        return _text(root, 'UploadId')
+
+    def upload_part(self, key, upload_id, number, data, throttle=None):
+        """Upload one part; returns its ETag (the part's MD5)."""
+        _, headers, _ = self.request('PUT', key, params={'partNumber': number, 'uploadId': upload_id},
+                                     body=data, headers=self._upload_headers(data), throttle=throttle)
+        return headers.get('etag', '').strip('"')
+
+    def list_parts(self, key, upload_id):
+        """Return {part number: {'etag', 'size'}} for the parts uploaded so far.
+
+        Raises S3Error with status 404 if the upload no longer exists.
+        """
+        parts = {}
+        params = {'uploadId': upload_id}
+        while True:
+            root = ET.fromstring(self.request('GET', key, params=params)[2])
+            for part in root.findall('{*}Part'):
+                parts[int(_text(part, 'PartNumber'))] = {
+                    'etag': (_text(part, 'ETag') or '').strip('"'),
+                    'size': int(_text(part, 'Size') or 0),
+                }
+            marker = _text(root, 'NextPartNumberMarker')
+            if _text(root, 'IsTruncated') != 'true' or not marker:
+                return parts
+            params = {'uploadId': upload_id, 'part-number-marker': marker}
+
+    def complete_multipart_upload(self, key, upload_id, parts):
+        """Assemble uploaded ``parts`` [(number, etag)] into the object; returns its ETag."""
+        body = ('<CompleteMultipartUpload>' + ''.join(
+            f'<Part><PartNumber>{number}</PartNumber><ETag>"{etag}"</ETag></Part>' for number, etag in sorted(parts)
+        ) + '</CompleteMultipartUpload>').encode('utf-8')
+        _, _, data = self.request('POST', key, params={'uploadId': upload_id}, body=body)
+        root = ET.fromstring(data)
+        # The store can report a failure in a 200 response once it has started replying
+        if root.tag.rsplit('}', 1)[-1] == 'Error':
+            raise self._error('POST', key, 200, data)
+        return (_text(root, 'ETag') or '').strip('"')
+
+    def abort_multipart_upload(self, key, upload_id):
+        self.request('DELETE', key, params={'uploadId': upload_id}, allow=(404,))
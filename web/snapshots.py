@@ -0,0 +1,336 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import time
+
+from backups import COPY_CHUNK_SIZE, BackupProgress, check_cancelled
+from regions import DELTA_HEADER_BYTES, RegionError, apply_delta, build_delta, build_region, parse_region, region_timestamps
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+PARTIAL_SUFFIX = '.partial'
+DELTA_SUFFIX = '.delta'
+DELTA_MAX_SIZE_RATIO = 0.9  # Store the whole region when a delta saves less than this
+
+
+def hash_file(path):
+    """Return the sha256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(COPY_CHUNK_SIZE)
+            if not chunk:
+                return digest.hexdigest()
+            digest.update(chunk)
+
+
+def copy_and_hash(src, dst, progress=None, cancel_event=None):
+    """Copy ``src`` to ``dst`` in chunks and return the sha256 of what was copied."""
+    digest = hashlib.sha256()
+    with open(src, 'rb') as fin, open(dst, 'wb') as fout:
+        while True:
+            chunk = fin.read(COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            check_cancelled(cancel_event)
+            digest.update(chunk)
+            fout.write(chunk)
+            if progress is not None:
+                progress.add_bytes(len(chunk))
+    shutil.copystat(src, dst)
+    return digest.hexdigest()
+
+
+def link_or_copy(src, dst):
+    """Hardlink ``src`` to ``dst``, copying when the filesystem can't link."""
+    try:
+        os.link(src, dst)
+        return True
+    except OSError:
+        shutil.copy2(src, dst)
+        return False
+
+
+def load_manifest(snapshot_path):
+    """Return a snapshot's manifest, or None if it is missing or unreadable."""
+    try:
+        with open(os.path.join(snapshot_path, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def snapshot_names(directory):
+    """Return the names of complete snapshots without reading their manifests."""
+    if not os.path.isdir(directory):
+        return []
+    return [name for name in os.listdir(directory)
+            if not name.endswith(PARTIAL_SUFFIX) and os.path.exists(os.path.join(directory, name, MANIFEST_NAME))]
+
+
+def list_snapshots(directory):
+    """Return the manifests of all complete snapshots, newest first."""
+    snapshots = []
+    for name in snapshot_names(directory):
+        manifest = load_manifest(os.path.join(directory, name))
+        if manifest is not None:
+            snapshots.append(manifest)
+    snapshots.sort(key=lambda m: m['created'], reverse=True)
+    return snapshots
+
+
+def remove_snapshot(directory, name):
+    """Delete a snapshot. Files it shares with others survive via their other links."""
+    shutil.rmtree(os.path.join(directory, name))
+
+
+def delta_bases(manifest):
+    """Return the names of the older snapshots a snapshot's region deltas build on."""
+    return sorted({entry['delta'] for entry in manifest['files'].values() if entry.get('delta')})
+
+
+def select_prunable(snapshots, keep):
+    """Return the names to remove so only the newest ``keep`` snapshots remain.
+
+    ``snapshots`` holds dicts with name, created and bases (see delta_bases).
+    Older snapshots holding the base versions of region deltas in a kept
+    snapshot are kept too, since those deltas cannot be rebuilt without them.
+    """
+    by_name = {s['name']: s for s in snapshots}
+    newest = sorted(snapshots, key=lambda s: s['created'], reverse=True)[:keep]
+    required = set()
+    todo = [s['name'] for s in newest]
+    while todo:
+        name = todo.pop()
+        if name in required or name not in by_name:
+            continue
+        required.add(name)
+        todo.extend(by_name[name]['bases'])
+    return [name for name in by_name if name not in required]
+
+
+def stored_path(directory, snapshot_name, world_name, rel, entry):
+    """Return where a manifest entry's data lives inside a snapshot."""
+    return os.path.join(directory, snapshot_name, world_name, rel + (DELTA_SUFFIX if entry.get('delta') else ''))
+
+
+def resolve_region(directory, snapshot_name, world_name, rel, manifests):
+    """Resolve a region file through its chain of deltas into chunks."""
+    if snapshot_name not in manifests:
+        manifests[snapshot_name] = load_manifest(os.path.join(directory, snapshot_name))
+        if manifests[snapshot_name] is None:
+            raise RegionError(f"Base snapshot {snapshot_name} of {rel} is missing")
+    entry = manifests[snapshot_name]['files'][rel]
+    with open(stored_path(directory, snapshot_name, world_name, rel, entry), 'rb') as f:
+        data = f.read()
+    if entry.get('delta'):
+        return apply_delta(data, resolve_region(directory, entry['delta'], world_name, rel, manifests))
+    return parse_region(data)
+
+
+def open_snapshot_file(directory, snapshot_name, world_name, rel, entry, manifests):
+    """Open one world file of a snapshot for reading, rebuilding region deltas."""
+    if entry.get('delta'):
+        return io.BytesIO(build_region(resolve_region(directory, snapshot_name, world_name, rel, manifests)))
+    return open(stored_path(directory, snapshot_name, world_name, rel, entry), 'rb')
+
+
+def _write_region_delta(path, dst, base_path, previous):
+    """Store a region as a delta against ``previous`` where that pays off.
+
+    Returns (sha256, chunks stored, bytes written) with chunks stored None
+    when the whole region was written instead, or (sha256, None, 0) without
+    writing anything when the content equals the base version.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    if digest == previous['sha256']:
+        return digest, None, 0
+    try:
+        with open(base_path, 'rb') as f:
+            base_timestamps = region_timestamps(f.read(DELTA_HEADER_BYTES))
+        delta, stored = build_delta(parse_region(data), base_timestamps, previous['mtime_ns'] // 10**9)
+    except RegionError as e:
+        logger.warning(f"Storing {path} whole: {e}")
+        delta = None
+    if delta is not None and len(delta) < DELTA_MAX_SIZE_RATIO * len(data):
+        with open(dst + DELTA_SUFFIX, 'wb') as f:
+            f.write(delta)
+        return digest, stored, len(delta)
+    with open(dst, 'wb') as f:
+        f.write(data)
+    return digest, None, len(data)
+
+
+def scan_world(world_path):
+    """Stat every file of a world: [(path, relative path, stat result)]."""
+    files = []
+    for dirpath, _, filenames in os.walk(world_path):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue  # Deleted by the server while we walked
+            files.append((path, os.path.relpath(path, world_path).replace(os.sep, '/'), st))
+    return files
+
+
+def latest_snapshot(directory, world_name):
+    """Return the manifest of the newest snapshot of a world, or None."""
+    return next((m for m in list_snapshots(directory) if m['world'] == world_name), None)
+
+
+def _previous_entry(parent_files, rel, region_deltas):
+    previous = parent_files.get(rel)
+    if previous and previous.get('delta') and not region_deltas:
+        return None  # A plain snapshot must not depend on older ones
+    return previous
+
+
+def _unchanged(previous, st):
+    return bool(previous) and previous['size'] == st.st_size and previous['mtime_ns'] == st.st_mtime_ns
+
+
+def files_to_read(directory, world_name, files, region_deltas=False):
+    """Return the scan_world entries a snapshot will read rather than link.
+
+    Files unchanged since the previous snapshot are linked from it on their
+    stat alone, so capturing a consistent world for a snapshot only needs
+    copies of the others.
+    """
+    parent = latest_snapshot(directory, world_name)
+    parent_files = parent['files'] if parent else {}
+    return [(path, rel, st) for path, rel, st in files
+            if not _unchanged(_previous_entry(parent_files, rel, region_deltas), st)]
+
+
+def create_snapshot(world_path, directory, name, progress=None, cancel_event=None,
+                    region_deltas=False, max_chain=10, files=None):
+    """Snapshot ``world_path`` into ``directory/name`` and return its manifest.
+
+    Each snapshot is a complete copy of the world tree, so it restores on its
+    own. Files whose size and mtime match the previous snapshot of the same
+    world are hardlinked from it without being read; other files are copied
+    and hashed in one pass, and still linked if their content turns out to
+    be unchanged. Snapshot files are shared between snapshots and must never
+    be modified in place.
+
+    With ``region_deltas``, a changed region file is stored as a delta
+    holding only the chunks saved since the previous snapshot, and restoring
+    it needs the older snapshots it builds on (see ``open_snapshot_file``).
+    After ``max_chain`` deltas in a row a region is stored whole again.
+
+    ``files`` is a scan_world listing of ``world_path`` to use instead of
+    walking it; its paths may point at staged copies of the world's files.
+
+    The snapshot is built under a temporary name and renamed into place once
+    complete, so a cancelled or failed run leaves nothing behind.
+    """
+    progress = progress or BackupProgress()
+    world_name = os.path.basename(os.path.normpath(world_path))
+    parent = latest_snapshot(directory, world_name)
+    parent_files = parent['files'] if parent else {}
+
+    if files is None:
+        files = scan_world(world_path)
+    progress.files_total = len(files)
+    progress.bytes_total = sum(st.st_size for _, _, st in files)
+
+    target = os.path.join(directory, name)
+    if os.path.exists(target):
+        raise FileExistsError(f"Snapshot {name} already exists")
+    temp_root = target + PARTIAL_SUFFIX
+    shutil.rmtree(temp_root, ignore_errors=True)  # Left over from a crash
+    started = time.time()
+    manifest_files = {}
+    stats = {'files_copied': 0, 'files_linked': 0, 'files_delta': 0,
+             'bytes_copied': 0, 'bytes_linked': 0, 'bytes_delta': 0,
+             'chunks_stored': 0, 'bytes_stored': 0}
+    try:
+        for path, rel, st in files:
+            check_cancelled(cancel_event)
+            progress.current_file = rel
+            dst = os.path.join(temp_root, world_name, rel)
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            previous = _previous_entry(parent_files, rel, region_deltas)
+            base_path = stored_path(directory, parent['name'], world_name, rel, previous) if previous else None
+            entry = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+            kind = None
+            if _unchanged(previous, st):
+                try:
+                    link_or_copy(base_path, dst + (DELTA_SUFFIX if previous.get('delta') else ''))
+                    entry = dict(previous)
+                    kind = 'linked'
+                    progress.add_bytes(st.st_size, throttled=False)
+                except FileNotFoundError:
+                    previous = None  # Parent is damaged; take the file from the world
+            if kind is None and previous and region_deltas and rel.endswith('.mca') \
+                    and previous.get('chain', 0) < max_chain:
+                try:
+                    digest, chunks, written = _write_region_delta(path, dst, base_path, previous)
+                except FileNotFoundError:
+                    continue
+                progress.add_bytes(st.st_size)
+                entry['sha256'] = digest
+                if written == 0:
+                    link_or_copy(base_path, dst + (DELTA_SUFFIX if previous.get('delta') else ''))
+                    entry = dict(previous)
+                    kind = 'linked'
+                elif chunks is not None:
+                    entry.update(delta=parent['name'], chain=previous.get('chain', 0) + 1)
+                    stats['chunks_stored'] += chunks
+                    stats['bytes_stored'] += written
+                    kind = 'delta'
+                else:
+                    stats['bytes_stored'] += written
+                    kind = 'copied'
+            if kind is None:
+                try:
+                    entry['sha256'] = copy_and_hash(path, dst, progress, cancel_event)
+                except FileNotFoundError:
+                    continue
+                if previous and previous['sha256'] == entry['sha256']:
+                    # Rewritten with identical content, e.g. an unchanged level.dat_old
+                    os.remove(dst)
+                    link_or_copy(base_path, dst + (DELTA_SUFFIX if previous.get('delta') else ''))
+                    entry = dict(previous)
+                    kind = 'linked'
+                else:
+                    stats['bytes_stored'] += st.st_size
+                    kind = 'copied'
+            # Size and mtime come from the stat taken before reading, so a
+            # write that races the copy shows up as a change next time
+            manifest_files[rel] = entry
+            stats[f'files_{kind}'] += 1
+            stats[f'bytes_{kind}'] += st.st_size
+            progress.file_done()
+        progress.current_file = None
+
+        manifest = {
+            'name': name,
+            'world': world_name,
+            'created': time.time(),
+            'parent': parent['name'] if parent else None,
+            'standalone': not any(entry.get('delta') for entry in manifest_files.values()),
+            'duration_seconds': round(time.time() - started, 2),
+            'file_count': len(manifest_files),
+            'size': sum(f['size'] for f in manifest_files.values()),
+            'stats': stats,
+            'files': manifest_files,
+        }
+        with open(os.path.join(temp_root, MANIFEST_NAME), 'w') as f:
+            json.dump(manifest, f)
+        os.rename(temp_root, target)
+    except BaseException:
+        shutil.rmtree(temp_root, ignore_errors=True)
+        raise
+    logger.info(f"Snapshot {name}: {stats['files_copied']} files copied, {stats['files_delta']} as region deltas "
+                f"({stats['chunks_stored']} chunks), {stats['files_linked']} linked from {manifest['parent']} "
+                f"in {manifest['duration_seconds']}s")
+    return manifest
@@ -1,4 +1,9 @@
 let consoleUpdateInterval;
+let consoleLines = [];
+let consoleCursor = null;
+let consoleStream = null;
+let consoleRenderPending = false;
+const MAX_CONSOLE_LINES = 1000;
 
 // Initialize on page load
 document.addEventListener('DOMContentLoaded', function() {
@@ -7,11 +12,15 @@ document.addEventListener('DOMContentLoaded', function() {
     loadProperties();
     loadWorlds();
     loadCurrentUsername();
+    startConsoleStream();
     
-    // Update console every 2 seconds when on console tab
+    // Update console every 2 seconds when on console tab (polling is only
+    // used when the browser has no EventSource support)
     setInterval(() => {
         if (document.getElementById('console-tab').classList.contains('active')) {
-            updateConsole();
+            if (!consoleStream) {
+                updateConsole();
+            }
             updateHealth();
         }
     }, 2000);
@@ -98,6 +107,16 @@ async function updateHealth() {
             document.getElementById('cpu-usage').textContent = health.cpu_percent.toFixed(1) + '%';
             document.getElementById('memory-usage').textContent = Math.round(health.memory_mb) + ' MB';
             
+            // JVM heap, with GC totals on hover
+            const heap = document.getElementById('heap-usage');
+            if (health.jvm) {
+                heap.textContent = `${Math.round(health.jvm.heap_used_mb)} / ${Math.round(health.jvm.heap_committed_mb)} MB`;
+                heap.title = health.jvm.gc.map(gc => `${gc.name}: ${gc.count} collections, ${gc.seconds.toFixed(1)}s paused`).join('\n');
+            } else {
+                heap.textContent = '-';
+                heap.title = '';
+            }
+            
             // Format uptime
             const uptime = health.uptime_seconds;
             let uptimeStr = '0s';
@@ -145,6 +164,13 @@ async function updateStatus() {
             statusBadge.className = 'status-badge status-stopped';
         }
         
+        if (data.server) {
+            const playerCount = document.getElementById('player-count');
+            playerCount.textContent = data.server.player_count;
+            playerCount.title = data.server.online_players.map(p => p.name).join(', ');
+            document.getElementById('lag-warnings').textContent = data.server.lag_warnings_per_minute;
+        }
+        
         // Update worlds list if on worlds tab
         if (document.getElementById('worlds-tab').classList.contains('active')) {
             displayWorlds(data.worlds, data.active_world);
@@ -154,62 +180,144 @@ async function updateStatus() {
     }
 }
 
-async function startServer() {
-    showNotification('Starting server...', 'success');
-    try {
-        const response = await fetch('/api/start', { method: 'POST' });
+async function waitForJob(jobId, onProgress) {
+    // Poll a background job until it finishes and return its final state
+    let lastPhase = null;
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, 1500));
+        const response = await fetch(`/api/jobs/${jobId}`);
+        if (await handleApiError(response)) return null;
         const data = await response.json();
+        if (!data.success) return null;
         
-        if (data.success) {
-            showNotification(data.message, 'success');
-            setTimeout(updateStatus, 1000);
-            updateConsole();
-        } else {
-            showNotification(data.message, 'error');
+        const job = data.job;
+        if (['succeeded', 'failed', 'cancelled'].includes(job.state)) {
+            return job;
+        }
+        if (onProgress) {
+            onProgress(job);
+        } else if (job.phase && job.phase !== lastPhase) {
+            // Refresh the status only when the job moves on, not on every poll
+            lastPhase = job.phase;
+            updateStatus();
         }
-    } catch (error) {
-        showNotification('Failed to start server', 'error');
     }
 }
 
-async function stopServer() {
-    showNotification('Stopping server...', 'success');
+function formatBackupProgress(job) {
+    const p = job.progress;
+    if (!p || !['compressing', 'snapshotting'].includes(job.phase) || !p.files_total) {
+        return job.phase ? `Backup ${job.phase}...` : 'Backup queued...';
+    }
+    const label = job.phase === 'compressing' ? 'Compressing' : 'Snapshotting';
+    const eta = p.eta_seconds !== null ? ` | ETA ${p.eta_seconds}s` : '';
+    let text = `${label}: ${p.percent}% (${p.files_done}/${p.files_total} files) | ${p.mb_per_second} MB/s${eta}`;
+    if (p.throttle) {
+        const limit = p.throttle.rate_limit_mb_per_second !== null ? `${p.throttle.rate_limit_mb_per_second} MB/s` : 'unlimited';
+        text += ` | Throttle: ${limit}, ${p.throttle.backoffs} lag slowdowns`;
+    }
+    return text;
+}
+
+async function runLifecycleAction(url, pendingMessage, failureMessage) {
+    showNotification(pendingMessage, 'success');
     try {
-        const response = await fetch('/api/stop', { method: 'POST' });
+        const response = await fetch(url, { method: 'POST' });
+        if (await handleApiError(response)) return;
         const data = await response.json();
         
-        showNotification(data.message, data.success ? 'success' : 'error');
-        setTimeout(updateStatus, 1000);
+        if (!data.success) {
+            showNotification(data.message, 'error');
+            return;
+        }
+        
+        const job = await waitForJob(data.job_id);
+        if (job) {
+            showNotification(job.message, job.state === 'succeeded' ? 'success' : 'error');
+        }
+        updateStatus();
+        updateConsole();
     } catch (error) {
-        showNotification('Failed to stop server', 'error');
+        showNotification(failureMessage, 'error');
     }
 }
 
+async function startServer() {
+    await runLifecycleAction('/api/start', 'Starting server...', 'Failed to start server');
+}
+
+async function stopServer() {
+    await runLifecycleAction('/api/stop', 'Stopping server...', 'Failed to stop server');
+}
+
 async function restartServer() {
-    showNotification('Restarting server...', 'success');
-    try {
-        const response = await fetch('/api/restart', { method: 'POST' });
-        const data = await response.json();
-        
-        showNotification(data.message, data.success ? 'success' : 'error');
-        setTimeout(updateStatus, 2000);
-        updateConsole();
-    } catch (error) {
-        showNotification('Failed to restart server', 'error');
+    await runLifecycleAction('/api/restart', 'Restarting server...', 'Failed to restart server');
+}
+
+function startConsoleStream() {
+    if (!window.EventSource) return;
+    
+    // EventSource reconnects on its own and resumes via Last-Event-ID
+    consoleStream = new EventSource('/api/console/stream');
+    
+    consoleStream.addEventListener('reset', () => {
+        consoleLines = [];
+        scheduleConsoleRender();
+    });
+    
+    consoleStream.onmessage = (event) => {
+        consoleLines.push(event.data);
+        // Frames are paused in background tabs, so trim here as well
+        if (consoleLines.length > MAX_CONSOLE_LINES * 2) {
+            consoleLines = consoleLines.slice(-MAX_CONSOLE_LINES);
+        }
+        consoleCursor = parseInt(event.lastEventId, 10);
+        scheduleConsoleRender();
+    };
+}
+
+function scheduleConsoleRender() {
+    // Coalesce bursts of lines into a single DOM update per frame
+    if (consoleRenderPending) return;
+    consoleRenderPending = true;
+    requestAnimationFrame(() => {
+        consoleRenderPending = false;
+        renderConsole();
+    });
+}
+
+function renderConsole() {
+    if (consoleLines.length > MAX_CONSOLE_LINES) {
+        consoleLines = consoleLines.slice(-MAX_CONSOLE_LINES);
     }
+    
+    const consoleOutput = document.getElementById('console-output');
+    consoleOutput.textContent = consoleLines.join('\n');
+    
+    // Auto-scroll to bottom
+    const container = consoleOutput.parentElement;
+    container.scrollTop = container.scrollHeight;
 }
 
 async function updateConsole() {
+    // The stream already delivers new lines as they arrive
+    if (consoleStream) return;
+    
     try {
-        const response = await fetch('/api/console');
+        const url = consoleCursor === null ? '/api/console' : `/api/console?since=${consoleCursor}`;
+        const response = await fetch(url);
         const data = await response.json();
         
-        const consoleOutput = document.getElementById('console-output');
-        consoleOutput.textContent = data.output.join('\n');
+        // Nothing new since the last poll
+        if (!data.truncated && data.output.length === 0) return;
         
-        // Auto-scroll to bottom
-        const container = consoleOutput.parentElement;
-        container.scrollTop = container.scrollHeight;
+        if (data.truncated) {
+            consoleLines = data.output;
+        } else {
+            consoleLines = consoleLines.concat(data.output);
+        }
+        consoleCursor = data.cursor;
+        renderConsole();
     } catch (error) {
         console.error('Failed to update console:', error);
     }
@@ -225,13 +333,15 @@ async function sendCommand() {
         const response = await fetch('/api/command', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ command })
+            // Without the live stream, wait for the command's output so the
+            // console can be refreshed once instead of guessing a delay
+            body: JSON.stringify({ command, wait: !consoleStream, timeout: 2 })
         });
         const data = await response.json();
         
         if (data.success) {
             input.value = '';
-            setTimeout(updateConsole, 500);
+            updateConsole();
         } else {
             showNotification(data.message, 'error');
         }
@@ -272,7 +382,18 @@ async function uploadJar() {
         const data = await response.json();
         
         statusDiv.textContent = data.message;
-        statusDiv.className = data.success ? 'upload-status success' : 'upload-status error';
+        statusDiv.className = data.success ? 'upload-status' : 'upload-status error';
+        
+        if (data.success) {
+            fileInput.value = '';
+            const job = await waitForJob(data.job_id);
+            if (job) {
+                data.success = job.state === 'succeeded';
+                data.message = job.message;
+            }
+            statusDiv.textContent = data.message;
+            statusDiv.className = data.success ? 'upload-status success' : 'upload-status error';
+        }
         
         if (data.success) {
             fileInput.value = '';
@@ -311,7 +432,18 @@ async function uploadWorld() {
         const data = await response.json();
         
         statusDiv.textContent = data.message;
-        statusDiv.className = data.success ? 'upload-status success' : 'upload-status error';
+        statusDiv.className = data.success ? 'upload-status' : 'upload-status error';
+        
+        if (data.success) {
+            fileInput.value = '';
+            const job = await waitForJob(data.job_id);
+            if (job) {
+                data.success = job.state === 'succeeded';
+                data.message = job.message;
+            }
+            statusDiv.textContent = data.message;
+            statusDiv.className = data.success ? 'upload-status success' : 'upload-status error';
+        }
         
         if (data.success) {
             fileInput.value = '';
@@ -348,10 +480,13 @@ function displayWorlds(worlds, activeWorld) {
                 <strong>${world}</strong>
                 ${world === activeWorld ? ' <span style="color: #27ae60;">● Active</span>' : ''}
             </div>
-            <button class="btn btn-primary" onclick="setActiveWorld('${world}')" 
-                    ${world === activeWorld ? 'disabled' : ''}>
-                Set Active
-            </button>
+            <div>
+                <a class="btn btn-success" href="/api/worlds/${encodeURIComponent(world)}/export">⬇️ Export</a>
+                <button class="btn btn-primary" onclick="setActiveWorld('${world}')" 
+                        ${world === activeWorld ? 'disabled' : ''}>
+                    Set Active
+                </button>
+            </div>
         </div>
     `).join('');
 }
@@ -425,9 +560,10 @@ function showNotification(message, type) {
 }
 
 // Backup Functions
-async function createBackup() {
+async function createBackup(mode) {
     const statusDiv = document.getElementById('backup-status');
-    statusDiv.textContent = 'Creating backup...';
+    const cancelBtn = document.getElementById('cancel-backup-btn');
+    statusDiv.textContent = mode ? 'Creating snapshot...' : 'Creating backup...';
     statusDiv.className = 'upload-status';
     statusDiv.style.display = 'block';
     
@@ -435,25 +571,59 @@ async function createBackup() {
         const response = await fetch('/api/backup', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({})
+            body: JSON.stringify({
+                ...(mode ? { mode } : {}),
+                throttle: document.getElementById('backup-throttle').checked,
+                codec: document.getElementById('backup-codec').value
+            })
         });
         
         if (await handleApiError(response)) return;
         const data = await response.json();
         
-        statusDiv.textContent = data.message;
-        statusDiv.className = data.success ? 'upload-status success' : 'upload-status error';
+        if (!data.success) {
+            statusDiv.textContent = data.message;
+            statusDiv.className = 'upload-status error';
+            return;
+        }
         
-        if (data.success) {
-            showNotification(data.message, 'success');
+        cancelBtn.dataset.jobId = data.job_id;
+        cancelBtn.style.display = 'inline-block';
+        const job = await waitForJob(data.job_id, job => {
+            statusDiv.textContent = formatBackupProgress(job);
+        });
+        cancelBtn.style.display = 'none';
+        if (!job) return;
+        
+        const success = job.state === 'succeeded';
+        statusDiv.textContent = job.message;
+        statusDiv.className = success ? 'upload-status success' : 'upload-status error';
+        
+        if (success) {
+            showNotification(job.message, 'success');
             loadBackups();
         }
     } catch (error) {
+        cancelBtn.style.display = 'none';
         statusDiv.textContent = 'Failed to create backup';
         statusDiv.className = 'upload-status error';
     }
 }
 
+async function cancelBackup() {
+    const jobId = document.getElementById('cancel-backup-btn').dataset.jobId;
+    if (!jobId) return;
+    
+    try {
+        const response = await fetch(`/api/jobs/${jobId}/cancel`, { method: 'POST' });
+        if (await handleApiError(response)) return;
+        const data = await response.json();
+        showNotification(data.message, data.success ? 'success' : 'error');
+    } catch (error) {
+        showNotification('Failed to cancel backup', 'error');
+    }
+}
+
 async function loadBackups() {
     try {
         const response = await fetch('/api/backups');
@@ -470,9 +640,18 @@ async function loadBackups() {
         backupsList.innerHTML = data.backups.map(backup => `
             <div class="backup-item">
                 <div class="backup-info">
-                    <strong>${backup.name}</strong>
-                    <small>Size: ${backup.size_mb} MB | Created: ${backup.created}</small>
+                    <strong>${backup.name}</strong>${backup.type === 'snapshot' ? ` <small>(${backup.standalone ? 'snapshot' : 'delta snapshot'})</small>` : ''}
+                    <small>Size: ${backup.size_mb} MB${backup.type === 'snapshot' ? ` (${backup.new_mb} MB new)` : ''} | Created: ${backup.created}</small>
                 </div>
+                <a class="btn btn-success" href="/api/backups/${encodeURIComponent(backup.name)}/download">
+                    ⬇️ Download
+                </a>
+                <button class="btn btn-warning" onclick="restoreBackup('${backup.name}', '${backup.world || ''}')">
+                    ♻️ Restore
+                </button>
+                <button class="btn btn-danger" onclick="deleteBackup('${backup.name}')">
+                    🗑️ Delete
+                </button>
             </div>
         `).join('');
     } catch (error) {
@@ -481,6 +660,57 @@ async function loadBackups() {
     }
 }
 
+async function restoreBackup(name, world) {
+    const target = prompt(`Restore backup "${name}" as world (an existing world of that name is replaced):`, world);
+    if (!target) {
+        return;
+    }
+    
+    showNotification(`Restoring "${name}"...`, 'success');
+    try {
+        const response = await fetch(`/api/backups/${encodeURIComponent(name)}/restore`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ world: target })
+        });
+        if (await handleApiError(response)) return;
+        const data = await response.json();
+        
+        if (!data.success) {
+            showNotification(data.message, 'error');
+            return;
+        }
+        
+        const job = await waitForJob(data.job_id);
+        if (job) {
+            showNotification(job.message, job.state === 'succeeded' ? 'success' : 'error');
+        }
+        updateStatus();
+    } catch (error) {
+        showNotification('Failed to restore backup', 'error');
+    }
+}
+
+async function deleteBackup(name) {
+    if (!confirm(`Are you sure you want to delete backup "${name}"?`)) {
+        return;
+    }
+    
+    try {
+        const response = await fetch(`/api/backups/${encodeURIComponent(name)}`, { method: 'DELETE' });
+        if (await handleApiError(response)) return;
+        const data = await response.json();
+        
+        showNotification(data.message, data.success ? 'success' : 'error');
+        
+        if (data.success) {
+            loadBackups();
+        }
+    } catch (error) {
+        showNotification('Failed to delete backup', 'error');
+    }
+}
+
 // User Management Functions
 async function changePassword() {
     const currentPassword = document.getElementById('current-password').value;
@@ -0,0 +1,161 @@
+import logging
+import os
+import threading
+import time
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+
+class ProcessSampler:
+    """Samples a process's resource use through one long-lived psutil handle.
+
+    ``cpu_percent`` measures CPU time since the previous call on the same
+    handle, so a fresh handle per sample always reads 0; keeping it also
+    skips re-reading the process's static details every time. Several
+    readers can share one sampler: with ``max_age`` a recent enough sample
+    is reused instead of restarting the CPU measurement.
+    """
+
+    def __init__(self):
+        self._process = None
+        self._lock = threading.Lock()
+        self._last = None  # (monotonic time, sample)
+
+    def sample(self, pid, max_age=None):
+        """Return {pid, cpu_percent, memory_mb, uptime_seconds, threads, open_fds,
+        read_bytes, write_bytes}, or None if the process is gone."""
+        with self._lock:
+            if max_age is not None and self._last is not None:
+                taken, sample = self._last
+                if sample['pid'] == pid and time.monotonic() - taken <= max_age:
+                    return sample
+            try:
+                if self._process is None or self._process.pid != pid:
+                    self._process = psutil.Process(pid)
+                    self._process.cpu_percent(interval=None)  # Starts the measurement
+                with self._process.oneshot():
+                    sample = {
+                        'pid': pid,
+                        'cpu_percent': self._process.cpu_percent(interval=None),
+                        'memory_mb': self._process.memory_info().rss / (1024 * 1024),
+                        'uptime_seconds': int(time.time() - self._process.create_time()),
+                        'threads': self._process.num_threads(),
+                        'open_fds': self._optional(self._process, 'num_fds'),
+                    }
+                    io = self._optional(self._process, 'io_counters')
+                    sample['read_bytes'] = io.read_bytes if io else None
+                    sample['write_bytes'] = io.write_bytes if io else None
+            except (psutil.NoSuchProcess, psutil.AccessDenied) as e:
+                logger.warning(f"Failed to get process info: {e}")
+                self._process = None
+                self._last = None
+                return None
+            self._last = (time.monotonic(), sample)
+            return sample
+
+    @staticmethod
+    def _optional(process, method):
+        """Call a psutil method some platforms lack or deny (num_fds, io_counters)."""
+        try:
+            return getattr(process, method)()
+        except (AttributeError, NotImplementedError, psutil.AccessDenied):
+            return None
+
+
+class FileWatch:
+    """Reports whether any of a set of files or directories changed.
+
+    Compares modification time, inode and size from one stat per path, so a
+    directory counts as changed when entries are added, removed or renamed
+    in it, and a file when it is rewritten or replaced.
+    """
+
+    def __init__(self, *paths):
+        self.paths = paths
+        self._seen = None
+
+    def _state(self):
+        state = []
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+                state.append((st.st_mtime_ns, st.st_ino, st.st_size))
+            except FileNotFoundError:
+                state.append(None)
+        return state
+
+    def changed(self):
+        state = self._state()
+        changed = state != self._seen
+        self._seen = state
+        return changed
+
+
+class StatusCache:
+    """A status snapshot kept up to date in the background.
+
+    ``collect_files`` builds the part of the status that comes from files
+    and directories; it only reruns when ``watch`` sees a change or after
+    ``invalidate()``. ``collect_live`` builds the rest (process metrics,
+    counters) and reruns every ``interval`` seconds. Readers get the last
+    snapshot, so serving it costs the same whatever the number of viewers.
+    """
+
+    def __init__(self, collect_files, collect_live, watch, interval=2):
+        self.collect_files = collect_files
+        self.collect_live = collect_live
+        self.watch = watch
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()  # One rebuild at a time
+        self._wake = threading.Event()
+        self._generation = 0  # Bumped by invalidate() so a rebuild in flight isn't kept
+        self._files = None
+        self._snapshot = None
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True, name='status-cache')
+            self._thread.start()
+
+    def invalidate(self):
+        """Rebuild the whole snapshot now, e.g. after changing files the watch doesn't cover."""
+        with self._lock:
+            self._generation += 1
+            self._files = None
+        self._wake.set()
+
+    def snapshot(self):
+        """Return the latest snapshot, building it first if there is none yet."""
+        with self._lock:
+            if self._snapshot is not None:
+                return self._snapshot
+        return self.refresh()
+
+    def refresh(self):
+        """Rebuild the snapshot and return it."""
+        with self._refresh_lock:
+            files_changed = self.watch.changed()
+            with self._lock:
+                generation = self._generation
+                files = None if files_changed else self._files
+            if files is None:
+                files = self.collect_files()
+            snapshot = dict(files)
+            snapshot.update(self.collect_live())
+            with self._lock:
+                self._files = files if generation == self._generation else None
+                self._snapshot = snapshot
+            return snapshot
+
+    def _run(self):
+        while True:
+            self._wake.clear()
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Failed to refresh status: {e}")
+            self._wake.wait(self.interval)